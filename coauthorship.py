@@ -0,0 +1,406 @@
+#!/usr/bin/env python3
+"""
+Author normalization and the co-authorship network of the screening export
+
+Zotero's Author column mixes separators ('Glaser, B.G.; Strauss, A.L.' and
+'Thaler, R. H. and Sunstein, C. R.') and name forms ('Sunstein, Cass R.'
+vs 'Sunstein, C. R.'). Each name is reduced to a key of its ASCII-folded
+surname and first initial, so both forms of Sunstein count as one author.
+Organizations ('OECD') keep their whole name. Cells are parsed once per
+distinct value.
+
+The graph is a sparse author x author matrix of joint papers, built as
+AᵀA from the record x author incidence matrix. Records with more than
+`MAX_TEAM` authors count for the authors but add no edges. On top of it:
+
+    components    scipy.sparse.csgraph connected components
+    centrality    degree, weighted strength and PageRank (sparse power iteration)
+    communities   weighted label propagation, each round one sparse product
+                  and a row argmax; modularity is reported
+
+Included studies are matched to export records by first-author surname and
+year, which places them in the graph.
+
+    python coauthorship.py                      # summary of the review export
+    python coauthorship.py --benchmark 10000,100000
+"""
+
+import argparse
+import re
+import time
+import unicodedata
+from dataclasses import dataclass
+
+import numpy as np
+from scipy import sparse
+from scipy.sparse.csgraph import connected_components
+
+import prisma_counts
+
+MAX_TEAM = 25
+# Authors drawn in the network figure (the most central collaborating ones)
+MAX_DRAWN = 1500
+DAMPING = 0.85
+MAX_ROUNDS = 30
+
+_SEPARATORS = re.compile(r'\s*;\s*|\s+and\s+|\s*&\s*')
+_LETTERS = re.compile(r'[^a-z ]+')
+
+def _fold(text):
+    text = unicodedata.normalize('NFKD', text)
+    return ''.join(c for c in text if not unicodedata.combining(c)).lower()
+
+def split_authors(cell):
+    """The individual names in an Author cell"""
+    if not isinstance(cell, str):
+        return []
+    return [name.strip(' ,.') for name in _SEPARATORS.split(cell.strip()) if name.strip(' ,.')]
+
+def author_key(name):
+    """'surname f' for a person, the folded name for an organization (None if blank)"""
+    surname, comma, given = name.partition(',')
+    if not comma:
+        words = name.split()
+        # 'OECD', 'National Endowment for Financial Education': no given name to split off
+        if len(words) < 2 or name.isupper() or len(words) > 3:
+            folded = _LETTERS.sub(' ', _fold(name)).split()
+            return ' '.join(folded) or None
+        surname, given = words[-1], ' '.join(words[:-1])
+    surname = ' '.join(_LETTERS.sub(' ', _fold(surname)).split())
+    initial = _LETTERS.sub('', _fold(given))[:1]
+    if not surname:
+        return None
+    return f'{surname} {initial}' if initial else surname
+
+def record_authors(cells):
+    """Author keys per record, plus {key: most complete spelling seen}"""
+    memo, display = {}, {}
+    keys = []
+    for cell in cells:
+        parsed = memo.get(cell)
+        if parsed is None:
+            parsed = []
+            for name in split_authors(cell):
+                key = author_key(name)
+                if key is None or key in parsed:
+                    continue
+                parsed.append(key)
+                if len(name) > len(display.get(key, '')):
+                    display[key] = name
+            memo[cell] = parsed
+        keys.append(parsed)
+    return keys, display
+
+@dataclass
+class CoauthorshipGraph:
+    """Authors of an export and the sparse matrix of papers they share"""
+    authors: list           # author keys, index = node
+    names: list             # display spelling per node
+    papers: np.ndarray      # records per author
+    adjacency: sparse.csr_matrix   # joint papers, zero diagonal
+    incidence: sparse.csr_matrix   # record x author
+    record_keys: np.ndarray
+
+    @property
+    def n(self):
+        return len(self.authors)
+
+    def components(self):
+        """(count, component label per author)"""
+        return connected_components(self.adjacency, directed=False)
+
+    def degree(self):
+        return np.diff(self.adjacency.indptr)
+
+    def strength(self):
+        return np.asarray(self.adjacency.sum(axis=1)).ravel()
+
+    def pagerank(self, damping=DAMPING, tol=1e-10, max_iter=100):
+        """PageRank of the weighted graph; isolated authors spread their rank evenly"""
+        if self.n == 0:
+            return np.zeros(0)
+        strength = self.strength()
+        inverse = np.divide(1.0, strength, out=np.zeros(self.n), where=strength > 0)
+        transition = (sparse.diags(inverse) @ self.adjacency).T.tocsr()
+        rank = np.full(self.n, 1.0 / self.n)
+        dangling = strength == 0
+        for _ in range(max_iter):
+            previous = rank
+            rank = damping * (transition @ rank + rank[dangling].sum() / self.n) \
+                + (1 - damping) / self.n
+            if np.abs(rank - previous).sum() < tol:
+                break
+        return rank
+
+    def communities(self, max_rounds=MAX_ROUNDS, seed=0):
+        """Community label per author by weighted label propagation.
+
+        Every round moves each author to the label carrying most weight among
+        its neighbours and itself (the self weight stops two-node oscillation),
+        ties going to the smaller label. Edge weights are summed per (author,
+        label) with one sort, so a round costs O(edges log edges). Only half
+        the authors, drawn at random, move per round, which breaks the
+        symmetry of fully synchronous updates.
+        """
+        if self.n == 0:
+            return np.zeros(0, dtype=np.intp)
+        rng = np.random.default_rng(seed)
+        coo = (self.adjacency + sparse.identity(self.n, format='csr') * 0.5).tocoo()
+        rows, cols, weights = coo.row.astype(np.int64), coo.col, coo.data
+        labels = np.arange(self.n)
+        for _ in range(max_rounds):
+            pairs, inverse = np.unique(rows * self.n + labels[cols], return_inverse=True)
+            totals = np.bincount(inverse, weights=weights)
+            node, label = np.divmod(pairs, self.n)
+            order = np.lexsort((label, -totals, node))
+            first = order[np.r_[True, node[order][1:] != node[order][:-1]]]
+            best = np.empty(self.n, dtype=np.int64)
+            best[node[first]] = label[first]
+            if np.array_equal(best, labels):
+                break
+            labels = np.where(rng.random(self.n) < 0.5, best, labels)
+        return np.unique(labels, return_inverse=True)[1]
+
+    def modularity(self, labels):
+        """Newman modularity of a partition of the weighted graph"""
+        total = self.adjacency.sum()
+        if total == 0:
+            return 0.0
+        strength = self.strength()
+        coo = self.adjacency.tocoo()
+        same = labels[coo.row] == labels[coo.col]
+        community_strength = np.bincount(labels, weights=strength)
+        return float(coo.data[same].sum() / total - ((community_strength / total) ** 2).sum())
+
+    def study_authors(self, studies, years):
+        """Node of the first author of each included study (-1 if not in the export)"""
+        first = self._first_authors()
+        nodes = []
+        for study in studies:
+            match = re.match(r"\s*([^\s&(]+)", study['label'])
+            surname = _fold(match.group(1)) if match else ''
+            candidates = [node for row, node in first
+                          if self.authors[node].split(' ')[0] == surname
+                          and years[row] == study.get('year')]
+            nodes.append(candidates[0] if candidates else -1)
+        return nodes
+
+    def _first_authors(self):
+        indptr = self.incidence.indptr
+        return [(row, self.incidence.indices[indptr[row]])
+                for row in range(self.incidence.shape[0]) if indptr[row + 1] > indptr[row]]
+
+def build_graph(author_cells, record_keys=None):
+    """The co-authorship graph of a sequence of Author cells"""
+    keys, display = record_authors(author_cells)
+    index = {}
+    rows, cols = [], []
+    for row, authors in enumerate(keys):
+        for author in authors:
+            cols.append(index.setdefault(author, len(index)))
+            rows.append(row)
+    n_records, n_authors = len(keys), len(index)
+    incidence = sparse.csr_matrix((np.ones(len(rows), dtype=np.float32), (rows, cols)),
+                                  shape=(n_records, n_authors))
+    # Papers keep their authors, but very large teams would add dense cliques
+    team = np.diff(incidence.indptr)
+    collaborative = sparse.diags((team <= MAX_TEAM).astype(np.float32)) @ incidence
+    adjacency = (collaborative.T @ collaborative).tocsr()
+    adjacency.setdiag(0)
+    adjacency.eliminate_zeros()
+    authors = list(index)
+    return CoauthorshipGraph(
+        authors=authors, names=[display[a] for a in authors],
+        papers=np.asarray(incidence.sum(axis=0)).ravel().astype(int),
+        adjacency=adjacency, incidence=incidence,
+        record_keys=np.asarray(record_keys if record_keys is not None else np.arange(n_records)))
+
+def layout(graph, nodes, iterations=60, seed=0):
+    """2-D positions for `nodes`: force-directed within components, components packed.
+
+    Components are laid out independently, so the cost is the sum of their
+    squared sizes; callers keep `nodes` to at most MAX_DRAWN.
+    """
+    rng = np.random.default_rng(seed)
+    nodes = np.asarray(nodes)
+    sub = graph.adjacency[nodes][:, nodes].tocsr()
+    count, labels = connected_components(sub, directed=False)
+    sizes = np.bincount(labels, minlength=count)
+    order = np.argsort(-sizes, kind='stable')
+    positions = np.zeros((len(nodes), 2))
+    cursor_x = cursor_y = row_height = 0.0
+    width = max(4.0, 2.2 * np.sqrt(len(nodes)))
+    for component in order:
+        members = np.flatnonzero(labels == component)
+        local = _force_layout(sub[members][:, members], rng, iterations)
+        radius = np.sqrt(len(members))
+        local *= radius / max(np.abs(local).max(), 1e-9) if len(members) > 1 else 0
+        if cursor_x + 2 * radius > width:
+            cursor_x, cursor_y, row_height = 0.0, cursor_y - row_height - 1.0, 0.0
+        positions[members] = local + [cursor_x + radius, cursor_y - radius]
+        cursor_x += 2 * radius + 1.0
+        row_height = max(row_height, 2 * radius)
+    return positions
+
+def _force_layout(adjacency, rng, iterations):
+    n = adjacency.shape[0]
+    if n <= 2:
+        return np.array([[-1.0, 0.0], [1.0, 0.0]])[:n]
+    pos = rng.normal(size=(n, 2)).astype(np.float32)
+    edges = adjacency.tocoo()
+    k2 = np.float32(1.0 / n)
+    temperature = 0.1
+    for _ in range(iterations):
+        # Repulsion between all pairs, one coordinate at a time (no n x n x 2 array)
+        dx = pos[:, 0, None] - pos[None, :, 0]
+        dy = pos[:, 1, None] - pos[None, :, 1]
+        push = k2 / np.maximum(dx * dx + dy * dy, 1e-6)
+        move = np.column_stack([(dx * push).sum(axis=1), (dy * push).sum(axis=1)])
+        # Attraction along edges, proportional to squared length
+        delta = pos[edges.row] - pos[edges.col]
+        pull = delta * (np.sqrt((delta * delta).sum(axis=1)) / np.sqrt(k2))[:, None]
+        np.add.at(move, edges.row, -pull)
+        length = np.maximum(np.sqrt((move * move).sum(axis=1)), 1e-9)
+        pos += move / length[:, None] * np.minimum(length, temperature)[:, None]
+        temperature *= 0.95
+    return pos - pos.mean(axis=0)
+
+def drawn_nodes(graph, rank, limit=MAX_DRAWN):
+    """Authors with co-authors, the `limit` highest ranked if there are more"""
+    collaborating = np.flatnonzero(graph.degree() > 0)
+    if len(collaborating) > limit:
+        collaborating = collaborating[np.argsort(-rank[collaborating], kind='stable')[:limit]]
+    return np.sort(collaborating)
+
+def draw_network(ax, graph, nodes, positions, communities, highlight=(), labels=10,
+                 n_colors=10):
+    """Nodes coloured by community (largest `n_colors`), edges as one collection.
+
+    Edge opacity falls with the number of edges drawn, so dense regions read
+    as darker areas instead of an opaque tangle; above 2000 edges the edges
+    are rasterized.
+    """
+    import matplotlib.pyplot as plt
+    from matplotlib.collections import LineCollection
+    position = np.full((graph.n, 2), np.nan)
+    position[nodes] = positions
+    sub = sparse.triu(graph.adjacency[nodes][:, nodes]).tocoo()
+    segments = np.stack([positions[sub.row], positions[sub.col]], axis=1)
+    alpha = float(np.clip(20 / np.sqrt(max(len(segments), 1)), 0.05, 0.6))
+    ax.add_collection(LineCollection(segments, colors='#555555', alpha=alpha,
+                                     linewidths=0.4 + 0.6 * np.minimum(sub.data, 4),
+                                     rasterized=len(segments) > 2000, zorder=1))
+
+    sizes = np.bincount(communities[nodes])
+    largest = np.argsort(-sizes, kind='stable')[:n_colors]
+    palette = plt.get_cmap('tab10')
+    colour_of = {community: palette(i) for i, community in enumerate(largest)
+                 if sizes[community] > 2}
+    colours = [colour_of.get(c, (0.7, 0.7, 0.7, 1.0)) for c in communities[nodes]]
+    degree = graph.degree()[nodes]
+    ax.scatter(positions[:, 0], positions[:, 1], s=8 + 10 * np.sqrt(degree), c=colours,
+               edgecolors='white', linewidths=0.3, zorder=2,
+               rasterized=len(nodes) > 2000)
+
+    highlight = [node for node in highlight if node >= 0 and not np.isnan(position[node, 0])]
+    if highlight:
+        ax.scatter(position[highlight, 0], position[highlight, 1], s=160, marker='*',
+                   c='black', zorder=3, label='Included study (first author)')
+    # Label the best-connected author of each of the largest communities
+    leaders = {}
+    for node in nodes[np.argsort(-degree, kind='stable')]:
+        if communities[node] in colour_of:
+            leaders.setdefault(communities[node], node)
+    named = list(dict.fromkeys(highlight + list(leaders.values())[:labels]))
+    for node in named:
+        ax.annotate(graph.names[node].split(',')[0], position[node], fontsize=7,
+                    xytext=(3, 3), textcoords='offset points', zorder=4)
+    ax.autoscale_view()
+    ax.set_aspect('equal', adjustable='datalim')
+    ax.set_xticks([])
+    ax.set_yticks([])
+    for spine in ax.spines.values():
+        spine.set_visible(False)
+
+def _letters(i):
+    word = ''
+    while True:
+        i, digit = divmod(i, 26)
+        word += chr(ord('a') + digit)
+        if i == 0:
+            return word.capitalize()
+
+def synthetic_cells(n_records, seed=0):
+    """Author cells drawn from a Zipf-weighted pool of names in mixed formats"""
+    rng = np.random.default_rng(seed)
+    pool = max(50, n_records)
+    surnames = [_letters(i) for i in range(pool)]
+    weights = 1.0 / np.arange(1, pool + 1) ** 0.8
+    teams = 1 + rng.poisson(1.5, n_records)
+    drawn = rng.choice(pool, size=teams.sum(), p=weights / weights.sum())
+    cells = []
+    for i, team in enumerate(np.split(drawn, np.cumsum(teams)[:-1])):
+        if i % 2:
+            cells.append('; '.join(f'{surnames[j]}, Alex' for j in team))
+        else:
+            cells.append(' and '.join(f'{surnames[j]}, A.' for j in team))
+    return cells
+
+def benchmark(sizes):
+    print(f"{'records':>9s} {'authors':>8s} {'edges':>9s} {'build s':>8s} {'comp s':>7s} "
+          f"{'rank s':>7s} {'comm s':>7s} {'matrix MB':>10s}")
+    for n in sizes:
+        cells = synthetic_cells(n)
+        start = time.perf_counter()
+        graph = build_graph(cells)
+        built = time.perf_counter()
+        graph.components()
+        components = time.perf_counter()
+        graph.pagerank()
+        ranked = time.perf_counter()
+        graph.communities()
+        communities = time.perf_counter()
+        megabytes = sum(m.data.nbytes + m.indices.nbytes + m.indptr.nbytes
+                        for m in (graph.adjacency, graph.incidence)) / 1e6
+        print(f"{n:9d} {graph.n:8d} {graph.adjacency.nnz // 2:9d} {built - start:8.2f} "
+              f"{components - built:7.2f} {ranked - components:7.2f} "
+              f"{communities - ranked:7.2f} {megabytes:10.1f}")
+
+if __name__ == "__main__":
+    import review_dataset
+    parser = argparse.ArgumentParser(description='Co-authorship network of the screening export')
+    parser.add_argument('--export', default=prisma_counts.SCREENING_EXPORT,
+                        help='Zotero CSV export (default: the review screening export)')
+    parser.add_argument('--top', type=int, default=15, help='central authors to list')
+    parser.add_argument('--benchmark', metavar='SIZES', default=None,
+                        help='comma-separated synthetic record counts to time')
+    args = parser.parse_args()
+    if args.benchmark:
+        benchmark([int(n) for n in args.benchmark.split(',')])
+    else:
+        dataset = review_dataset.ReviewDataset(args.export)
+        graph = dataset.coauthorship
+        count, components = graph.components()
+        sizes = np.bincount(components)
+        labels = graph.communities()
+        print(f"{len(graph.record_keys)} records, {graph.n} authors, "
+              f"{graph.adjacency.nnz // 2} co-author pairs")
+        print(f"{count} components (largest {sizes.max(initial=0)} authors, "
+              f"{int((sizes == 1).sum())} solo authors); "
+              f"{labels.max(initial=-1) + 1} communities, modularity {graph.modularity(labels):.3f}")
+        rank = graph.pagerank()
+        print('\nMost central authors (PageRank):')
+        for node in np.argsort(-rank)[:args.top]:
+            print(f"  {graph.names[node]:40s} papers {graph.papers[node]:3d}  "
+                  f"co-authors {graph.degree()[node]:3d}")
+        print('\nIncluded studies:')
+        studies = dataset.extraction['studies']
+        years = dataset.screening_records['Publication Year'].to_numpy()
+        for study, node in zip(studies, graph.study_authors(studies, years)):
+            if node < 0:
+                print(f"  {study['label']}: not in the export")
+            else:
+                component = components[node]
+                print(f"  {study['label']}: {graph.names[node]}, component of "
+                      f"{sizes[component]} authors, community of "
+                      f"{int((labels == labels[node]).sum())}")
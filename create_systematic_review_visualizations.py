@@ -1,34 +1,66 @@
 #!/usr/bin/env python3
 """
 Create PRISMA flow diagram and forest plots for systematic review of athlete financial literacy interventions
+
+Render every figure, or name the ones to render:
+
+    python create_systematic_review_visualizations.py [all]
+    python create_systematic_review_visualizations.py prisma --draft
+    python create_systematic_review_visualizations.py --trace trace.json --profile prof/
+
+pandas and the analysis modules are imported by the figures that use them,
+so single-figure runs only pay for what that figure needs.
 """
 
+import argparse
+import importlib.util
+import multiprocessing
+import os
+import sys
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor, as_completed
+
 import matplotlib.pyplot as plt
-import matplotlib.patches as mpatches
-from matplotlib.patches import Rectangle, FancyBboxPatch
+from matplotlib.patches import FancyBboxPatch
 import numpy as np
-import pandas as pd
-import seaborn as sns
-from matplotlib.patches import ConnectionPatch
-import matplotlib.gridspec as gridspec
-
-# Set style for publication-quality figures
-plt.style.use('default')
-sns.set_palette("husl")
-plt.rcParams.update({
-    'font.size': 10,
-    'font.family': 'Arial',
-    'figure.dpi': 300,
-    'savefig.dpi': 300,
-    'savefig.bbox': 'tight',
-    'axes.linewidth': 0.8,
-    'xtick.major.width': 0.8,
-    'ytick.major.width': 0.8
-})
-
-def create_prisma_flow_diagram():
+
+import figure_export
+import prisma_counts
+import render_cache
+import render_trace
+import review_dataset
+from figure_export import export_figure
+
+_style_applied = False
+
+def apply_style():
+    """Set style for publication-quality figures, once per process"""
+    global _style_applied
+    if _style_applied:
+        return
+    plt.style.use('default')
+    plt.rcParams.update({
+        # seaborn's "husl" palette, without importing seaborn for it
+        'axes.prop_cycle': plt.cycler(color=['#f77189', '#bb9832', '#50b131', 
+                                             '#36ada4', '#3ba3ec', '#e866f4']),
+        'font.size': 10,
+        'font.family': 'Arial',
+        'figure.dpi': 300,
+        'savefig.dpi': 300,
+        'savefig.bbox': 'tight',
+        'axes.linewidth': 0.8,
+        'xtick.major.width': 0.8,
+        'ytick.major.width': 0.8
+    })
+    _style_applied = True
+
+def create_prisma_flow_diagram(dataset=None):
     """Create PRISMA flow diagram for systematic review"""
     
+    dataset = dataset or review_dataset.load_dataset()
+    counts = dataset.prisma_counts
+    
     fig, ax = plt.subplots(figsize=(12, 16))
     ax.set_xlim(0, 10)
     ax.set_ylim(0, 20)
@@ -49,11 +81,10 @@ def create_prisma_flow_diagram():
             fontsize=12, fontweight='bold', color=primary_color)
     
     # Database boxes
-    databases = [
-        ('SciSpace\n(n = 100)', 2, 17.5),
-        ('Google Scholar\n(n = 20)', 5, 17.5),
-        ('PubMed\n(n = 20)', 8, 17.5)
-    ]
+    sources = counts.top_sources(3)
+    x_positions = np.linspace(2, 8, len(sources)) if len(sources) > 1 else [5]
+    databases = [(f'{source}\n(n = {n})', x, 17.5)
+                 for (source, n), x in zip(sources, x_positions)]
     
     for db_text, x, y in databases:
         box = FancyBboxPatch((x-0.7, y-0.4), 1.4, 0.8, 
@@ -71,9 +102,13 @@ def create_prisma_flow_diagram():
                               facecolor=primary_color, 
                               edgecolor='black')
     ax.add_patch(total_box)
-    ax.text(5, 16.2, 'Total Records Identified\n(n = 140)', 
+    ax.text(5, 16.2, f'Total Records Identified\n(n = {counts.identified})', 
             ha='center', va='center', fontsize=10, 
             color='white', fontweight='bold')
+    ax.text(8.25, 16.2, f'Duplicates removed\n(n = {counts.duplicates})', 
+            ha='center', va='center', fontsize=9, 
+            bbox=dict(boxstyle="round,pad=0.3", facecolor='white', 
+                      edgecolor=excluded_color))
     
     # Screening section
     ax.text(5, 15, 'SCREENING', ha='center', va='center', 
@@ -85,9 +120,14 @@ def create_prisma_flow_diagram():
                                facecolor=secondary_color, 
                                edgecolor='black')
     ax.add_patch(screen_box)
-    ax.text(5, 14.2, 'Records Screened by\nTitle/Abstract\n(n = 140)', 
+    ax.text(5, 14.2, f'Records Screened by\nTitle/Abstract\n(n = {counts.screened})', 
             ha='center', va='center', fontsize=10, 
             color='white', fontweight='bold')
+    if counts.awaiting_screening:
+        ax.text(8.25, 14.2, f'Awaiting decision\n(n = {counts.awaiting_screening})', 
+                ha='center', va='center', fontsize=9, 
+                bbox=dict(boxstyle="round,pad=0.3", facecolor='lightgray', 
+                          alpha=0.7))
     
     # Included and excluded after screening
     include_box = FancyBboxPatch((1.5, 12.3), 2.5, 0.8, 
@@ -95,7 +135,7 @@ def create_prisma_flow_diagram():
                                 facecolor=included_color, 
                                 edgecolor='black')
     ax.add_patch(include_box)
-    ax.text(2.75, 12.7, 'Included for\nFull-text Review\n(n = 5)', 
+    ax.text(2.75, 12.7, f'Included for\nFull-text Review\n(n = {counts.fulltext_assessed})', 
             ha='center', va='center', fontsize=9, 
             color='white', fontweight='bold')
     
@@ -104,17 +144,14 @@ def create_prisma_flow_diagram():
                                 facecolor=excluded_color, 
                                 edgecolor='black')
     ax.add_patch(exclude_box)
-    ax.text(7.25, 12.7, 'Excluded\n(n = 135)', 
+    ax.text(7.25, 12.7, f'Excluded\n(n = {counts.screen_excluded})', 
             ha='center', va='center', fontsize=9, 
             color='white', fontweight='bold')
     
     # Exclusion reasons
-    exclusion_text = """Exclusion Reasons:
-• Not athlete-specific (n = 45)
-• No intervention component (n = 38)
-• General financial education (n = 27)
-• Opinion/editorial pieces (n = 15)
-• Duplicate studies (n = 10)"""
+    reasons = counts.screen_exclusion_reasons.most_common(6)
+    exclusion_text = 'Exclusion Reasons:\n' + '\n'.join(
+        [f'• {reason} (n = {n})' for reason, n in reasons] or ['• None recorded'])
     
     ax.text(7.25, 10.8, exclusion_text, ha='center', va='top', 
             fontsize=8, bbox=dict(boxstyle="round,pad=0.3", 
@@ -131,9 +168,19 @@ def create_prisma_flow_diagram():
                                  facecolor=secondary_color, 
                                  edgecolor='black')
     ax.add_patch(fulltext_box)
-    ax.text(5, 8.7, 'Full-text Articles\nAssessed for Eligibility\n(n = 5)', 
+    ax.text(5, 8.7, f'Full-text Articles\nAssessed for Eligibility\n(n = {counts.fulltext_assessed})', 
             ha='center', va='center', fontsize=10, 
             color='white', fontweight='bold')
+    if counts.fulltext_excluded or counts.awaiting_fulltext:
+        fulltext_text = f'Full-text Excluded (n = {counts.fulltext_excluded})'
+        for reason, n in counts.fulltext_exclusion_reasons.most_common(4):
+            fulltext_text += f'\n• {reason} (n = {n})'
+        if counts.awaiting_fulltext:
+            fulltext_text += f'\nAwaiting full text (n = {counts.awaiting_fulltext})'
+        ax.text(8.25, 8.7, fulltext_text, ha='center', va='center', 
+                fontsize=8, bbox=dict(boxstyle="round,pad=0.3", 
+                                     facecolor='white', 
+                                     edgecolor=excluded_color))
     
     # Final inclusion
     ax.text(5, 7, 'INCLUDED', ha='center', va='center', 
@@ -144,18 +191,13 @@ def create_prisma_flow_diagram():
                               facecolor=included_color, 
                               edgecolor='black')
     ax.add_patch(final_box)
-    ax.text(5, 6.2, 'Studies Included in\nSystematic Review\n(n = 5)', 
+    ax.text(5, 6.2, f'Studies Included in\nSystematic Review\n(n = {counts.included})', 
             ha='center', va='center', fontsize=10, 
             color='white', fontweight='bold')
     
     # Study type breakdown
-    study_types = [
-        'Intervention Studies (n = 1)',
-        'Content Analysis (n = 1)', 
-        'Organizational Audit (n = 1)',
-        'Qualitative Studies (n = 1)',
-        'Comparative Analysis (n = 1)'
-    ]
+    study_types = [f'{design} (n = {n})' 
+                   for design, n in counts.included_designs.most_common(5)]
     
     for i, study_type in enumerate(study_types):
         y_pos = 4.5 - i * 0.4
@@ -175,39 +217,26 @@ def create_prisma_flow_diagram():
     ax.annotate('', xy=(5, 8.3), xytext=(2.75, 11.9), arrowprops=arrow_props)
     ax.annotate('', xy=(5, 5.8), xytext=(5, 7.9), arrowprops=arrow_props)
     
-    plt.tight_layout()
-    plt.savefig('/home/sandbox/prisma_flow_diagram.png', dpi=300, bbox_inches='tight')
-    plt.savefig('/home/sandbox/prisma_flow_diagram.pdf', dpi=300, bbox_inches='tight')
-    plt.close()
+    with render_trace.span('tight_layout'):
+        plt.tight_layout()
+    export_figure(fig, 'prisma_flow_diagram')
+
+# Larger forest plots summarize the characteristics table by study design
+FOREST_TABLE_ROWS = 25
 
-def create_forest_plot():
+def create_forest_plot(dataset=None, label_mode='auto'):
     """Create forest plot for intervention effectiveness"""
+    import forest_render
+    import meta_analysis
     
-    # Study data for forest plot
-    studies_data = {
-        'Study': [
-            'Rubin et al. (2021)\nFinancial Knowledge',
-            'Rubin et al. (2021)\nParticipant Satisfaction', 
-            'McCoy et al. (2019)\nFinancial Self-Efficacy',
-            'Hong & Fraser (2021)\nPerceived Need for Education',
-            'Moolman (2023)\nContent Relevance'
-        ],
-        'Effect_Size': [0.65, 0.85, -0.32, 0.78, 0.90],  # Cohen's d or similar
-        'Lower_CI': [0.28, 0.61, -0.58, 0.45, 0.72],
-        'Upper_CI': [1.02, 1.09, -0.06, 1.11, 1.08],
-        'Weight': [25.3, 22.1, 18.7, 19.2, 14.7],
-        'Sample_Size': [30, 30, 1205, 20, 15],
-        'Study_Type': ['RCT Pilot', 'RCT Pilot', 'Cross-sectional', 'Qualitative', 'Qualitative']
-    }
-    
-    df = pd.DataFrame(studies_data)
+    dataset = dataset or review_dataset.load_dataset()
+    df = dataset.effects.copy()
+    pooled, df['Weight'] = meta_analysis.meta_analyze_table(df, method='REML')
+    pooled = pooled.iloc[0]
     
     fig, (ax1, ax2) = plt.subplots(1, 2, figsize=(16, 8), 
                                    gridspec_kw={'width_ratios': [3, 1]})
     
-    # Main forest plot
-    y_positions = np.arange(len(df))
-    
     # Color coding by study type
     colors = {
         'RCT Pilot': '#2E86AB',
@@ -215,60 +244,61 @@ def create_forest_plot():
         'Qualitative': '#F18F01'
     }
     
-    # Plot confidence intervals and point estimates
-    for i, row in df.iterrows():
-        color = colors[row['Study_Type']]
-        
-        # Confidence interval line
-        ax1.plot([row['Lower_CI'], row['Upper_CI']], [i, i], 
-                 color=color, linewidth=2, alpha=0.7)
-        
-        # Point estimate
-        marker_size = np.sqrt(row['Weight']) * 8  # Size proportional to weight
-        ax1.scatter(row['Effect_Size'], i, s=marker_size, 
-                   color=color, alpha=0.8, edgecolors='black', linewidth=1)
-        
-        # Confidence interval caps
-        ax1.plot([row['Lower_CI'], row['Lower_CI']], [i-0.1, i+0.1], 
-                 color=color, linewidth=2)
-        ax1.plot([row['Upper_CI'], row['Upper_CI']], [i-0.1, i+0.1], 
-                 color=color, linewidth=2)
+    # Confidence intervals, caps, point estimates and value labels, batched
+    labeled = forest_render.draw_forest(ax1, df['Effect_Size'], df['Lower_CI'], 
+                                        df['Upper_CI'], df['Weight'], 
+                                        df['Study_Type'].map(colors), 
+                                        label_mode=label_mode)
+    
+    # Pooled random-effects estimate as a diamond below the studies
+    row_scale = max(1, len(df) / 50)
+    diamond_y = -row_scale
+    ax1.fill([pooled['lower'], pooled['estimate'], pooled['upper'], pooled['estimate']], 
+             [diamond_y, diamond_y + 0.25 * row_scale, diamond_y, diamond_y - 0.25 * row_scale], 
+             color='black', alpha=0.8)
+    ax1.text(pooled['upper'] + 0.05, diamond_y, 
+             f"{pooled['estimate']:.2f} [{pooled['lower']:.2f}, {pooled['upper']:.2f}]\n"
+             f"τ² = {pooled['tau2']:.3f}, I² = {pooled['I2']:.0f}%", 
+             va='center', fontsize=8, fontweight='bold')
     
     # Add vertical line at no effect (0)
     ax1.axvline(x=0, color='black', linestyle='--', alpha=0.5)
     
-    # Formatting
-    ax1.set_yticks(y_positions)
-    ax1.set_yticklabels(df['Study'], fontsize=10)
+    # Formatting; dense plots only label the rows that carry a value label
+    ax1.set_yticks(np.append(labeled, diamond_y))
+    ax1.set_yticklabels(list(df['Study'].to_numpy()[labeled]) 
+                        + ['Pooled effect\n(random effects, REML)'], 
+                        fontsize=10 if len(labeled) == len(df) else 7)
+    ax1.set_ylim(diamond_y - 0.7 * row_scale, len(df) - 0.3)
     ax1.set_xlabel('Effect Size (Cohen\'s d)', fontsize=12, fontweight='bold')
     ax1.set_title('Forest Plot: Athlete Financial Literacy Intervention Effects', 
                   fontsize=14, fontweight='bold', pad=20)
     ax1.grid(True, alpha=0.3)
-    ax1.set_xlim(-0.8, 1.2)
-    
-    # Add effect size labels
-    for i, row in df.iterrows():
-        ax1.text(row['Effect_Size'] + 0.05, i, 
-                f"{row['Effect_Size']:.2f}\n[{row['Lower_CI']:.2f}, {row['Upper_CI']:.2f}]", 
-                va='center', fontsize=8, 
-                bbox=dict(boxstyle="round,pad=0.2", facecolor='white', alpha=0.8))
+    ax1.set_xlim(min(-0.8, df['Lower_CI'].min() - 0.1), 
+                 max(1.2, df['Upper_CI'].max() + 0.1))
     
-    # Summary statistics table
+    # Summary statistics table; one row per design once studies don't fit
     ax2.axis('off')
     ax2.text(0.1, 0.95, 'Study Characteristics', fontsize=12, fontweight='bold', 
              transform=ax2.transAxes)
     
-    table_data = []
-    for i, row in df.iterrows():
-        table_data.append([
-            f"n = {row['Sample_Size']}", 
-            f"{row['Weight']:.1f}%",
-            row['Study_Type']
-        ])
+    if len(df) <= FOREST_TABLE_ROWS:
+        table_data = [[f"n = {row.Sample_Size}", f"{row.Weight:.1f}%", row.Study_Type] 
+                      for row in df.itertuples()]
+        row_labels = [s.split('\n')[0] for s in df['Study']]
+        row_types = list(df['Study_Type'])
+        col_labels = ['Sample Size', 'Weight', 'Design']
+    else:
+        by_design = df.groupby('Study_Type', sort=False).agg(
+            k=('Study', 'size'), n=('Sample_Size', 'sum'), weight=('Weight', 'sum'))
+        table_data = [[f"{row.k}", f"n = {row.n:,}", f"{row.weight:.1f}%"] 
+                      for row in by_design.itertuples()]
+        row_labels = row_types = list(by_design.index)
+        col_labels = ['Studies', 'Sample Size', 'Weight']
     
     table = ax2.table(cellText=table_data,
-                     colLabels=['Sample Size', 'Weight', 'Design'],
-                     rowLabels=[s.split('\n')[0] for s in df['Study']],
+                     colLabels=col_labels,
+                     rowLabels=row_labels,
                      cellLoc='center',
                      loc='upper left',
                      bbox=[0, 0.1, 1, 0.8])
@@ -278,7 +308,7 @@ def create_forest_plot():
     table.scale(1, 2)
     
     # Color code table rows
-    for i, study_type in enumerate(df['Study_Type']):
+    for i, study_type in enumerate(row_types):
         color = colors[study_type]
         for j in range(len(table_data[0])):
             table[(i+1, j)].set_facecolor(color)
@@ -303,115 +333,56 @@ def create_forest_plot():
              fontsize=9, va='top', 
              bbox=dict(boxstyle="round,pad=0.3", facecolor='lightgray', alpha=0.7))
     
-    plt.tight_layout()
-    plt.savefig('/home/sandbox/forest_plot.png', dpi=300, bbox_inches='tight')
-    plt.savefig('/home/sandbox/forest_plot.pdf', dpi=300, bbox_inches='tight')
-    plt.close()
+    with render_trace.span('tight_layout'):
+        plt.tight_layout()
+    export_figure(fig, 'forest_plot')
 
-def create_study_quality_heatmap():
+def create_study_quality_heatmap(dataset=None):
     """Create heatmap showing study quality assessment"""
+    import risk_of_bias
     
-    # Quality assessment data
-    quality_data = {
-        'Study': ['Rubin et al. (2021)', 'Moolman (2023)', 
-                 'Hong & Fraser (2022)', 'Hong & Fraser (2021)', 
-                 'McCoy et al. (2019)'],
-        'Selection Bias': [3, 1, 1, 2, 2],  # 1=Low, 2=Moderate, 3=High
-        'Performance Bias': [3, 0, 0, 0, 0],  # 0=N/A
-        'Detection Bias': [2, 1, 1, 1, 1],
-        'Attrition Bias': [1, 1, 1, 1, 1],
-        'Reporting Bias': [1, 1, 1, 1, 1],
-        'Overall Quality': [2, 2, 2, 2, 2]
-    }
-    
-    df = pd.DataFrame(quality_data)
-    df = df.set_index('Study')
-    
-    # Replace 0 with NaN for N/A values
-    df = df.replace(0, np.nan)
+    # Domain judgments (+ low, - moderate, × high, grey = N/A); overall derived by rule
+    dataset = dataset or review_dataset.load_dataset()
+    assessment = dataset.risk_of_bias
     
-    fig, ax = plt.subplots(figsize=(10, 6))
-    
-    # Create heatmap
-    sns.heatmap(df, annot=True, cmap='RdYlGn_r', center=2,
-                vmin=1, vmax=3, cbar_kws={'label': 'Risk of Bias'},
-                fmt='g', linewidths=0.5, ax=ax)
+    fig, (ax, ax_summary) = plt.subplots(1, 2, figsize=(15, 6), 
+                                         gridspec_kw={'width_ratios': [3, 2]})
     
+    # Traffic-light grid; glyphs drawn as one scatter per risk level
+    risk_of_bias.plot_traffic_light(ax, assessment)
     ax.set_title('Study Quality Assessment Heatmap', fontsize=14, fontweight='bold')
     ax.set_xlabel('Quality Domains', fontsize=12, fontweight='bold')
     ax.set_ylabel('Studies', fontsize=12, fontweight='bold')
     
-    # Add legend
-    legend_text = """
-    Risk of Bias Scale:
-    1 = Low Risk (Green)
-    2 = Moderate Risk (Yellow)  
-    3 = High Risk (Red)
-    Grey = Not Applicable
-    """
-    ax.text(1.15, 0.5, legend_text, transform=ax.transAxes, 
-            fontsize=9, va='center',
-            bbox=dict(boxstyle="round,pad=0.3", facecolor='white', alpha=0.8))
+    # Share of judgments per domain, weighted by sample size
+    risk_of_bias.plot_summary(ax_summary, assessment, weighted=True)
+    ax_summary.set_title(f'Risk of Bias Summary\n(overall: {assessment.rule} rule)', 
+                         fontsize=12, fontweight='bold')
     
-    plt.tight_layout()
-    plt.savefig('/home/sandbox/quality_heatmap.png', dpi=300, bbox_inches='tight')
-    plt.savefig('/home/sandbox/quality_heatmap.pdf', dpi=300, bbox_inches='tight')
-    plt.close()
+    with render_trace.span('tight_layout'):
+        plt.tight_layout()
+    export_figure(fig, 'quality_heatmap')
 
-def create_intervention_components_chart():
+def create_intervention_components_chart(dataset=None):
     """Create chart showing intervention components across studies"""
+    import matrix_render
     
-    # Intervention components data
-    components = [
-        'Budgeting/Money Management',
-        'Investment Education', 
-        'Contract Literacy',
-        'Tax Planning',
-        'Career Transition Planning',
-        'Peer Counseling',
-        'Practical Exercises',
-        'Online Resources',
-        'Follow-up Support'
-    ]
-    
-    studies = ['Rubin et al.\n(2021)', 'Moolman\n(2023)', 'Hong & Fraser\n(2022)', 
-               'Hong & Fraser\n(2021)', 'McCoy et al.\n(2019)']
-    
-    # Binary matrix: 1 = component present, 0 = component absent
-    component_matrix = np.array([
-        [1, 0, 1, 0, 1],  # Budgeting
-        [1, 1, 1, 1, 0],  # Investment
-        [0, 1, 1, 1, 0],  # Contract
-        [0, 1, 1, 1, 0],  # Tax
-        [1, 1, 1, 1, 0],  # Career Transition
-        [1, 0, 0, 0, 0],  # Peer Counseling
-        [1, 0, 0, 0, 1],  # Practical Exercises
-        [0, 0, 1, 0, 0],  # Online Resources
-        [0, 0, 1, 0, 0]   # Follow-up
-    ])
+    # Binary component x study matrix: 1 = component present, 0 = absent
+    dataset = dataset or review_dataset.load_dataset()
+    components = dataset.components
+    studies = [label.replace(' (', '\n(') for label in dataset.study_labels]
+    component_matrix = dataset.component_matrix
     
     fig, ax = plt.subplots(figsize=(12, 8))
     
-    # Create heatmap
-    im = ax.imshow(component_matrix, cmap='RdYlBu_r', aspect='auto')
-    
-    # Set ticks and labels
-    ax.set_xticks(np.arange(len(studies)))
-    ax.set_yticks(np.arange(len(components)))
-    ax.set_xticklabels(studies)
-    ax.set_yticklabels(components)
+    # Create heatmap with ✓/✗ glyphs; large matrices switch to a clustered raster
+    im, _, _ = matrix_render.draw_matrix(ax, component_matrix, components, studies, 
+                                         cmap='RdYlBu_r', 
+                                         glyphs={1: ('✓', 'white'), 0: ('✗', 'black')})
     
     # Rotate the tick labels and set their alignment
     plt.setp(ax.get_xticklabels(), rotation=45, ha="right", rotation_mode="anchor")
     
-    # Add text annotations
-    for i in range(len(components)):
-        for j in range(len(studies)):
-            text = '✓' if component_matrix[i, j] == 1 else '✗'
-            color = 'white' if component_matrix[i, j] == 1 else 'black'
-            ax.text(j, i, text, ha="center", va="center", 
-                   color=color, fontsize=12, fontweight='bold')
-    
     ax.set_title('Intervention Components Across Studies', fontsize=14, fontweight='bold')
     ax.set_xlabel('Studies', fontsize=12, fontweight='bold')
     ax.set_ylabel('Intervention Components', fontsize=12, fontweight='bold')
@@ -422,20 +393,18 @@ def create_intervention_components_chart():
     cbar.set_ticks([0, 1])
     cbar.set_ticklabels(['Absent', 'Present'])
     
-    plt.tight_layout()
-    plt.savefig('/home/sandbox/intervention_components.png', dpi=300, bbox_inches='tight')
-    plt.savefig('/home/sandbox/intervention_components.pdf', dpi=300, bbox_inches='tight')
-    plt.close()
+    with render_trace.span('tight_layout'):
+        plt.tight_layout()
+    export_figure(fig, 'intervention_components')
 
-def create_outcome_measures_comparison():
+def create_outcome_measures_comparison(dataset=None):
     """Create comparison of outcome measures across studies"""
     
+    dataset = dataset or review_dataset.load_dataset()
     fig, (ax1, ax2) = plt.subplots(1, 2, figsize=(16, 8))
     
     # Outcome types frequency
-    outcome_types = ['Financial Knowledge', 'Financial Behavior', 'Attitudes/Self-Efficacy', 
-                    'Satisfaction/Acceptability', 'Content Needs', 'Organizational Support']
-    frequencies = [2, 1, 2, 1, 1, 1]
+    outcome_types, frequencies = zip(*dataset.synthesis('outcome_types').items())
     colors = plt.cm.Set3(np.linspace(0, 1, len(outcome_types)))
     
     bars = ax1.bar(range(len(outcome_types)), frequencies, color=colors, alpha=0.8, 
@@ -453,9 +422,7 @@ def create_outcome_measures_comparison():
                 f'{freq}', ha='center', va='bottom', fontweight='bold')
     
     # Study design distribution
-    designs = ['Mixed-Methods Pilot', 'Qualitative Interview', 'Organizational Audit', 
-              'Cross-Sectional Survey', 'Content Analysis']
-    design_counts = [1, 2, 1, 1, 1]
+    designs, design_counts = zip(*dataset.synthesis('study_designs').items())
     
     wedges, texts, autotexts = ax2.pie(design_counts, labels=designs, autopct='%1.0f%%',
                                       colors=colors[:len(designs)], startangle=90)
@@ -466,13 +433,19 @@ def create_outcome_measures_comparison():
         autotext.set_color('white')
         autotext.set_fontweight('bold')
     
-    plt.tight_layout()
-    plt.savefig('/home/sandbox/outcome_measures_comparison.png', dpi=300, bbox_inches='tight')
-    plt.savefig('/home/sandbox/outcome_measures_comparison.pdf', dpi=300, bbox_inches='tight')
-    plt.close()
+    with render_trace.span('tight_layout'):
+        plt.tight_layout()
+    export_figure(fig, 'outcome_measures_comparison')
 
-def create_evidence_synthesis_dashboard():
+def create_evidence_synthesis_dashboard(dataset=None):
     """Create comprehensive evidence synthesis dashboard"""
+    import matplotlib.gridspec as gridspec
+    
+    import meta_analysis
+    import risk_of_bias
+    
+    dataset = dataset or review_dataset.load_dataset()
+    counts = dataset.prisma_counts
     
     fig = plt.figure(figsize=(20, 12))
     gs = gridspec.GridSpec(3, 4, figure=fig, hspace=0.3, wspace=0.3)
@@ -483,9 +456,10 @@ def create_evidence_synthesis_dashboard():
     
     # 1. Search results summary (top left)
     ax1 = fig.add_subplot(gs[0, 0])
-    databases = ['SciSpace', 'Google Scholar', 'PubMed']
-    results = [100, 20, 20]
-    bars = ax1.bar(databases, results, color=['#2E86AB', '#A23B72', '#F18F01'], alpha=0.8)
+    databases, results = zip(*counts.top_sources(3))
+    bars = ax1.bar(databases, results, 
+                   color=['#2E86AB', '#A23B72', '#F18F01', '#808080'][:len(databases)], 
+                   alpha=0.8)
     ax1.set_title('Database Search Results', fontweight='bold')
     ax1.set_ylabel('Number of Papers')
     for bar, result in zip(bars, results):
@@ -495,31 +469,31 @@ def create_evidence_synthesis_dashboard():
     
     # 2. Screening funnel (top middle)
     ax2 = fig.add_subplot(gs[0, 1])
-    stages = ['Initial\n(n=140)', 'Screened\n(n=140)', 'Eligible\n(n=5)', 'Included\n(n=5)']
-    counts = [140, 140, 5, 5]
+    stage_counts = [n for _, n in counts.stages()]
+    stages = [f'{label}\n(n={n})' 
+              for label, n in zip(['Initial', 'Screened', 'Eligible', 'Included'], 
+                                  stage_counts)]
     x_pos = range(len(stages))
-    ax2.plot(x_pos, counts, 'o-', linewidth=3, markersize=8, color='#2E86AB')
+    ax2.plot(x_pos, stage_counts, 'o-', linewidth=3, markersize=8, color='#2E86AB')
     ax2.set_xticks(x_pos)
     ax2.set_xticklabels(stages)
     ax2.set_title('Study Selection Process', fontweight='bold')
     ax2.set_ylabel('Number of Studies')
-    ax2.set_yscale('log')
+    # symlog keeps empty stages (n = 0) on the axis
+    ax2.set_yscale('symlog' if 0 in stage_counts else 'log')
     ax2.grid(True, alpha=0.3)
     
     # 3. Study quality overview (top right)
     ax3 = fig.add_subplot(gs[0, 2:])
-    quality_levels = ['High Quality', 'Moderate Quality', 'Low Quality']
-    quality_counts = [0, 5, 0]  # All studies rated as moderate quality
-    colors_quality = ['#2E8B57', '#FFD700', '#DC143C']
-    pie = ax3.pie(quality_counts, labels=quality_levels, autopct='%1.0f%%', 
+    quality = dataset.quality_distribution[dataset.quality_distribution > 0]
+    colors_quality = [risk_of_bias.QUALITY_COLORS[level] for level in quality.index]
+    pie = ax3.pie(quality, labels=quality.index, autopct='%1.0f%%', 
                   colors=colors_quality, startangle=90)
     ax3.set_title('Overall Study Quality Distribution', fontweight='bold')
     
     # 4. Intervention types (middle left)
     ax4 = fig.add_subplot(gs[1, 0])
-    intervention_types = ['Educational\nProgram', 'Content\nFramework', 'Organizational\nAudit', 
-                         'Needs\nAssessment', 'Comparative\nAnalysis']
-    type_counts = [1, 1, 1, 1, 1]
+    intervention_types, type_counts = zip(*dataset.synthesis('intervention_types').items())
     bars = ax4.bar(range(len(intervention_types)), type_counts, 
                    color=plt.cm.Set2(np.linspace(0, 1, len(intervention_types))))
     ax4.set_xticks(range(len(intervention_types)))
@@ -529,9 +503,7 @@ def create_evidence_synthesis_dashboard():
     
     # 5. Population characteristics (middle middle)
     ax5 = fig.add_subplot(gs[1, 1])
-    populations = ['College\nAthletes', 'Professional\nAthletes', 'Retired\nAthletes', 
-                  'Mixed\nPopulation']
-    pop_counts = [2, 1, 1, 1]
+    populations, pop_counts = zip(*dataset.synthesis('populations').items())
     bars = ax5.bar(populations, pop_counts, color='#A23B72', alpha=0.7)
     ax5.set_title('Target Populations', fontweight='bold')
     ax5.set_ylabel('Number of Studies')
@@ -542,10 +514,19 @@ def create_evidence_synthesis_dashboard():
     
     # 6. Effect sizes mini forest plot (middle right)
     ax6 = fig.add_subplot(gs[1, 2:])
-    studies_short = ['Rubin (Knowledge)', 'Rubin (Satisfaction)', 'McCoy (Self-Efficacy)']
-    effects = [0.65, 0.85, -0.32]
-    ci_lower = [0.28, 0.61, -0.58]
-    ci_upper = [1.02, 1.09, -0.06]
+    key_outcomes = {'Financial Knowledge': 'Rubin (Knowledge)', 
+                    'Participant Satisfaction': 'Rubin (Satisfaction)', 
+                    'Financial Self-Efficacy': 'McCoy (Self-Efficacy)'}
+    by_outcome, _ = meta_analysis.meta_analyze_table(
+        dataset.effects, by='Outcome', method='REML')
+    # Subsets of the review (review_batch) may lack some of the outcomes
+    key_outcomes = {outcome: label for outcome, label in key_outcomes.items()
+                    if outcome in by_outcome.index}
+    by_outcome = by_outcome.loc[list(key_outcomes)]
+    studies_short = list(key_outcomes.values())
+    effects = by_outcome['estimate']
+    ci_lower = by_outcome['lower']
+    ci_upper = by_outcome['upper']
     
     y_pos = range(len(studies_short))
     for i, (study, effect, lower, upper) in enumerate(zip(studies_short, effects, ci_lower, ci_upper)):
@@ -563,8 +544,7 @@ def create_evidence_synthesis_dashboard():
     
     # 7. Research gaps (bottom left)
     ax7 = fig.add_subplot(gs[2, 0])
-    gaps = ['RCTs', 'Long-term\nFollow-up', 'Behavioral\nOutcomes', 'Standardized\nMeasures']
-    gap_severity = [5, 4, 5, 4]  # Severity score out of 5
+    gaps, gap_severity = zip(*dataset.synthesis('research_gaps').items())  # out of 5
     bars = ax7.bar(gaps, gap_severity, color='#DC143C', alpha=0.7)
     ax7.set_title('Research Gaps\n(Severity Score)', fontweight='bold')
     ax7.set_ylabel('Severity (1-5)')
@@ -576,8 +556,7 @@ def create_evidence_synthesis_dashboard():
     
     # 8. Recommendations priority (bottom middle)
     ax8 = fig.add_subplot(gs[2, 1])
-    recommendations = ['Conduct\nRCTs', 'Develop\nMeasures', 'Scale\nPrograms', 'Evaluate\nLong-term']
-    priority_scores = [5, 4, 3, 4]
+    recommendations, priority_scores = zip(*dataset.synthesis('recommendations').items())
     bars = ax8.bar(recommendations, priority_scores, color='#228B22', alpha=0.7)
     ax8.set_title('Recommendation\nPriorities', fontweight='bold')
     ax8.set_ylabel('Priority (1-5)')
@@ -591,17 +570,22 @@ def create_evidence_synthesis_dashboard():
     ax9 = fig.add_subplot(gs[2, 2:])
     ax9.axis('off')
     
-    summary_stats = """
+    quality_lines = '\n'.join(f"    • {level}: {n} studies" 
+                              for level, n in dataset.quality_distribution.items())
+    n_pilots = int((dataset.studies['study_type'] == 'RCT Pilot').sum())
+    effect_lines = '\n'.join(
+        f"    • {outcome.replace('Participant ', '').replace('Financial Self', 'Self')}: "
+        f"d = {by_outcome.loc[outcome, 'estimate']:.2f}" 
+        for outcome in key_outcomes)
+    summary_stats = f"""
     SYSTEMATIC REVIEW SUMMARY
     
-    Total Studies Identified: 140
-    Studies Included: 5
-    Intervention Studies: 1 (pilot)
+    Total Studies Identified: {counts.identified}
+    Studies Included: {counts.included}
+    Intervention Studies: {n_pilots} (pilot)
     
     Quality Assessment:
-    • High Quality: 0 studies
-    • Moderate Quality: 5 studies  
-    • Low Quality: 0 studies
+{quality_lines}
     
     Key Findings:
     • Limited high-quality evidence
@@ -610,36 +594,630 @@ def create_evidence_synthesis_dashboard():
     • Urgent need for RCTs
     
     Effect Sizes (where available):
-    • Financial Knowledge: d = 0.65
-    • Satisfaction: d = 0.85
-    • Self-Efficacy: d = -0.32
+{effect_lines}
     """
     
     ax9.text(0.05, 0.95, summary_stats, transform=ax9.transAxes, 
              fontsize=11, va='top', ha='left',
              bbox=dict(boxstyle="round,pad=0.5", facecolor='lightblue', alpha=0.3))
     
-    plt.savefig('/home/sandbox/evidence_synthesis_dashboard.png', dpi=300, bbox_inches='tight')
-    plt.savefig('/home/sandbox/evidence_synthesis_dashboard.pdf', dpi=300, bbox_inches='tight')
-    plt.close()
+    export_figure(fig, 'evidence_synthesis_dashboard')
 
-if __name__ == "__main__":
-    print("Creating PRISMA flow diagram...")
-    create_prisma_flow_diagram()
-    
-    print("Creating forest plot...")
-    create_forest_plot()
-    
-    print("Creating study quality heatmap...")
-    create_study_quality_heatmap()
-    
-    print("Creating intervention components chart...")
-    create_intervention_components_chart()
+def create_sensitivity_analysis_plot(dataset=None):
+    """Create leave-one-out, cumulative and bootstrap sensitivity panels"""
+    from matplotlib.collections import LineCollection
+    import forest_render
+    import matrix_render
+    import meta_analysis
+    import sensitivity_analysis
+    
+    dataset = dataset or review_dataset.load_dataset()
+    df = dataset.effects
+    loo, cum = sensitivity_analysis.sensitivity_table(df, method='REML')
+    y = df['Effect_Size'].to_numpy()
+    se = meta_analysis.se_from_ci(df['Lower_CI'], df['Upper_CI'])
+    overall = meta_analysis.meta_analyze(y, se=se, method='REML')
+    boot = sensitivity_analysis.resample(y, se, n_resamples=10000, method='REML')
+    
+    fig, (ax1, ax2, ax3) = plt.subplots(1, 3, figsize=(20, 7), 
+                                        gridspec_kw={'width_ratios': [1.2, 1.2, 1]})
+    
+    def forest_panel(ax, table, labels, title, color):
+        # One LineCollection and one scatter per panel, as in the forest plot
+        n = len(table)
+        rows = np.arange(n, dtype=float)[::-1]
+        lower, upper = table['lower'].to_numpy(), table['upper'].to_numpy()
+        dense = n > forest_render.MAX_LABELS
+        rasterize = n > forest_render.RASTERIZE_ROWS
+        ax.add_collection(LineCollection(forest_render.forest_segments(lower, upper, rows), 
+                                         colors=color, linewidths=1 if dense else 2, 
+                                         rasterized=rasterize))
+        ax.scatter(table['estimate'], rows, marker='s', s=9 if dense else 49, color=color, 
+                   edgecolors='black', linewidths=0.3 if dense else 1, zorder=3, 
+                   rasterized=rasterize)
+        ax.update_datalim(np.column_stack([np.r_[lower, upper], np.r_[rows, rows]]))
+        ax.autoscale_view()
+        ax.axvline(x=overall.estimate, color='black', linestyle='-', alpha=0.6, 
+                   label=f'All studies: {overall.estimate:.2f}')
+        ax.axvspan(overall.lower, overall.upper, color='gray', alpha=0.15)
+        ax.axvline(x=0, color='black', linestyle='--', alpha=0.5)
+        # Dense panels label an evenly spaced subset of rows, one line each
+        labeled = matrix_render.label_rows(n)
+        ax.set_yticks(rows[labeled])
+        if len(labeled) == n:
+            ax.set_yticklabels(labels, fontsize=9)
+        else:
+            ax.set_yticklabels([labels[i].split('\n')[0] for i in labeled], fontsize=7)
+        ax.set_xlabel('Pooled Effect Size (Cohen\'s d)', fontsize=11, fontweight='bold')
+        ax.set_title(title, fontsize=13, fontweight='bold')
+        ax.grid(True, alpha=0.3)
+        ax.legend(loc='best', fontsize=9)
+    
+    # 1. Leave-one-out
+    forest_panel(ax1, loo, [f'Omitting {study}' for study in df['Study']], 
+                 'Leave-One-Out Analysis', '#2E86AB')
+    
+    # 2. Cumulative by publication year
+    order = np.argsort(df['Year'].to_numpy(), kind='stable')
+    forest_panel(ax2, cum, [f'+ {study} (k = {k})' 
+                            for study, k in zip(df['Study'].to_numpy()[order], cum['k'])], 
+                 'Cumulative Meta-Analysis by Year', '#A23B72')
+    
+    # 3. Bootstrap distribution of the pooled effect
+    ax3.hist(boot.estimates, bins=60, color='#F18F01', alpha=0.8, edgecolor='white')
+    ax3.axvline(x=boot.observed, color='black', linewidth=2, label=f'Observed: {boot.observed:.2f}')
+    ax3.axvline(x=boot.lower, color='#C73E1D', linestyle='--', 
+                label=f'Bootstrap 95% CI: [{boot.lower:.2f}, {boot.upper:.2f}]')
+    ax3.axvline(x=boot.upper, color='#C73E1D', linestyle='--')
+    ax3.axvspan(overall.lower, overall.upper, color='gray', alpha=0.15, 
+                label=f'REML 95% CI: [{overall.lower:.2f}, {overall.upper:.2f}]')
+    ax3.set_xlabel('Pooled Effect Size (Cohen\'s d)', fontsize=11, fontweight='bold')
+    ax3.set_ylabel('Resamples')
+    ax3.set_title(f'Bootstrap ({len(boot.estimates):,} resamples)\n'
+                  f'Permutation p = {boot.p_value:.3f}', fontsize=13, fontweight='bold')
+    ax3.legend(loc='upper left', fontsize=8)
+    ax3.grid(True, alpha=0.3)
+    
+    with render_trace.span('tight_layout'):
+        plt.tight_layout()
+    export_figure(fig, 'sensitivity_analysis')
+
+def create_tag_cooccurrence_heatmap(dataset=None):
+    """Create heatmap of how often topic tags are assigned together"""
+    import matrix_render
+    import tag_cooccurrence
     
-    print("Creating outcome measures comparison...")
-    create_outcome_measures_comparison()
+    # Most frequent topic tags in the screening library, PRISMA decisions excluded
+    dataset = dataset or review_dataset.load_dataset()
+    tags = dataset.tag_incidence
+    top = tags.subset(tags.top(25, min_count=tag_cooccurrence.MIN_COUNT))
+    frequencies = top.frequencies
     
-    print("Creating evidence synthesis dashboard...")
-    create_evidence_synthesis_dashboard()
+    fig, (ax1, ax2) = plt.subplots(1, 2, figsize=(16, 8), 
+                                   gridspec_kw={'width_ratios': [1, 2.2]})
+    
+    # Tag frequencies, most frequent at the top
+    if not top.tags:
+        ax1.text(0.5, 0.5, 'No topic tags', ha='center', va='center', 
+                 transform=ax1.transAxes)
+        ax1.set_axis_off()
+    else:
+        ax1.barh(np.arange(len(top.tags)), frequencies, color='#3ba3ec', alpha=0.8)
+        ax1.set_yticks(np.arange(len(top.tags)))
+        ax1.set_yticklabels(top.tags, fontsize=8)
+        ax1.set_ylim(len(top.tags) - 0.5, -0.5)
+        ax1.set_xlabel('Records', fontsize=12, fontweight='bold')
+        ax1.grid(True, alpha=0.3, axis='x')
+    ax1.set_title('Most Frequent Topic Tags', fontsize=12, fontweight='bold')
+    
+    if len(top.tags) < 2:
+        ax2.text(0.5, 0.5, 'Too few tagged records for co-occurrence', 
+                 ha='center', va='center', transform=ax2.transAxes)
+        ax2.set_axis_off()
+    else:
+        # Jaccard similarity of tag pairs, clustered so related tags sit together
+        similarity = tag_cooccurrence.cooccurrence(top, 'jaccard').toarray()
+        np.fill_diagonal(similarity, np.nan)
+        im, _, _ = matrix_render.draw_matrix(ax2, similarity, top.tags, top.tags, 
+                                             cmap='YlGnBu', vmin=0, order='cluster', 
+                                             linewidths=0.5, na_color='white')
+        plt.setp(ax2.get_xticklabels(), rotation=90, fontsize=8)
+        plt.setp(ax2.get_yticklabels(), fontsize=8)
+        cbar = fig.colorbar(im, ax=ax2, shrink=0.7)
+        cbar.set_label('Jaccard similarity', rotation=270, labelpad=15)
+        ax2.set_title('Tag Co-occurrence', fontsize=12, fontweight='bold')
+    
+    fig.suptitle(f'Topic Tags Across {tags.matrix.shape[0]} Screened Records', 
+                 fontsize=14, fontweight='bold')
+    with render_trace.span('tight_layout'):
+        plt.tight_layout()
+    export_figure(fig, 'tag_cooccurrence')
+
+def create_publication_timeline(dataset=None):
+    """Create timeline of screened records by publication year and item type"""
+    import pandas as pd
+    
+    # Records per publication year, stacked by item type
+    dataset = dataset or review_dataset.load_dataset()
+    dates = dataset.record_dates.dropna(subset=['Year'])
+    counts = pd.crosstab(dates['Year'].astype(int), dates['Item Type'].astype(str))
+    years = np.arange(counts.index.min(), counts.index.max() + 1) if len(counts) else []
+    counts = counts.reindex(years, fill_value=0)
+    counts = counts[counts.sum().sort_values(ascending=False).index]
+    
+    fig, ax = plt.subplots(figsize=(14, 7))
+    colors = plt.rcParams['axes.prop_cycle'].by_key()['color']
+    bottom = np.zeros(len(counts))
+    for i, item_type in enumerate(counts.columns):
+        # Zotero item types are camelCase: journalArticle -> journal article
+        label = ''.join(f' {c.lower()}' if c.isupper() else c for c in item_type)
+        # Past the palette's six colors, repeat them hatched
+        ax.bar(counts.index, counts[item_type], bottom=bottom, width=0.85, 
+               color=colors[i % len(colors)], hatch='//' if i >= len(colors) else None, 
+               alpha=0.85, label=label)
+        bottom += counts[item_type].to_numpy()
+    
+    ax.set_xlabel('Publication Year', fontsize=12, fontweight='bold')
+    ax.set_ylabel('Records per Year', fontsize=12, fontweight='bold')
+    ax.grid(True, alpha=0.3, axis='y')
+    ax.legend(loc='upper left', fontsize=9)
+    
+    # Cumulative share of the library published by each year
+    ax2 = ax.twinx()
+    cumulative = np.cumsum(bottom) / max(bottom.sum(), 1) * 100
+    ax2.plot(counts.index, cumulative, color='black', linewidth=2, 
+             marker='o', markersize=3, label='Cumulative %')
+    ax2.set_ylim(0, 105)
+    ax2.set_ylabel('Cumulative Records (%)', fontsize=12, fontweight='bold')
+    ax2.legend(loc='upper center', fontsize=9)
+    
+    ax.set_title(f'Publication Timeline of {len(dates)} Screened Records', 
+                 fontsize=14, fontweight='bold')
+    with render_trace.span('tight_layout'):
+        plt.tight_layout()
+    export_figure(fig, 'publication_timeline')
+
+# Bin widths for records added over time, finest whose bin count stays readable
+THROUGHPUT_BINS = [('minute', '1min'), ('hour', '1h'), ('day', '1D'), ('week', '7D')]
+MAX_THROUGHPUT_BINS = 120
+
+def create_screening_throughput_chart(dataset=None):
+    """Create chart of records added to the screening library over time"""
+    import pandas as pd
+    
+    dataset = dataset or review_dataset.load_dataset()
+    added = dataset.record_dates['Added'].dropna().sort_values()
+    
+    fig, ax = plt.subplots(figsize=(14, 6))
+    if added.empty:
+        ax.text(0.5, 0.5, 'No Date Added values in the screening export', 
+                ha='center', va='center', transform=ax.transAxes)
+        ax.set_axis_off()
+    else:
+        # Imports often land in bursts of a few minutes; weeks-long reviews need coarser bins
+        span = added.iloc[-1] - added.iloc[0]
+        for unit, width in THROUGHPUT_BINS:
+            if span / pd.Timedelta(width) <= MAX_THROUGHPUT_BINS:
+                break
+        counts = added.dt.floor(width).value_counts().sort_index()
+        counts = counts.reindex(pd.date_range(counts.index.min(), counts.index.max(), 
+                                              freq=width), fill_value=0)
+        width = pd.Timedelta(width) * 0.85
+        
+        ax.bar(counts.index, counts.to_numpy(), width=width, align='edge', 
+               color='#3ba3ec', alpha=0.8, label=f'Records per {unit}')
+        ax.set_ylabel(f'Records Added per {unit.title()}', fontsize=12, fontweight='bold')
+        ax.set_xlabel('Date Added', fontsize=12, fontweight='bold')
+        ax.grid(True, alpha=0.3, axis='y')
+        fig.autofmt_xdate()
+        
+        ax2 = ax.twinx()
+        ax2.step(added, np.arange(1, len(added) + 1), where='post', color='black', 
+                 linewidth=2, label='Cumulative records')
+        ax2.set_ylim(0, len(added) * 1.05)
+        ax2.set_ylabel('Cumulative Records', fontsize=12, fontweight='bold')
+        
+        handles = ax.get_legend_handles_labels()[0] + ax2.get_legend_handles_labels()[0]
+        ax.legend(handles, [h.get_label() for h in handles], loc='upper left', fontsize=9)
+    
+    ax.set_title(f'Screening Library Throughput ({len(added)} Records Added)', 
+                 fontsize=14, fontweight='bold')
+    with render_trace.span('tight_layout'):
+        plt.tight_layout()
+    export_figure(fig, 'screening_throughput')
+
+def create_coauthorship_network(dataset=None):
+    """Create co-authorship network of the screened literature"""
+    import coauthorship
+    
+    dataset = dataset or review_dataset.load_dataset()
+    graph = dataset.coauthorship
+    n_components, components = graph.components()
+    communities = graph.communities()
+    rank = graph.pagerank()
+    nodes = coauthorship.drawn_nodes(graph, rank)
+    studies = dataset.extraction['studies']
+    years = dataset.screening_records['Publication Year'].to_numpy()
+    study_nodes = graph.study_authors(studies, years)
+    
+    fig, (ax1, ax2) = plt.subplots(1, 2, figsize=(18, 9), 
+                                   gridspec_kw={'width_ratios': [3, 1]})
     
-    print("All visualizations created successfully!")
\ No newline at end of file
+    # Network of collaborating authors, coloured by community
+    solo = int((graph.degree() == 0).sum())
+    ax1.set_title(f'Co-authorship Network of Screened Literature\n'
+                  f'{graph.n} authors, {graph.adjacency.nnz // 2} co-author pairs, '
+                  f'{n_components - solo} collaborating groups '
+                  f'({solo} single-author entries not shown)', 
+                  fontsize=14, fontweight='bold')
+    if not len(nodes):
+        ax1.text(0.5, 0.5, 'No co-authored records', ha='center', va='center', 
+                 transform=ax1.transAxes)
+        ax1.set_axis_off()
+    else:
+        with render_trace.span('network_layout', nodes=len(nodes)):
+            positions = coauthorship.layout(graph, nodes)
+        coauthorship.draw_network(ax1, graph, nodes, positions, communities, 
+                                  highlight=study_nodes)
+        if any(node >= 0 for node in study_nodes):
+            ax1.legend(loc='lower right', fontsize=9)
+        sizes = np.bincount(communities)
+        ax1.text(0.01, 0.01, f'Modularity: {graph.modularity(communities):.2f}\n'
+                 f'Largest community: {sizes.max()} authors\n'
+                 f'Node size: co-authors; colour: community', 
+                 transform=ax1.transAxes, fontsize=9, va='bottom', 
+                 bbox=dict(boxstyle="round,pad=0.3", facecolor='white', alpha=0.8))
+    
+    # Most central authors
+    if graph.n == 0:
+        ax2.text(0.5, 0.5, 'No authors in the screening export', ha='center', va='center', 
+                 transform=ax2.transAxes)
+        ax2.set_axis_off()
+    else:
+        top = np.argsort(-rank)[:15][::-1]
+        ax2.barh(range(len(top)), graph.papers[top], color='#4682B4', alpha=0.8)
+        ax2.set_yticks(range(len(top)))
+        ax2.set_yticklabels([graph.names[node] for node in top], fontsize=8)
+        for y, node in enumerate(top):
+            ax2.text(graph.papers[node] + 0.1, y, f'{graph.degree()[node]} co-authors', 
+                     va='center', fontsize=7)
+        ax2.set_xlabel('Papers in Export')
+        ax2.set_xlim(0, graph.papers[top].max() * 1.6)
+        ax2.grid(True, axis='x', alpha=0.3)
+    ax2.set_title('Most Central Authors\n(PageRank)', fontweight='bold')
+    
+    with render_trace.span('tight_layout'):
+        plt.tight_layout()
+    export_figure(fig, 'coauthorship_network')
+
+def _module_file(name):
+    """Path of a helper module's source, found without importing it"""
+    return importlib.util.find_spec(name).origin
+
+# Files (besides the figure's own code) whose contents a figure depends on
+# Every figure is drawn and saved through these
+EXPORT_INPUTS = (figure_export.__file__, render_trace.__file__)
+
+SCREENING_INPUTS = EXPORT_INPUTS + (prisma_counts.SCREENING_EXPORT, 
+                                    prisma_counts.enrichment_path(prisma_counts.SCREENING_EXPORT), 
+                                    prisma_counts.decision_log_path(prisma_counts.SCREENING_EXPORT), 
+                                    prisma_counts.decision_log_path(prisma_counts.SCREENING_EXPORT) + '-wal', 
+                                    prisma_counts.__file__, _module_file('decision_log'),
+                                    _module_file('dedup'), _module_file('zotero_export'),
+                                    review_dataset.__file__)
+
+EXTRACTION_INPUTS = EXPORT_INPUTS + (review_dataset.EXTRACTION_FILE, review_dataset.__file__)
+
+MATRIX_INPUTS = EXTRACTION_INPUTS + (_module_file('matrix_render'),)
+
+META_ANALYSIS_INPUTS = EXTRACTION_INPUTS + (_module_file('meta_analysis'),)
+
+FIGURES = [
+    ('PRISMA flow diagram', create_prisma_flow_diagram, 'prisma_flow_diagram',
+     SCREENING_INPUTS),
+    ('forest plot', create_forest_plot, 'forest_plot',
+     META_ANALYSIS_INPUTS + (_module_file('forest_render'), _module_file('matrix_render'))),
+    ('study quality heatmap', create_study_quality_heatmap, 'quality_heatmap',
+     MATRIX_INPUTS + (_module_file('risk_of_bias'),)),
+    ('intervention components chart', create_intervention_components_chart,
+     'intervention_components', MATRIX_INPUTS),
+    ('outcome measures comparison', create_outcome_measures_comparison,
+     'outcome_measures_comparison', EXTRACTION_INPUTS),
+    ('sensitivity analysis', create_sensitivity_analysis_plot, 'sensitivity_analysis',
+     META_ANALYSIS_INPUTS + (_module_file('sensitivity_analysis'), _module_file('forest_render'),
+                             _module_file('matrix_render'))),
+    ('evidence synthesis dashboard', create_evidence_synthesis_dashboard,
+     'evidence_synthesis_dashboard', 
+     SCREENING_INPUTS + META_ANALYSIS_INPUTS + (_module_file('risk_of_bias'),)),
+    ('tag co-occurrence heatmap', create_tag_cooccurrence_heatmap, 'tag_cooccurrence',
+     SCREENING_INPUTS + (_module_file('tag_cooccurrence'), _module_file('matrix_render'))),
+    ('publication timeline', create_publication_timeline, 'publication_timeline',
+     SCREENING_INPUTS + (_module_file('date_normalizer'),)),
+    ('screening throughput chart', create_screening_throughput_chart, 'screening_throughput',
+     SCREENING_INPUTS + (_module_file('date_normalizer'),)),
+    ('co-authorship network', create_coauthorship_network, 'coauthorship_network',
+     SCREENING_INPUTS + (review_dataset.EXTRACTION_FILE, _module_file('coauthorship'))),
+]
+
+def figure_parts():
+    """Screening columns and extraction sections each figure reads.
+
+    `watch` compares these inputs part by part and rebuilds a figure only
+    when a part it reads changed; other inputs count as whole files.
+    """
+    import dedup
+    
+    screening = {prisma_counts.SCREENING_EXPORT: 
+                 list(dict.fromkeys(prisma_counts.RECORD_COLUMNS + dedup.MATCH_COLUMNS))}
+    study_fields = ['studies.id', 'studies.label', 'studies.year', 
+                    'studies.study_type', 'studies.sample_size']
+    effects = study_fields + ['effects']
+    risk_of_bias = ['studies.label', 'studies.risk_of_bias', 'studies.sample_size', 
+                    'risk_of_bias_domains', 'risk_of_bias_rule']
+    extraction = lambda parts: {review_dataset.EXTRACTION_FILE: parts}
+    return {
+        'prisma_flow_diagram': screening,
+        'forest_plot': extraction(effects),
+        'quality_heatmap': extraction(risk_of_bias),
+        'intervention_components': extraction(['studies.label', 'studies.components', 
+                                               'components']),
+        'outcome_measures_comparison': extraction(['syntheses']),
+        'sensitivity_analysis': extraction(effects),
+        'evidence_synthesis_dashboard': {
+            **screening, 
+            **extraction(effects + risk_of_bias + ['syntheses'])},
+        'tag_cooccurrence': {prisma_counts.SCREENING_EXPORT: 
+                             list(dict.fromkeys(['Manual Tags'] + dedup.MATCH_COLUMNS))},
+        'publication_timeline': {prisma_counts.SCREENING_EXPORT: 
+                                 list(dict.fromkeys(['Date', 'Publication Year', 'Item Type', 
+                                                     'Manual Tags'] + dedup.MATCH_COLUMNS))},
+        'screening_throughput': {prisma_counts.SCREENING_EXPORT: 
+                                 list(dict.fromkeys(['Date Added', 'Manual Tags'] 
+                                                    + dedup.MATCH_COLUMNS))},
+        'coauthorship_network': {prisma_counts.SCREENING_EXPORT: 
+                                 list(dict.fromkeys(['Author', 'Publication Year', 
+                                                     'Manual Tags'] + dedup.MATCH_COLUMNS)), 
+                                 **extraction(['studies.label', 'studies.year'])},
+    }
+
+# Subcommand -> output stem of the figure it renders
+COMMANDS = {
+    'prisma': 'prisma_flow_diagram',
+    'forest': 'forest_plot',
+    'quality': 'quality_heatmap',
+    'components': 'intervention_components',
+    'outcomes': 'outcome_measures_comparison',
+    'sensitivity': 'sensitivity_analysis',
+    'dashboard': 'evidence_synthesis_dashboard',
+    'tags': 'tag_cooccurrence',
+    'timeline': 'publication_timeline',
+    'throughput': 'screening_throughput',
+    'network': 'coauthorship_network',
+}
+
+def figure_outputs(stem):
+    """Files written by the figure whose outputs are named `stem`"""
+    return figure_export.get_config().outputs(stem)
+
+def _init_render_worker(export_config=None, dataset=None, warm=False):
+    """Give each pool worker its own non-interactive Agg backend and style.
+
+    `dataset` is a `ReviewDataset` whose views the parent already built, so
+    workers share those tables instead of each deriving them again. `warm`
+    imports the analysis modules and builds the dataset up front, so a
+    long-lived worker's first render is as fast as later ones.
+    """
+    plt.switch_backend('Agg')
+    apply_style()
+    render_trace.enable_from_env()
+    if export_config is not None:
+        figure_export.configure(export_config)
+    if dataset is not None:
+        review_dataset.use_dataset(dataset)
+    if warm:
+        for module in ('meta_analysis', 'sensitivity_analysis', 'forest_render'):
+            importlib.import_module(module)
+        review_dataset.load_dataset().prepare()
+    plt.close('all')
+
+def _render_pool(workers, dataset=None, warm=False):
+    """Spawned render workers (fork is unsafe with matplotlib state)"""
+    pool = ProcessPoolExecutor(max_workers=workers,
+                               mp_context=multiprocessing.get_context('spawn'),
+                               initializer=_init_render_worker,
+                               initargs=(figure_export.get_config(), dataset, warm))
+    if warm:
+        # Workers start on demand; start them all now rather than on first use
+        for _ in range(workers):
+            pool.submit(os.getpid)
+    return pool
+
+def _render_figure(index):
+    """Render one entry of FIGURES, returning (index, seconds, error)"""
+    name, create, stem, _ = FIGURES[index]
+    start = time.perf_counter()
+    try:
+        with render_trace.figure(name, stem):
+            create()
+    except Exception:
+        plt.close('all')
+        return index, time.perf_counter() - start, traceback.format_exc()
+    return index, time.perf_counter() - start, None
+
+def render_all(jobs=1, cache=None, stems=None):
+    """Render every figure (or those whose output stem is in `stems`).
+
+    Figures render sequentially or across a process pool; a failing figure
+    is reported and the remaining figures still render. With a
+    `RenderCache`, figures whose code, data and style are unchanged since
+    the last run are restored from the cache instead of re-rendered.
+    Returns the list of names of figures that failed.
+    """
+    failed = []
+    keys = {}
+    pending = []
+    if cache is not None:
+        apply_style()
+        style = (render_cache.style_fingerprint(plt.rcParams)
+                 + figure_export.get_config().fingerprint())
+    for index, (name, create, stem, inputs) in enumerate(FIGURES):
+        if stems is not None and stem not in stems:
+            continue
+        if cache is not None:
+            keys[index] = render_cache.figure_key(name, create, style, inputs)
+            if cache.restore(name, keys[index], figure_outputs(stem)):
+                print(f"Reused {name} (unchanged)")
+                continue
+        pending.append(index)
+
+    def report(index, elapsed, error):
+        name, _, stem, _ = FIGURES[index]
+        if error is None:
+            print(f"Created {name} ({elapsed:.1f}s)")
+            if cache is not None:
+                cache.store(name, keys[index], figure_outputs(stem), elapsed)
+        else:
+            print(f"FAILED {name} ({elapsed:.1f}s):\n{error}", file=sys.stderr)
+            failed.append(name)
+            if cache is not None:
+                cache.mark_failed(name, keys[index])
+
+    if jobs == 1 or len(pending) <= 1:
+        if pending:
+            _init_render_worker()
+        for index in pending:
+            print(f"Creating {FIGURES[index][0]}...")
+            report(*_render_figure(index))
+    else:
+        # Build shared tables once here; screening counts only if a figure needs them
+        views = [view for view in review_dataset.VIEWS
+                 if view not in review_dataset.SCREENING_VIEWS
+                 or any(prisma_counts.SCREENING_EXPORT in FIGURES[i][3] for i in pending)]
+        with render_trace.span('dataset.prepare'):
+            dataset = review_dataset.load_dataset().prepare(views)
+        with _render_pool(min(jobs, len(pending)), dataset) as pool:
+            futures = {pool.submit(_render_figure, index): index
+                       for index in pending}
+            for future in as_completed(futures):
+                try:
+                    report(*future.result())
+                except Exception:
+                    # The worker itself died (e.g. killed by the OS)
+                    report(futures[future], 0.0, traceback.format_exc())
+
+    if cache is not None:
+        cache.save({figure[0] for figure in FIGURES})
+    return failed
+
+def watch_figures(jobs=1, cache=None, interval=0.25, debounce=0.5):
+    """Re-render figures as their inputs change, in `jobs` warm workers"""
+    import figure_watch
+    
+    apply_style()
+    style = (render_cache.style_fingerprint(plt.rcParams)
+             + figure_export.get_config().fingerprint())
+    
+    def rebuilt(index, seconds):
+        if cache is None:
+            return
+        name, create, stem, inputs = FIGURES[index]
+        cache.store(name, render_cache.figure_key(name, create, style, inputs),
+                    figure_outputs(stem), seconds)
+        cache.save({figure[0] for figure in FIGURES})
+    
+    graph = figure_watch.DependencyGraph(FIGURES, figure_parts())
+    figure_watch.watch(graph, lambda: _render_pool(jobs, warm=True), _render_figure,
+                       interval=interval, debounce=debounce, on_rebuilt=rebuilt)
+
+def _add_render_options(parser, defaults=True):
+    """Options shared by every subcommand.
+
+    Subcommand parsers are built with `defaults=False` so options given
+    before the subcommand are not overwritten by the subcommand's defaults.
+    """
+    def default(value):
+        return value if defaults else argparse.SUPPRESS
+    parser.add_argument('-j', '--jobs', type=int, default=default(1),
+                        help='number of figures to render in parallel '
+                             '(0 = one per CPU core, default: 1)')
+    parser.add_argument('-o', '--output-dir', default=default('/home/sandbox'),
+                        help='directory figures are written to (default: /home/sandbox)')
+    parser.add_argument('--formats', default=default('png:300,pdf:300'),
+                        help='comma-separated formats with optional DPI, e.g. '
+                             '"png:100" or "png,pdf,svg:150" (default: png:300,pdf:300)')
+    parser.add_argument('--draft', action='store_true', default=default(False),
+                        help='shorthand for --formats png:100')
+    parser.add_argument('--cache-dir', default=default(None),
+                        help='render cache location '
+                             '(default: <output dir>/.render_cache)')
+    parser.add_argument('--no-cache', action='store_true', default=default(False),
+                        help='re-render every figure and leave the cache untouched')
+    parser.add_argument('--trace', metavar='FILE',
+                        default=default(os.environ.get(render_trace.TRACE_ENV)),
+                        help='write per-stage timing spans, memory and artist counts '
+                             f'as a trace-event JSON file (or set {render_trace.TRACE_ENV})')
+    parser.add_argument('--profile', metavar='DIR',
+                        default=default(os.environ.get(render_trace.PROFILE_ENV)),
+                        help='with --trace, also write a cProfile dump per figure '
+                             f'to DIR (or set {render_trace.PROFILE_ENV})')
+
+def parse_args(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().split('\n')[0])
+    _add_render_options(parser)
+    commands = parser.add_subparsers(dest='command', metavar='COMMAND',
+                                     help='figure to render (default: all)')
+    for command, stem in COMMANDS.items():
+        name = next(figure[0] for figure in FIGURES if figure[2] == stem)
+        _add_render_options(commands.add_parser(command, help=f'render the {name}'),
+                            defaults=False)
+    _add_render_options(commands.add_parser('all', help='render every figure'),
+                        defaults=False)
+    watch = commands.add_parser('watch', help='render every figure, then re-render '
+                                              'those affected whenever inputs change')
+    _add_render_options(watch, defaults=False)
+    watch.add_argument('--interval', type=float, default=0.25,
+                       help='seconds between input file checks (default: %(default)s)')
+    watch.add_argument('--debounce', type=float, default=0.5,
+                       help='seconds without further writes before rebuilding '
+                            '(default: %(default)s)')
+    args = parser.parse_args(argv)
+    args.command = args.command or 'all'
+    args.stems = ({COMMANDS[args.command]} if args.command in COMMANDS else None)
+    if args.jobs < 0:
+        parser.error('--jobs must be >= 0')
+    if args.profile and not args.trace:
+        parser.error('--profile needs --trace')
+    if args.jobs == 0:
+        args.jobs = min(os.cpu_count() or 1, len(args.stems or FIGURES))
+    try:
+        formats = (figure_export.DRAFT_FORMATS if args.draft
+                   else figure_export.parse_formats(args.formats))
+        args.export_config = figure_export.ExportConfig(args.output_dir, formats)
+    except ValueError as e:
+        parser.error(str(e))
+    return args
+
+if __name__ == "__main__":
+    args = parse_args()
+    figure_export.configure(args.export_config)
+    if args.trace:
+        render_trace.start(args.trace, args.profile)
+    cache = None
+    if not args.no_cache:
+        cache = render_cache.RenderCache(
+            args.cache_dir or os.path.join(args.output_dir, '.render_cache'))
+    start = time.perf_counter()
+    failed = render_all(jobs=args.jobs, cache=cache, stems=args.stems)
+    elapsed = time.perf_counter() - start
+    
+    if args.command == 'watch':
+        watch_figures(args.jobs, cache, args.interval, args.debounce)
+        render_trace.finish()
+        sys.exit(0)
+    render_trace.finish()
+    total = len(args.stems or FIGURES)
+    if failed:
+        print(f"{len(failed)} of {total} visualizations failed "
+              f"({elapsed:.1f}s): {', '.join(failed)}", file=sys.stderr)
+        sys.exit(1)
+    print(f"All visualizations created successfully! ({elapsed:.1f}s)")
@@ -0,0 +1,457 @@
+#!/usr/bin/env python3
+"""
+Append-only log of screening decisions, with incrementally kept aggregates
+
+Each decision is one row (Zotero Key, reviewer, stage, decision, reason,
+time) appended to an SQLite database in WAL mode next to the export
+(`<export>.decisions.sqlite`). Triggers reject UPDATE and DELETE; a
+reviewer changes their mind by appending a newer decision. Several
+reviewers (processes) can append at once; each append is its own short
+transaction and waits out the others' write locks.
+
+`Aggregates` folds decisions in one at a time and keeps, per stage, the
+outcome counts, exclusion reasons, the pairwise agreement tables behind
+Cohen's kappa and the per-record category counts behind Fleiss' kappa.
+A new decision only moves its own record's contributions, so reading the
+totals never rescans the log. A pickled snapshot of the aggregates is kept
+in the database; opening the log loads it and applies only the newer rows.
+
+A stage's outcome for a record is the latest decision of the `consensus`
+reviewer if there is one, else the reviewers' decision when they all agree,
+else a conflict (still awaiting). `prisma_counts.load_counts` reads the
+funnel from these aggregates whenever the export has a decision log.
+
+    python decision_log.py record KEY --reviewer ab --stage screening --decision exclude --reason "Not athletes"
+    python decision_log.py import-tags        # seed from PRISMA/ tags as consensus
+    python decision_log.py summary
+    python decision_log.py --benchmark 200000
+"""
+
+import argparse
+import os
+import pickle
+import sqlite3
+import sys
+import time
+from collections import Counter
+
+import numpy as np
+
+import prisma_counts
+
+STAGES = ('screening', 'fulltext')
+DECISIONS = ('include', 'exclude', 'uncertain')
+CONSENSUS = 'consensus'
+CONFLICT = 'conflict'
+# Where a record stands in the PRISMA funnel, from its two stage outcomes
+STATUSES = ('awaiting_screening', 'screen_excluded', 'awaiting_fulltext',
+            'fulltext_excluded', 'included')
+
+SNAPSHOT_VERSION = 1
+SNAPSHOT_EVERY = 5000            # applied decisions between stored snapshots
+BUSY_TIMEOUT = 30                # seconds a writer waits for another's lock
+
+_CATEGORY = {decision: i for i, decision in enumerate(DECISIONS)}
+_CELLS = len(DECISIONS) ** 2
+
+_SCHEMA = """
+CREATE TABLE IF NOT EXISTS decisions (
+    seq INTEGER PRIMARY KEY AUTOINCREMENT,
+    key TEXT NOT NULL,
+    reviewer TEXT NOT NULL,
+    stage TEXT NOT NULL,
+    decision TEXT NOT NULL,
+    reason TEXT NOT NULL DEFAULT '',
+    decided_at REAL NOT NULL
+);
+CREATE TRIGGER IF NOT EXISTS decisions_no_update BEFORE UPDATE ON decisions
+BEGIN SELECT RAISE(ABORT, 'the decision log is append-only'); END;
+CREATE TRIGGER IF NOT EXISTS decisions_no_delete BEFORE DELETE ON decisions
+BEGIN SELECT RAISE(ABORT, 'the decision log is append-only'); END;
+CREATE TABLE IF NOT EXISTS snapshot (
+    id INTEGER PRIMARY KEY CHECK (id = 1),
+    version INTEGER NOT NULL,
+    seq INTEGER NOT NULL,
+    state BLOB NOT NULL
+);
+"""
+
+def cohen_kappa(table):
+    """Cohen's kappa of a square agreement table (rater A rows, rater B columns)"""
+    table = np.asarray(table, dtype=float)
+    total = table.sum()
+    if total == 0:
+        return float('nan')
+    observed = np.trace(table) / total
+    expected = (table.sum(axis=1) @ table.sum(axis=0)) / total ** 2
+    if expected == 1:
+        return 1.0 if observed == 1 else float('nan')
+    return (observed - expected) / (1 - expected)
+
+def _stage_outcome(votes):
+    """(decision, reason) of one record at one stage from {reviewer: (decision, reason)}"""
+    if CONSENSUS in votes:
+        return votes[CONSENSUS]
+    decisions = {decision for decision, _ in votes.values()}
+    if len(decisions) != 1:
+        return CONFLICT, ''
+    reasons = [reason for _, reason in votes.values() if reason]
+    return decisions.pop(), reasons[0] if reasons else ''
+
+def _status(screening, fulltext):
+    """(status, exclusion reason) from the two stage outcomes (None = undecided)"""
+    if fulltext is not None and fulltext[0] == 'include':
+        return 'included', ''
+    if fulltext is not None and fulltext[0] == 'exclude':
+        return 'fulltext_excluded', fulltext[1] or prisma_counts.NO_REASON
+    # Any full-text decision means the record passed title/abstract screening
+    if fulltext is not None or (screening is not None and screening[0] == 'include'):
+        return 'awaiting_fulltext', ''
+    if screening is not None and screening[0] == 'exclude':
+        return 'screen_excluded', screening[1] or prisma_counts.NO_REASON
+    return 'awaiting_screening', ''
+
+class _Fleiss:
+    """Running sums for Fleiss' kappa over records rated by two or more reviewers.
+
+    With n_i ratings of record i, n_ij in category j: P_i = (sum_j n_ij^2 - n_i)
+    / (n_i (n_i - 1)), P = mean P_i, P_e = sum_j p_j^2 with p_j the share of
+    all those ratings in category j. Records may have different numbers of
+    raters.
+    """
+
+    def __init__(self):
+        self.items = 0
+        self.agreement = 0.0
+        self.totals = [0] * len(DECISIONS)
+
+    def add(self, counts, sign):
+        n = sum(counts)
+        if n < 2:
+            return
+        self.items += sign
+        self.agreement += sign * (sum(c * c for c in counts) - n) / (n * (n - 1))
+        for j, c in enumerate(counts):
+            self.totals[j] += sign * c
+
+    def kappa(self):
+        if self.items == 0:
+            return float('nan')
+        observed = self.agreement / self.items
+        shares = np.asarray(self.totals) / sum(self.totals)
+        expected = shares @ shares
+        if expected == 1:
+            return 1.0 if observed >= 1 - 1e-12 else float('nan')
+        return (observed - expected) / (1 - expected)
+
+class Aggregates:
+    """Totals over a decision log, updated one decision at a time"""
+
+    def __init__(self):
+        self.seq = 0
+        self.votes = {}                      # (key, stage) -> {reviewer: (decision, reason)}
+        self.outcomes = {}                   # (key, stage) -> (decision, reason)
+        self.outcome_counts = {stage: Counter() for stage in STAGES}
+        self.status = {}                     # key -> (status, reason)
+        self.status_counts = Counter()
+        self.reasons = {status: Counter() for status in ('screen_excluded', 'fulltext_excluded')}
+        # (stage, reviewer_a, reviewer_b) -> flattened agreement table, a's decision major
+        self.pairs = {}
+        self.fleiss = {stage: _Fleiss() for stage in STAGES}
+
+    @staticmethod
+    def _ratings(votes):
+        """Category counts of the independent (non-consensus) votes"""
+        counts = [0] * len(DECISIONS)
+        for reviewer, (decision, _) in votes.items():
+            if reviewer != CONSENSUS:
+                counts[_CATEGORY[decision]] += 1
+        return counts
+
+    def apply(self, seq, key, reviewer, stage, decision, reason):
+        """Fold in one decision; only this record's contributions move"""
+        self.seq = max(self.seq, seq)
+        votes = self.votes.setdefault((key, stage), {})
+        previous = votes.get(reviewer)
+        if previous == (decision, reason):
+            return
+
+        independent = reviewer != CONSENSUS
+        if independent:
+            self.fleiss[stage].add(self._ratings(votes), -1)
+            mine = _CATEGORY[decision]
+            for other, (other_decision, _) in votes.items():
+                if other in (reviewer, CONSENSUS):
+                    continue
+                # Rows hold the decisions of the pair's alphabetically first reviewer
+                theirs = _CATEGORY[other_decision]
+                if reviewer < other:
+                    table = self.pairs.setdefault((stage, reviewer, other), [0] * _CELLS)
+                    cell = lambda m: m * len(DECISIONS) + theirs
+                else:
+                    table = self.pairs.setdefault((stage, other, reviewer), [0] * _CELLS)
+                    cell = lambda m: theirs * len(DECISIONS) + m
+                if previous is not None:
+                    table[cell(_CATEGORY[previous[0]])] -= 1
+                table[cell(mine)] += 1
+        votes[reviewer] = (decision, reason)
+        if independent:
+            self.fleiss[stage].add(self._ratings(votes), +1)
+
+        outcome = _stage_outcome(votes)
+        old_outcome = self.outcomes.get((key, stage))
+        if old_outcome is not None:
+            self.outcome_counts[stage][old_outcome[0]] -= 1
+        self.outcomes[(key, stage)] = outcome
+        self.outcome_counts[stage][outcome[0]] += 1
+
+        status = _status(self.outcomes.get((key, 'screening')),
+                         self.outcomes.get((key, 'fulltext')))
+        old_status = self.status.get(key)
+        if old_status != status:
+            if old_status is not None:
+                self._count(old_status, -1)
+            self.status[key] = status
+            self._count(status, +1)
+
+    def _count(self, status, sign):
+        name, reason = status
+        self.status_counts[name] += sign
+        if name in self.reasons:
+            self.reasons[name][reason] += sign
+            if not self.reasons[name][reason]:
+                del self.reasons[name][reason]
+
+    def cohen(self, stage):
+        """{(reviewer_a, reviewer_b): (records both rated, kappa)} for `stage`"""
+        tables = {(a, b): np.reshape(table, (len(DECISIONS),) * 2)
+                  for (s, a, b), table in self.pairs.items() if s == stage and sum(table)}
+        return {pair: (int(table.sum()), cohen_kappa(table)) for pair, table in tables.items()}
+
+    def fleiss_kappa(self, stage):
+        return self.fleiss[stage].kappa()
+
+class DecisionLog:
+    """One decision log database and its aggregates, kept current by `refresh`"""
+
+    def __init__(self, path):
+        self.path = path
+        self.db = sqlite3.connect(path, timeout=BUSY_TIMEOUT, isolation_level=None)
+        self.db.execute('PRAGMA journal_mode=WAL')
+        self.db.execute('PRAGMA synchronous=NORMAL')
+        self.db.executescript(_SCHEMA)
+        self.aggregates = self._load_snapshot() or Aggregates()
+        self._since_snapshot = 0
+
+    @classmethod
+    def for_export(cls, export_path=prisma_counts.SCREENING_EXPORT):
+        return cls(prisma_counts.decision_log_path(export_path))
+
+    def _load_snapshot(self):
+        row = self.db.execute('SELECT version, state FROM snapshot WHERE id = 1').fetchone()
+        if row is None or row[0] != SNAPSHOT_VERSION:
+            return None
+        try:
+            return pickle.loads(row[1])
+        except Exception:
+            return None
+
+    def record(self, key, reviewer, stage, decision, reason=''):
+        """Append one decision"""
+        self.record_many([(key, reviewer, stage, decision, reason)])
+
+    def record_many(self, decisions):
+        """Append (key, reviewer, stage, decision, reason) rows in one transaction"""
+        rows = []
+        now = time.time()
+        for key, reviewer, stage, decision, reason in decisions:
+            if stage not in STAGES:
+                raise ValueError(f"stage must be one of {', '.join(STAGES)}")
+            if decision not in DECISIONS:
+                raise ValueError(f"decision must be one of {', '.join(DECISIONS)}")
+            if not key or not reviewer:
+                raise ValueError('key and reviewer are required')
+            rows.append((key, reviewer, stage, decision, reason or '', now))
+        with self.db:
+            self.db.execute('BEGIN IMMEDIATE')
+            self.db.executemany('INSERT INTO decisions (key, reviewer, stage, decision, '
+                                'reason, decided_at) VALUES (?, ?, ?, ?, ?, ?)', rows)
+
+    def refresh(self):
+        """Apply decisions appended since the aggregates were last brought up to date"""
+        rows = self.db.execute('SELECT seq, key, reviewer, stage, decision, reason '
+                               'FROM decisions WHERE seq > ? ORDER BY seq',
+                               (self.aggregates.seq,))
+        applied = 0
+        for row in rows:
+            self.aggregates.apply(*row)
+            applied += 1
+        self._since_snapshot += applied
+        if self._since_snapshot >= SNAPSHOT_EVERY:
+            self.save_snapshot()
+        return self.aggregates
+
+    def save_snapshot(self):
+        """Store the aggregates so the next open replays only newer decisions"""
+        self.db.execute(
+            'INSERT INTO snapshot (id, version, seq, state) VALUES (1, ?, ?, ?) '
+            'ON CONFLICT(id) DO UPDATE SET version = excluded.version, seq = excluded.seq, '
+            'state = excluded.state WHERE excluded.seq > snapshot.seq '
+            'OR excluded.version != snapshot.version',
+            (SNAPSHOT_VERSION, self.aggregates.seq,
+             pickle.dumps(self.aggregates, protocol=pickle.HIGHEST_PROTOCOL)))
+        self._since_snapshot = 0
+
+    def __len__(self):
+        return self.db.execute('SELECT COUNT(*) FROM decisions').fetchone()[0]
+
+    def close(self):
+        self.db.close()
+
+_open = {}
+
+def open_log(path):
+    """The process's `DecisionLog` for `path`, refreshed with any new decisions"""
+    path = os.path.abspath(path)
+    if path not in _open:
+        _open[path] = DecisionLog(path)
+    _open[path].refresh()
+    return _open[path]
+
+def copy_decisions(source_path, target_path, keys):
+    """Write a fresh log at `target_path` holding `source_path`'s decisions on `keys`.
+
+    For subsets of an export (e.g. batch reviews); order and times are kept.
+    """
+    for suffix in ('', '-wal', '-shm'):
+        if os.path.exists(target_path + suffix):
+            os.remove(target_path + suffix)
+    source = DecisionLog(source_path)
+    target = DecisionLog(target_path)
+    keys = set(keys)
+    rows = [row for row in source.db.execute(
+                'SELECT key, reviewer, stage, decision, reason, decided_at '
+                'FROM decisions ORDER BY seq') if row[0] in keys]
+    with target.db:
+        target.db.execute('BEGIN IMMEDIATE')
+        target.db.executemany('INSERT INTO decisions (key, reviewer, stage, decision, '
+                              'reason, decided_at) VALUES (?, ?, ?, ?, ?, ?)', rows)
+    source.close()
+    target.close()
+    return len(rows)
+
+def import_tags(log, export_path=prisma_counts.SCREENING_EXPORT):
+    """Append the PRISMA/ tag decisions of an export as consensus decisions.
+
+    Only records whose tagged decision differs from their current consensus
+    are appended, so importing twice adds nothing.
+    """
+    memo = {}
+    aggregates = log.refresh()
+    decisions = []
+    for key, tags in prisma_counts.iter_records(export_path, ['Key', 'Manual Tags']):
+        found = prisma_counts.classify_tags(tags, memo) if tags else {}
+        wanted = []
+        if 'included' in found:
+            wanted = [('fulltext', 'include', '')]
+        elif 'fulltext_excluded' in found:
+            wanted = [('fulltext', 'exclude', found['fulltext_excluded'])]
+        elif 'fulltext' in found:
+            wanted = [('screening', 'include', '')]
+        elif 'excluded' in found:
+            wanted = [('screening', 'exclude', found['excluded'])]
+        for stage, decision, reason in wanted:
+            if aggregates.votes.get((key, stage), {}).get(CONSENSUS) != (decision, reason):
+                decisions.append((key, CONSENSUS, stage, decision, reason))
+    if decisions:
+        log.record_many(decisions)
+    log.refresh()
+    return len(decisions)
+
+def print_summary(log):
+    aggregates = log.refresh()
+    print(f"{len(log)} decisions on {len(aggregates.status)} records in {log.path}")
+    for status in STATUSES:
+        print(f"  {status:20s} {aggregates.status_counts[status]}")
+    for status, reasons in aggregates.reasons.items():
+        for reason, n in reasons.most_common(5):
+            print(f"  {status}: {reason} ({n})")
+    for stage in STAGES:
+        outcomes = ', '.join(f'{n} {d}' for d, n in aggregates.outcome_counts[stage].most_common() if n)
+        print(f"{stage}: {outcomes or 'no decisions'}; "
+              f"Fleiss' kappa {aggregates.fleiss_kappa(stage):.3f} "
+              f"over {aggregates.fleiss[stage].items} records")
+        for (a, b), (n, kappa) in sorted(aggregates.cohen(stage).items()):
+            print(f"  Cohen's kappa {a} vs {b}: {kappa:.3f} over {n} records")
+
+def _append_worker(path, reviewer, keys, accuracy, seed):
+    rng = np.random.default_rng(seed)
+    log = DecisionLog(path)
+    for key in keys:
+        true = int(key[1:]) % len(DECISIONS)
+        decision = true if rng.random() < accuracy else rng.integers(0, 3)
+        log.record(key, reviewer, 'screening', DECISIONS[int(decision)])
+    log.close()
+
+def benchmark(n, reviewers=3, accuracy=0.85):
+    """Concurrent appends by `reviewers` processes, then replay vs incremental refresh"""
+    import multiprocessing
+    import tempfile
+    keys = [f'K{i:07d}' for i in range(n)]
+    with tempfile.TemporaryDirectory() as scratch:
+        path = os.path.join(scratch, 'decisions.sqlite')
+        DecisionLog(path).close()
+        start = time.perf_counter()
+        workers = [multiprocessing.Process(target=_append_worker,
+                                           args=(path, f'reviewer{r}', keys, accuracy, r))
+                   for r in range(reviewers)]
+        for worker in workers:
+            worker.start()
+        for worker in workers:
+            worker.join()
+        elapsed = time.perf_counter() - start
+        print(f"{reviewers} concurrent reviewers appended {n * reviewers} decisions "
+              f"in {elapsed:.2f}s ({n * reviewers / elapsed:,.0f}/s)")
+
+        log = DecisionLog(path)
+        start = time.perf_counter()
+        log.refresh()
+        replay = time.perf_counter() - start
+        log.save_snapshot()
+        log.record_many([(key, 'reviewer0', 'screening', 'exclude', 'Late change')
+                         for key in keys[:1000]])
+        start = time.perf_counter()
+        reopened = DecisionLog(path)
+        aggregates = reopened.refresh()
+        incremental = time.perf_counter() - start
+        print(f"full replay {replay:.2f}s; snapshot + 1000 new decisions {incremental:.3f}s")
+        print(f"Fleiss' kappa {aggregates.fleiss_kappa('screening'):.3f}; " + ', '.join(
+            f"{a}/{b} {kappa:.3f}" for (a, b), (_, kappa) in sorted(aggregates.cohen('screening').items())))
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Append-only screening decision log')
+    parser.add_argument('--export', default=prisma_counts.SCREENING_EXPORT,
+                        help='Zotero CSV export the log belongs to')
+    parser.add_argument('--benchmark', type=int, default=None, metavar='N',
+                        help='time N synthetic records rated by 3 concurrent reviewers')
+    commands = parser.add_subparsers(dest='command')
+    record = commands.add_parser('record', help='append one decision')
+    record.add_argument('key')
+    record.add_argument('--reviewer', required=True)
+    record.add_argument('--stage', choices=STAGES, required=True)
+    record.add_argument('--decision', choices=DECISIONS, required=True)
+    record.add_argument('--reason', default='')
+    commands.add_parser('import-tags', help="append the export's PRISMA/ tags as consensus")
+    commands.add_parser('summary', help='print stage counts, reasons and agreement')
+    args = parser.parse_args()
+
+    if args.benchmark:
+        benchmark(args.benchmark)
+        sys.exit()
+    log = DecisionLog.for_export(args.export)
+    if args.command == 'record':
+        log.record(args.key, args.reviewer, args.stage, args.decision, args.reason)
+    elif args.command == 'import-tags':
+        print(f"Appended {import_tags(log, args.export)} decisions from tags")
+    print_summary(log)
+    log.save_snapshot()
@@ -0,0 +1,273 @@
+#!/usr/bin/env python3
+"""
+Detect duplicate records in a Zotero screening export
+
+Two stages feed one duplicate graph:
+
+1. Exact matches on normalized DOI (also recovered from URLs and notes) and
+   normalized URL.
+2. Fuzzy matches on title: character shingles are MinHashed with NumPy and
+   banded (LSH) to generate candidate pairs without comparing every pair of
+   records; candidates are kept when their estimated title similarity is
+   high and their publication year and first-author surname agree.
+
+Connected components of the graph are the duplicate clusters. In each one
+the most complete record (DOI, abstract, venue, ...) is kept as canonical.
+"""
+
+import re
+import sys
+import time
+import unicodedata
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+from scipy.sparse import coo_matrix
+from scipy.sparse.csgraph import connected_components
+
+SHINGLE_SIZE = 5
+NUM_PERMUTATIONS = 64
+BANDS = 16                       # 16 bands x 4 rows: candidates from ~50% similarity
+SIMILARITY_THRESHOLD = 0.7
+MAX_BUCKET = 50                  # larger LSH buckets are linked as a star, not all pairs
+
+# Columns whose presence makes a record a better canonical choice
+COMPLETENESS_COLUMNS = ['DOI', 'Abstract Note', 'Publication Title', 'Url',
+                        'Date', 'Pages', 'Volume', 'Issue', 'ISSN']
+# Every export column `find_duplicates` reads
+MATCH_COLUMNS = ['Key', 'DOI', 'Url', 'Notes', 'Title', 'Publication Year', 'Author'] + [
+    c for c in COMPLETENESS_COLUMNS if c not in ('DOI', 'Url')]
+
+_DOI = re.compile(r'(10\.\d{4,9}/[^\s"<>]+)', re.I)
+_MASK64 = (1 << 64) - 1
+
+@dataclass
+class DedupResult:
+    """Duplicate clusters over the records of an export, in row order"""
+    keys: np.ndarray             # Zotero Key per record
+    cluster: np.ndarray          # cluster id per record
+    canonical: np.ndarray        # True for the record kept from each cluster
+    reason: np.ndarray           # 'doi', 'url', 'title' or '' per record
+
+    @property
+    def n_duplicates(self):
+        """Records that would be removed (all non-canonical cluster members)"""
+        return int((~self.canonical).sum())
+
+    def duplicate_keys(self):
+        return set(self.keys[~self.canonical])
+
+    def clusters(self):
+        """DataFrame of every cluster with more than one record"""
+        df = pd.DataFrame({'Key': self.keys, 'cluster': self.cluster,
+                           'canonical': self.canonical, 'reason': self.reason})
+        sizes = df.groupby('cluster')['Key'].transform('size')
+        df = df[sizes > 1]
+        canonical_key = df[df['canonical']].set_index('cluster')['Key']
+        df = df.assign(canonical_key=df['cluster'].map(canonical_key))
+        return df.sort_values(['cluster', 'canonical'], ascending=[True, False])
+
+def _map_unique(series, func):
+    """Apply `func` once per distinct value of a string column"""
+    series = series.fillna('').astype(str)
+    codes, uniques = pd.factorize(series)
+    mapped = np.array([func(value) for value in uniques] + [''], dtype=object)
+    return pd.Series(mapped[codes], index=series.index)
+
+def _ascii_lower(text):
+    return (unicodedata.normalize('NFKD', text)
+            .encode('ascii', 'ignore').decode('ascii').lower())
+
+_AUTHOR_SEPARATOR = re.compile(r';| and ')
+_NON_LETTERS = re.compile(r'[^a-z]+')
+_NON_ALNUM = re.compile(r'[^a-z0-9]+')
+
+def normalize_doi(series):
+    """Lower-cased bare DOI ('10.xxxx/...') or '' when none is present"""
+    found = series.fillna('').astype(str).str.extract(_DOI, expand=False)
+    return found.fillna('').str.lower().str.rstrip('.,;)')
+
+def normalize_url(series):
+    """Lower-cased URL without scheme, www, fragment, utm_* tracking or trailing slash"""
+    url = series.fillna('').astype(str).str.strip().str.lower()
+    url = url.str.replace(r'^https?://(www\.)?', '', regex=True)
+    url = url.str.replace(r'#.*$', '', regex=True)
+    url = url.str.replace(r'([?&])utm_[^&]*&?', r'\1', regex=True)
+    return url.str.rstrip('/?&')
+
+def _title_key(title):
+    return _NON_ALNUM.sub(' ', _ascii_lower(title)).strip()
+
+def _surname(authors):
+    first = _AUTHOR_SEPARATOR.split(_ascii_lower(authors), maxsplit=1)[0].strip()
+    if ',' in first:
+        name = first.split(',', 1)[0]
+    else:
+        # 'First Last' style without a comma: take the last word
+        name = first.split()[-1] if first.split() else ''
+    return _NON_LETTERS.sub('', name)
+
+def normalize_title(series):
+    """Lower-case ASCII title with punctuation collapsed to single spaces"""
+    return _map_unique(series, _title_key)
+
+def first_author_surname(series):
+    """Surname of the first author for 'Last, F.; ...' and 'Last, F. and ...'"""
+    return _map_unique(series, _surname)
+
+def _splitmix64(x):
+    x = (x + np.uint64(0x9E3779B97F4A7C15)) & np.uint64(_MASK64)
+    x = (x ^ (x >> np.uint64(30))) * np.uint64(0xBF58476D1CE4E5B9)
+    x = (x ^ (x >> np.uint64(27))) * np.uint64(0x94D049BB133111EB)
+    return x ^ (x >> np.uint64(31))
+
+def _shingle_hashes(titles, size=SHINGLE_SIZE):
+    """Hash every character `size`-gram of every title in one vectorized pass.
+
+    Returns (hashes, starts) where the shingles of title i are
+    hashes[starts[i]:starts[i + 1]].
+    """
+    padded = [t.ljust(size) for t in titles]
+    lengths = np.fromiter(map(len, padded), dtype=np.int64, count=len(padded))
+    data = np.frombuffer(''.join(padded).encode('ascii'), dtype=np.uint8)
+    data = data.astype(np.uint64)
+    offsets = np.concatenate([[0], np.cumsum(lengths)])
+    windows = lengths - size + 1
+    window_starts = np.concatenate([[0], np.cumsum(windows)])
+    # Start position in `data` of every window, record by record
+    positions = (np.arange(window_starts[-1])
+                 - np.repeat(window_starts[:-1] - offsets[:-1], windows))
+    with np.errstate(over='ignore'):
+        hashes = np.zeros(len(positions), dtype=np.uint64)
+        for j in range(size):
+            hashes = hashes * np.uint64(257) + data[positions + j]
+        hashes = _splitmix64(hashes)
+    return hashes, window_starts
+
+def minhash_signatures(titles, num_perm=NUM_PERMUTATIONS, seed=0):
+    """(n, num_perm) uint32 MinHash signatures of the titles' shingle sets"""
+    hashes, starts = _shingle_hashes(titles)
+    rng = np.random.default_rng(seed)
+    a = rng.integers(1, 1 << 63, size=num_perm, dtype=np.uint64) | np.uint64(1)
+    b = rng.integers(0, 1 << 63, size=num_perm, dtype=np.uint64)
+    signatures = np.empty((len(titles), num_perm), dtype=np.uint32)
+    with np.errstate(over='ignore'):
+        for p in range(num_perm):
+            permuted = ((a[p] * hashes + b[p]) >> np.uint64(32)).astype(np.uint32)
+            signatures[:, p] = np.minimum.reduceat(permuted, starts[:-1])
+    return signatures
+
+def lsh_candidate_pairs(signatures, bands=BANDS, max_bucket=MAX_BUCKET):
+    """Record pairs sharing at least one LSH band, as two index arrays"""
+    n, num_perm = signatures.shape
+    rows = num_perm // bands
+    left, right = [], []
+    with np.errstate(over='ignore'):
+        for band in range(bands):
+            block = signatures[:, band * rows:(band + 1) * rows].astype(np.uint64)
+            key = np.zeros(n, dtype=np.uint64)
+            for column in block.T:
+                key = _splitmix64(key ^ column)
+            order = np.argsort(key, kind='stable')
+            starts = np.flatnonzero(np.r_[True, np.diff(key[order]) != 0])
+            sizes = np.diff(np.r_[starts, n])
+            # Pairs are the common case and are emitted without a Python loop
+            pair_starts = starts[sizes == 2]
+            left.append(order[pair_starts])
+            right.append(order[pair_starts + 1])
+            for start, size in zip(starts[sizes > 2], sizes[sizes > 2]):
+                group = order[start:start + size]
+                if size > max_bucket:
+                    left.append(np.full(size - 1, group[0]))
+                    right.append(group[1:])
+                else:
+                    i, j = np.triu_indices(size, k=1)
+                    left.append(group[i])
+                    right.append(group[j])
+    left, right = np.concatenate(left), np.concatenate(right)
+    low, high = np.minimum(left, right), np.maximum(left, right)
+    unique = np.unique(low.astype(np.int64) * n + high)
+    return unique // n, unique % n
+
+def _exact_edges(keys):
+    """Edges linking every record to the first record with the same non-empty key"""
+    codes, _ = pd.factorize(keys)
+    codes[keys == ''] = -1
+    members = np.flatnonzero(codes >= 0)
+    first_of_code = np.empty(codes.max() + 1 if len(members) else 0, dtype=np.int64)
+    # Assign in reverse so the earliest member of each key wins
+    first_of_code[codes[members[::-1]]] = members[::-1]
+    firsts = first_of_code[codes[members]]
+    linked = members != firsts
+    return firsts[linked], members[linked]
+
+def find_duplicates(df, threshold=SIMILARITY_THRESHOLD):
+    """Cluster duplicate records of a Zotero export DataFrame"""
+    df = df.reset_index(drop=True)
+    n = len(df)
+    empty = pd.Series('', index=df.index)
+    column = lambda name: df[name] if name in df else empty
+
+    doi = normalize_doi(column('DOI'))
+    for fallback in ('Url', 'Notes'):
+        doi = doi.where(doi != '', normalize_doi(column(fallback)))
+    url = normalize_url(column('Url'))
+    title = normalize_title(column('Title'))
+    year = pd.to_numeric(column('Publication Year'), errors='coerce').to_numpy(float)
+    author = first_author_surname(column('Author')).to_numpy()
+
+    reason = np.full(n, '', dtype=object)
+    edge_sets = []
+    for label, keys in (('doi', doi), ('url', url)):
+        i, j = _exact_edges(keys.to_numpy())
+        reason[j] = np.where(reason[j] == '', label, reason[j])
+        edge_sets.append((i, j))
+
+    titled = np.flatnonzero(title.str.len().to_numpy() > 0)
+    if len(titled) > 1:
+        signatures = minhash_signatures(title.to_numpy()[titled].tolist())
+        a, b = lsh_candidate_pairs(signatures)
+        similarity = (signatures[a] == signatures[b]).mean(axis=1)
+        ya, yb = year[titled[a]], year[titled[b]]
+        same_year = np.isnan(ya) | np.isnan(yb) | (np.abs(ya - yb) <= 1)
+        aa, ab = author[titled[a]], author[titled[b]]
+        same_author = (aa == ab) | (aa == '') | (ab == '')
+        keep = (similarity >= threshold) & same_year & same_author
+        i, j = titled[a[keep]], titled[b[keep]]
+        reason[j] = np.where(reason[j] == '', 'title', reason[j])
+        edge_sets.append((i, j))
+
+    i = np.concatenate([e[0] for e in edge_sets]).astype(np.int64)
+    j = np.concatenate([e[1] for e in edge_sets]).astype(np.int64)
+    graph = coo_matrix((np.ones(len(i), dtype=np.int8), (i, j)), shape=(n, n))
+    _, cluster = connected_components(graph, directed=False)
+
+    completeness = sum((column(c).fillna('').astype(str) != '').to_numpy(int)
+                       for c in COMPLETENESS_COLUMNS)
+    # Most complete first, then earliest row; first per cluster is canonical
+    order = np.lexsort((np.arange(n), -completeness, cluster))
+    canonical = np.zeros(n, dtype=bool)
+    # prepend keeps this empty for an export without records
+    first_of_cluster = np.diff(cluster[order], prepend=-1) != 0
+    canonical[order[first_of_cluster]] = True
+    reason[canonical] = ''
+
+    return DedupResult(keys=column('Key').astype(str).to_numpy(),
+                       cluster=cluster, canonical=canonical, reason=reason)
+
+def find_duplicates_in_export(path):
+    """`find_duplicates` over a Zotero CSV export, loaded through the cache"""
+    import zotero_export
+    return find_duplicates(zotero_export.load_export(path))
+
+if __name__ == "__main__":
+    from prisma_counts import SCREENING_EXPORT
+    export = sys.argv[1] if len(sys.argv) > 1 else SCREENING_EXPORT
+    start = time.perf_counter()
+    result = find_duplicates_in_export(export)
+    elapsed = time.perf_counter() - start
+    clusters = result.clusters()
+    print(clusters.to_string(index=False))
+    print(f"{clusters['cluster'].nunique()} duplicate clusters, "
+          f"{result.n_duplicates} duplicate records ({elapsed:.2f}s)")
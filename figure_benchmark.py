@@ -0,0 +1,234 @@
+#!/usr/bin/env python3
+"""
+Benchmark every figure generator on synthetic reviews of growing size
+
+For each scale (number of studies, effect sizes and screened records;
+components grow up to `MAX_COMPONENTS`) a synthetic extraction file and
+Zotero screening export are generated. Every figure is then rendered once
+per output format in a fresh process, recording wall time, peak RSS, artist
+count and output size. Results are written as JSON. With `--compare` they
+are checked against an earlier results file, and the run fails when a
+figure got slower or larger by more than `--tolerance`.
+
+    python figure_benchmark.py --scales 10,100,1000,10000 -o bench.json
+    python figure_benchmark.py --compare bench.json
+"""
+
+import argparse
+import csv
+import json
+import multiprocessing
+import os
+import platform
+import resource
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+import figure_export
+
+SCALES = (10, 100, 1000, 10000)
+# Component x study matrices are clustered, which is quadratic in components
+MAX_COMPONENTS = 200
+FORMATS = ('png', 'pdf')
+# Compared against a baseline; counts and sizes are deterministic, time is not
+COMPARED = ('wall_s', 'peak_rss_mb', 'artists', 'file_bytes')
+
+SCREENING_HEADER = ['Key', 'Item Type', 'Publication Year', 'Author', 'Title',
+                    'Publication Title', 'ISSN', 'DOI', 'Url', 'Abstract Note',
+                    'Date', 'Date Added', 'Pages', 'Issue', 'Volume',
+                    'Journal Abbreviation', 'Language', 'Rights', 'Archive',
+                    'Archive Location', 'Notes', 'Manual Tags']
+_DECISIONS = ['', '', 'PRISMA/Excluded: Not athletes', 'PRISMA/Excluded: Not financial',
+              'PRISMA/Full-text', 'PRISMA/Full-text excluded: No outcome data',
+              'PRISMA/Included; PRISMA/Design: Survey', 'PRISMA/Duplicate']
+_SOURCES = ['https://pubmed.ncbi.nlm.nih.gov/{}', 'https://scholar.google.com/{}',
+            'https://typeset.io/papers/{}', 'https://www.proquest.com/docview/{}']
+_SURNAMES = ['Smith', 'Garcia', 'Chen', 'Okafor', 'Muller', 'Rossi', 'Kim', 'Silva']
+_WORDS = ('athlete financial literacy retirement transition education wealth '
+          'collegiate professional income budgeting contract career program '
+          'intervention survey knowledge behavior planning debt').split()
+
+def synthetic_screening(path, n_records, seed=0):
+    """Write a Zotero-style screening export with decision tags and ~5% duplicates"""
+    rng = np.random.default_rng(seed)
+    n_unique = max(1, int(n_records * 0.95))
+    titles = [' '.join(rng.choice(_WORDS, 8)).capitalize() for _ in range(n_unique)]
+    with open(path, 'w', encoding='utf-8', newline='') as f:
+        writer = csv.writer(f)
+        writer.writerow(SCREENING_HEADER)
+        for i in range(n_records):
+            # Records past n_unique repeat an earlier record under a new key
+            source = i if i < n_unique else int(rng.integers(n_unique))
+            row = dict.fromkeys(SCREENING_HEADER, '')
+            row.update({
+                'Key': f'K{i:07d}',
+                'Item Type': 'journalArticle',
+                'Publication Year': str(2000 + source % 25),
+                'Author': f'{_SURNAMES[source % len(_SURNAMES)]}, A.; Doe, J.',
+                'Title': titles[source],
+                'DOI': f'10.1000/synthetic.{source}' if source % 3 else '',
+                'Url': _SOURCES[source % len(_SOURCES)].format(source),
+                'Date': str(2000 + source % 25),
+                'Date Added': f'{1 + i % 12}/{1 + i % 28}/25 10:00',
+                'Manual Tags': _DECISIONS[int(rng.integers(len(_DECISIONS)))],
+            })
+            writer.writerow([row[c] for c in SCREENING_HEADER])
+
+def synthetic_extraction(n_studies, seed=0, template=None):
+    """An extraction document shaped like study_extraction.json with `n_studies`"""
+    import review_dataset
+    if template is None:
+        with open(review_dataset.EXTRACTION_FILE, encoding='utf-8') as f:
+            template = json.load(f)
+    rng = np.random.default_rng(seed)
+    domains = template['risk_of_bias_domains']
+    n_components = min(max(n_studies, len(template['components'])), MAX_COMPONENTS)
+    components = (template['components']
+                  + [f'Component {i}' for i in range(len(template['components']),
+                                                      n_components)])[:n_components]
+    # The dashboard's key outcomes come first so every scale includes them
+    outcomes = [e['outcome'] for e in template['effects']]
+    outcomes += [f'Outcome {i}' for i in range(max(0, n_studies // 10 - len(outcomes)))]
+    types = ['RCT Pilot', 'Cross-sectional', 'Qualitative']
+
+    studies, effects = [], []
+    for i in range(n_studies):
+        year = int(2000 + rng.integers(25))
+        ratings = rng.integers(1, 4, len(domains)).tolist()
+        if rng.random() < 0.5:
+            ratings[1] = None
+        studies.append({
+            'id': f's{i}', 'label': f'Study {i} ({year})', 'year': year,
+            'study_type': types[i % len(types)],
+            'sample_size': int(rng.integers(10, 2000)),
+            'risk_of_bias': dict(zip(domains, ratings)),
+            'components': [c for c in components if rng.random() < 0.25],
+        })
+        effect = float(rng.normal(0.4, 0.3))
+        se = float(rng.uniform(0.05, 0.35))
+        effects.append({'study': f's{i}', 'outcome': outcomes[i % len(outcomes)],
+                        'effect': round(effect, 3), 'lower': round(effect - 1.96 * se, 3),
+                        'upper': round(effect + 1.96 * se, 3)})
+    return {**template, 'components': components, 'studies': studies, 'effects': effects}
+
+def generate(scale, data_dir, seed=0):
+    """Write one scale's screening export and extraction file; return their paths"""
+    os.makedirs(data_dir, exist_ok=True)
+    screening = os.path.join(data_dir, 'screening.csv')
+    extraction = os.path.join(data_dir, 'extraction.json')
+    synthetic_screening(screening, scale, seed)
+    with open(extraction, 'w', encoding='utf-8') as f:
+        json.dump(synthetic_extraction(scale, seed), f)
+    return screening, extraction
+
+def _peak_rss_mb():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / 2 ** 20 if sys.platform == 'darwin' else peak / 2 ** 10
+
+def _run_one(stem, fmt, screening, extraction, output_dir):
+    """Render one figure in one format in this (fresh) process"""
+    import create_systematic_review_visualizations as figures
+    import review_dataset
+
+    figures._init_render_worker(figure_export.ExportConfig(
+        output_dir, {fmt: figure_export.PUBLICATION_FORMATS.get(fmt, 300)}))
+    create = next(f[1] for f in figures.FIGURES if f[2] == stem)
+    dataset = review_dataset.ReviewDataset(screening, extraction)
+    stats = {}
+
+    def observe(fig, _, paths):
+        stats['artists'] = len(fig.findobj())
+        stats['file_bytes'] = sum(os.path.getsize(p) for p in paths)
+
+    figure_export.add_observer(observe)
+    rss_before = _peak_rss_mb()
+    start = time.perf_counter()
+    create(dataset)
+    wall = time.perf_counter() - start
+    peak = _peak_rss_mb()
+    return {'wall_s': round(wall, 4), 'peak_rss_mb': round(peak, 1),
+            'render_rss_mb': round(peak - rss_before, 1), **stats}
+
+def run(scales=SCALES, formats=FORMATS, stems=None, work_dir=None, seed=0):
+    """Benchmark every (figure, scale, format); returns the results document"""
+    import create_systematic_review_visualizations as figures
+    stems = stems or [f[2] for f in figures.FIGURES]
+    work_dir = work_dir or tempfile.mkdtemp(prefix='figure_benchmark_')
+    context = multiprocessing.get_context('spawn')
+    results = []
+    for scale in scales:
+        data_dir = os.path.join(work_dir, f'scale_{scale}')
+        screening, extraction = generate(scale, data_dir, seed)
+        for stem in stems:
+            for fmt in formats:
+                result = {'figure': stem, 'scale': scale, 'format': fmt}
+                # One process per run so peak RSS belongs to this figure alone
+                with ProcessPoolExecutor(1, mp_context=context) as pool:
+                    try:
+                        result.update(pool.submit(_run_one, stem, fmt, screening,
+                                                  extraction, data_dir).result())
+                    except Exception as e:
+                        result['error'] = f'{type(e).__name__}: {e}'
+                results.append(result)
+                print(json.dumps(result))
+    return {
+        'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'python': platform.python_version(),
+        'machine': platform.machine(),
+        'cpus': os.cpu_count(),
+        'results': results,
+    }
+
+def compare(current, baseline, tolerance=0.2):
+    """Metrics that grew by more than `tolerance` relative to `baseline`"""
+    def index(document):
+        return {(r['figure'], r['scale'], r['format']): r for r in document['results']}
+    before = index(baseline)
+    regressions = []
+    for key, result in index(current).items():
+        old = before.get(key)
+        if old is None:
+            continue
+        for metric in COMPARED:
+            if metric in result and old.get(metric):
+                ratio = result[metric] / old[metric]
+                if ratio > 1 + tolerance:
+                    regressions.append({'figure': key[0], 'scale': key[1],
+                                        'format': key[2], 'metric': metric,
+                                        'before': old[metric], 'after': result[metric],
+                                        'ratio': round(ratio, 2)})
+    return regressions
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Benchmark figure generators')
+    parser.add_argument('--scales', default=','.join(map(str, SCALES)),
+                        help='comma-separated study/record counts (default: %(default)s)')
+    parser.add_argument('--formats', default=','.join(FORMATS),
+                        help='comma-separated output formats (default: %(default)s)')
+    parser.add_argument('--figures', default=None,
+                        help='comma-separated output stems (default: all figures)')
+    parser.add_argument('-o', '--output', default='figure_benchmark.json',
+                        help='results file (default: %(default)s)')
+    parser.add_argument('--compare', default=None,
+                        help='earlier results file to check for regressions')
+    parser.add_argument('--tolerance', type=float, default=0.2,
+                        help='allowed relative growth before a regression (default: 0.2)')
+    args = parser.parse_args()
+
+    document = run([int(s) for s in args.scales.split(',')], args.formats.split(','),
+                   args.figures.split(',') if args.figures else None)
+    with open(args.output, 'w') as f:
+        json.dump(document, f, indent=2)
+    print(f"Wrote {len(document['results'])} results to {args.output}")
+    if args.compare:
+        with open(args.compare) as f:
+            regressions = compare(document, json.load(f), args.tolerance)
+        for r in regressions:
+            print(f"REGRESSION {r['figure']} @ {r['scale']} ({r['format']}): "
+                  f"{r['metric']} {r['before']} -> {r['after']} (x{r['ratio']})",
+                  file=sys.stderr)
+        sys.exit(1 if regressions else 0)
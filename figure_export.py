@@ -0,0 +1,133 @@
+#!/usr/bin/env python3
+"""
+Shared render-once, export-many output stage for systematic review figures
+"""
+
+import io
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import matplotlib.pyplot as plt
+
+import render_trace
+
+SUPPORTED_FORMATS = ('png', 'pdf', 'svg')
+DEFAULT_DPI = 300
+
+PUBLICATION_FORMATS = {'png': 300, 'pdf': 300}
+DRAFT_FORMATS = {'png': 100}
+
+class ExportConfig:
+    """Where figures are written and in which formats at which DPI"""
+
+    def __init__(self, output_dir='/home/sandbox', formats=None):
+        self.output_dir = output_dir
+        self.formats = dict(formats or PUBLICATION_FORMATS)
+        for fmt in self.formats:
+            if fmt not in SUPPORTED_FORMATS:
+                raise ValueError(f"Unsupported export format {fmt!r}; "
+                                 f"choose from {', '.join(SUPPORTED_FORMATS)}")
+
+    def outputs(self, stem):
+        """Paths written for a figure named `stem`"""
+        return [os.path.join(self.output_dir, f'{stem}.{fmt}')
+                for fmt in self.formats]
+
+    def fingerprint(self):
+        """Text form of the settings that change file contents"""
+        return ','.join(f'{fmt}:{dpi}' for fmt, dpi in sorted(self.formats.items()))
+
+    def __getstate__(self):
+        return {'output_dir': self.output_dir, 'formats': self.formats}
+
+    def __setstate__(self, state):
+        self.__init__(**state)
+
+def parse_formats(spec):
+    """Parse 'png:100,pdf,svg:150' into {'png': 100, 'pdf': 300, 'svg': 150}"""
+    formats = {}
+    for item in spec.split(','):
+        item = item.strip().lower()
+        if not item:
+            continue
+        fmt, _, dpi = item.partition(':')
+        formats[fmt] = int(dpi) if dpi else DEFAULT_DPI
+    if not formats:
+        raise ValueError('no export formats given')
+    return formats
+
+_config = ExportConfig()
+
+def configure(config):
+    """Set the export settings used by `export_figure` in this process"""
+    global _config
+    _config = config
+
+def get_config():
+    return _config
+
+# Called as observer(fig, stem, paths) once a figure's files are written,
+# before the figure is closed (used by benchmarks and instrumentation)
+_observers = []
+
+def add_observer(observer):
+    _observers.append(observer)
+
+def remove_observer(observer):
+    if observer in _observers:
+        _observers.remove(observer)
+
+def _raster_size(pixels, width, height):
+    """Recover the integer size of a raw buffer of about `width` x `height`"""
+    for w in (round(width), int(width), int(width) + 1):
+        if w > 0 and pixels % w == 0 and abs(pixels // w - height) <= 1:
+            return w, pixels // w
+    return None
+
+@render_trace.traced('png_encode')
+def _encode_png(rgba, size, dpi, path):
+    from PIL import Image
+    image = Image.frombuffer('RGBA', size, rgba, 'raw', 'RGBA', 0, 1)
+    image.save(path, format='png', dpi=(dpi, dpi))
+
+def export_figure(fig=None, stem=None, config=None):
+    """Write `fig` in every configured format, then close it.
+
+    The tight bounding box is computed once and reused for every format,
+    so layout is not re-run per file. Raster output is rendered to an RGBA
+    buffer and PNG-encoded on a worker thread while the vector formats are
+    drawn, which keeps the (GIL-releasing) compression off the critical path.
+    """
+    fig = fig or plt.gcf()
+    config = config or _config
+    os.makedirs(config.output_dir, exist_ok=True)
+
+    with render_trace.span('tight_bbox'):
+        renderer = fig.canvas.get_renderer()
+        bbox = fig.get_tightbbox(renderer).padded(plt.rcParams['savefig.pad_inches'])
+
+    written = []
+    with ThreadPoolExecutor(max_workers=1) as encoder:
+        pending = []
+        for fmt, dpi in config.formats.items():
+            path = os.path.join(config.output_dir, f'{stem}.{fmt}')
+            written.append(path)
+            if fmt == 'png':
+                buffer = io.BytesIO()
+                with render_trace.span('savefig.rgba', dpi=dpi):
+                    fig.savefig(buffer, format='rgba', dpi=dpi, bbox_inches=bbox)
+                rgba = buffer.getvalue()
+                size = _raster_size(len(rgba) // 4, bbox.width * dpi,
+                                    bbox.height * dpi)
+                if size is not None:
+                    pending.append(encoder.submit(_encode_png, rgba, size, dpi, path))
+                    continue
+            with render_trace.span(f'savefig.{fmt}', dpi=dpi):
+                fig.savefig(path, format=fmt, dpi=dpi, bbox_inches=bbox)
+        with render_trace.span('png_encode.wait'):
+            for future in pending:
+                future.result()
+    for observer in _observers:
+        observer(fig, stem, written)
+    plt.close(fig)
+    return written
@@ -0,0 +1,472 @@
+#!/usr/bin/env python3
+"""
+Local HTTP server rendering review figures on demand
+
+    python figure_server.py                   # http://127.0.0.1:8765/
+    GET /figures/forest.png?dpi=150
+    GET /figures/dashboard.pdf?exclude.study_type=Qualitative
+    GET /figures/prisma.svg?screening=college OR ncaa&construct=Financial Literacy
+
+A figure is named by its render command (see COMMANDS) and format. Query
+parameters select the slice of the review it is drawn from, as in
+review_batch: `screening` (library query), `construct`, `construct_share`,
+`studies.<field>` and `exclude.<field>` (repeat a parameter for several
+values), plus `dpi`.
+
+Renders run in a pool of warm worker processes. The rendered bytes are kept
+in memory in a size-bounded LRU cache. The key covers the parameters and
+the size and mtime of every input the figure reads. The key is also the
+figure's ETag, so a browser revalidating an unchanged figure gets a 304
+without anything being rendered. Identical requests that arrive while a
+render is running share that render. Slices are written once to a
+temporary directory and reused until their inputs change. Changes to
+helper modules restart the worker pool. Changes to this script or the main
+figure script need a server restart. The server listens on localhost only.
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import sys
+import tempfile
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from concurrent.futures.process import BrokenProcessPool
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+import figure_export
+import prisma_counts
+import render_trace
+import review_batch
+import review_dataset
+
+DEFAULT_PORT = 8765
+DEFAULT_DPI = 100
+CACHE_MB = 256
+MAX_SLICES = 32
+MIN_DPI, MAX_DPI = 30, 600
+CONTENT_TYPES = {'png': 'image/png', 'pdf': 'application/pdf', 'svg': 'image/svg+xml'}
+
+def _stamp(paths):
+    """(path, size, mtime) of each path; missing files stamp as None"""
+    stamps = []
+    for path in paths:
+        try:
+            stat = os.stat(path)
+            stamps.append((path, stat.st_size, stat.st_mtime_ns))
+        except OSError:
+            stamps.append((path, None, None))
+    return stamps
+
+def _data_files():
+    return (prisma_counts.export_files(prisma_counts.SCREENING_EXPORT)
+            + prisma_counts.decision_log_files(prisma_counts.SCREENING_EXPORT)
+            + [review_dataset.EXTRACTION_FILE])
+
+def _value(text):
+    """Query strings carry numbers as text; compare them as numbers"""
+    for kind in (int, float):
+        try:
+            return kind(text)
+        except ValueError:
+            pass
+    return text
+
+def slice_config(params):
+    """A review_batch configuration from query parameters ({name: [values]})"""
+    config, studies, exclude = {}, {}, {}
+    for name, values in params.items():
+        if name in ('screening', 'construct'):
+            config[name] = values[-1]
+        elif name == 'construct_share':
+            config[name] = float(values[-1])
+        elif name.startswith(('studies.', 'exclude.')):
+            section, _, field = name.partition('.')
+            target = studies if section == 'studies' else exclude
+            target[field] = values[-1] if field == 'year' else [_value(v) for v in values]
+        elif name != 'dpi':
+            raise ValueError(f'unknown parameter {name!r}')
+    if exclude:
+        studies['exclude'] = exclude
+    if studies:
+        config['studies'] = studies
+    return config
+
+class EmptySlice(Exception):
+    """The slice selects nothing the requested figure is drawn from"""
+
+class ByteCache:
+    """Rendered figures by key; least recently used dropped beyond `max_bytes`"""
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self.entries = OrderedDict()
+        self.size = 0
+        self.evictions = 0
+        self.lock = threading.Lock()
+
+    def get(self, key):
+        with self.lock:
+            data = self.entries.get(key)
+            if data is not None:
+                self.entries.move_to_end(key)
+            return data
+
+    def put(self, key, data):
+        if len(data) > self.max_bytes:
+            return
+        with self.lock:
+            if key in self.entries:
+                self.size -= len(self.entries.pop(key))
+            self.entries[key] = data
+            self.size += len(data)
+            while self.size > self.max_bytes:
+                _, dropped = self.entries.popitem(last=False)
+                self.size -= len(dropped)
+                self.evictions += 1
+
+def _render_bytes(command, fmt, dpi, screening_path=None, extraction_path=None):
+    """Render one figure in a worker, returning (bytes, seconds).
+
+    Without slice files the figure is drawn from the full review.
+    """
+    import create_systematic_review_visualizations as figures
+    stem = figures.COMMANDS[command]
+    name, create, _, _ = next(f for f in figures.FIGURES if f[2] == stem)
+    dataset = (review_batch.dataset_for(screening_path, extraction_path)
+               if screening_path else None)
+    start = time.perf_counter()
+    with tempfile.TemporaryDirectory() as directory:
+        config = figure_export.ExportConfig(directory, {fmt: dpi})
+        figure_export.configure(config)
+        with render_trace.figure(name, stem):
+            create(dataset)
+        with open(config.outputs(stem)[0], 'rb') as f:
+            data = f.read()
+    return data, time.perf_counter() - start
+
+class FigureServer:
+    """Renders, caches and coalesces figure requests; shared by handler threads"""
+
+    def __init__(self, workers=2, cache_bytes=CACHE_MB << 20):
+        import create_systematic_review_visualizations as figures
+        self.figures = figures
+        self.workers = workers
+        self.cache = ByteCache(cache_bytes)
+        self.lock = threading.Lock()
+        self.inflight = {}
+        self.slices = OrderedDict()
+        self.slice_root = tempfile.mkdtemp(prefix='figure_server.')
+        self.inputs = {command: next(f[3] for f in figures.FIGURES if f[2] == stem)
+                       for command, stem in figures.COMMANDS.items()}
+        self.modules = sorted({path for inputs in self.inputs.values()
+                               for path in inputs if path.endswith('.py')})
+        self._shared = self._shared_stamp = None
+        self._shared_lock = threading.Lock()
+        self.code_stamp = _stamp(self.modules)
+        self.pool = figures._render_pool(workers, warm=True)
+        self.stats = {'requests': 0, 'hits': 0, 'misses': 0, 'coalesced': 0,
+                      'not_modified': 0, 'renders': 0, 'render_seconds': 0.0,
+                      'errors': 0, 'pool_restarts': 0}
+
+    def close(self):
+        self.pool.shutdown(cancel_futures=True)
+        shutil.rmtree(self.slice_root, ignore_errors=True)
+
+    def _count(self, name, amount=1):
+        with self.lock:
+            self.stats[name] += amount
+
+    def _shared_inputs(self, stamp):
+        """review_batch's parsed export and extraction, reloaded when they change"""
+        with self._shared_lock:
+            if self._shared is None or self._shared_stamp != stamp:
+                self._shared = review_batch.SharedInputs()
+                self._shared_stamp = stamp
+            return self._shared
+
+    def check_config(self, config):
+        """Raise ValueError if a slice cannot be selected (bad query, construct or field)"""
+        share = config.get('construct_share')
+        if share is not None and not 0 < share <= 1:
+            raise ValueError('construct_share must be in (0, 1]')
+        shared = self._shared_inputs(_stamp(_data_files()))
+        shared.rows(config)
+        review_batch.filter_extraction(shared.extraction, config.get('studies'))
+
+    def slice_files(self, config):
+        """(screening, extraction, studies, records) for a slice, written once per input state"""
+        stamp = _stamp(_data_files())
+        key = hashlib.sha256(json.dumps([config, stamp], sort_keys=True)
+                             .encode('utf-8')).hexdigest()[:16]
+        with self.lock:
+            future = self.slices.get(key)
+            owner = future is None
+            if owner:
+                future = self.slices[key] = Future()
+            self.slices.move_to_end(key)
+            evicted = []
+            while len(self.slices) > MAX_SLICES:
+                evicted.append(self.slices.popitem(last=False)[0])
+        for old in evicted:
+            shutil.rmtree(os.path.join(self.slice_root, old), ignore_errors=True)
+        if owner:
+            try:
+                screening, extraction, rows = review_batch.write_slice(
+                    self._shared_inputs(stamp), config, os.path.join(self.slice_root, key))
+                with open(extraction, encoding='utf-8') as f:
+                    studies = len(json.load(f)['studies'])
+                future.set_result((screening, extraction, studies, len(rows)))
+            except Exception as e:
+                with self.lock:
+                    self.slices.pop(key, None)
+                future.set_exception(e)
+        return future.result()
+
+    def figure_key(self, command, fmt, dpi, config):
+        """Cache key and ETag of a figure: parameters plus the state of its inputs"""
+        parts = [command, fmt, dpi, config, _stamp(self.inputs[command])]
+        if config:
+            parts.append(_stamp(_data_files()))
+        return hashlib.sha256(json.dumps(parts, sort_keys=True)
+                              .encode('utf-8')).hexdigest()[:32]
+
+    def _restart_pool(self, broken=None):
+        """Replace the workers (unless another thread already replaced `broken`)"""
+        with self.lock:
+            if broken is not None and self.pool is not broken:
+                return
+            old, self.pool = self.pool, self.figures._render_pool(self.workers, warm=True)
+            self.stats['pool_restarts'] += 1
+        old.shutdown(wait=False)
+
+    def _check_code(self):
+        """Replace the workers if a helper module they imported has changed"""
+        stamp = _stamp(self.modules)
+        with self.lock:
+            if stamp == self.code_stamp:
+                return
+            self.code_stamp = stamp
+        self._restart_pool()
+
+    def render(self, command, fmt, dpi, config, key):
+        """Rendered bytes for a request and how they were obtained (hit/miss/coalesced)"""
+        data = self.cache.get(key)
+        if data is not None:
+            self._count('hits')
+            return data, 'hit'
+        files = ()
+        if config:
+            screening, extraction, studies, records = self.slice_files(config)
+            inputs = self.inputs[command]
+            if review_dataset.EXTRACTION_FILE in inputs and not studies:
+                raise EmptySlice('no studies in this slice')
+            if prisma_counts.SCREENING_EXPORT in inputs and not records:
+                raise EmptySlice('no screening records in this slice')
+            files = (screening, extraction)
+        self._check_code()
+        with self.lock:
+            pool = self.pool
+            future = self.inflight.get(key)
+            if future is not None:
+                source = 'coalesced'
+                self.stats['coalesced'] += 1
+            else:
+                source = 'miss'
+                self.stats['misses'] += 1
+                future = self.inflight[key] = pool.submit(
+                    _render_bytes, command, fmt, dpi, *files)
+                future.add_done_callback(lambda done: self._finished(key, done))
+        try:
+            return future.result()[0], source
+        except BrokenProcessPool:
+            # A worker died (e.g. out of memory); later requests get a fresh pool
+            self._restart_pool(pool)
+            raise
+
+    def _finished(self, key, future):
+        with self.lock:
+            self.inflight.pop(key, None)
+        if future.exception() is None:
+            data, seconds = future.result()
+            self.cache.put(key, data)
+            self._count('renders')
+            self._count('render_seconds', seconds)
+
+    def summary(self):
+        with self.lock:
+            stats = dict(self.stats, render_seconds=round(self.stats['render_seconds'], 2))
+        stats.update(cached_figures=len(self.cache.entries), cached_bytes=self.cache.size,
+                     cache_limit_bytes=self.cache.max_bytes, evictions=self.cache.evictions,
+                     slices=len(self.slices), workers=self.workers)
+        return stats
+
+class FigureHandler(BaseHTTPRequestHandler):
+    server_version = 'FigureServer/1.0'
+
+    def log_message(self, format, *args):
+        if not self.server.quiet:
+            super().log_message(format, *args)
+
+    def _send(self, status, body=b'', content_type='text/plain; charset=utf-8', headers=()):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in headers:
+            self.send_header(name, value)
+        self.end_headers()
+        if self.command != 'HEAD':
+            self.wfile.write(body)
+
+    def _send_json(self, document, status=200):
+        self._send(status, json.dumps(document, indent=2).encode('utf-8'),
+                   'application/json')
+
+    def do_HEAD(self):
+        self.do_GET()
+
+    def do_GET(self):
+        figures = self.server.figures
+        url = urlsplit(self.path)
+        if url.path == '/':
+            commands = figures.figures.COMMANDS
+            return self._send_json({
+                'figures': {command: f'/figures/{command}.png' for command in commands},
+                'formats': list(CONTENT_TYPES),
+                'parameters': ['dpi', 'screening', 'construct', 'construct_share',
+                               'studies.<field>', 'exclude.<field>'],
+                'stats': figures.summary()})
+        if url.path == '/stats':
+            return self._send_json(figures.summary())
+        directory, _, filename = url.path.rpartition('/')
+        command, _, fmt = filename.rpartition('.')
+        if directory != '/figures' or command not in figures.inputs or fmt not in CONTENT_TYPES:
+            return self._send(404, b'unknown figure\n')
+
+        figures._count('requests')
+        try:
+            params = parse_qs(url.query)
+            dpi = int(params.get('dpi', [DEFAULT_DPI])[-1])
+            if not MIN_DPI <= dpi <= MAX_DPI:
+                raise ValueError(f'dpi must be between {MIN_DPI} and {MAX_DPI}')
+            config = slice_config(params)
+            if config:
+                figures.check_config(config)
+        except ValueError as e:
+            return self._send(400, f'{e}\n'.encode('utf-8'))
+        key = figures.figure_key(command, fmt, dpi, config)
+        etag = f'"{key}"'
+        headers = [('ETag', etag), ('Cache-Control', 'no-cache')]
+        if etag in self.headers.get('If-None-Match', ''):
+            figures._count('not_modified')
+            return self._send(304, headers=headers)
+        start = time.perf_counter()
+        try:
+            data, source = figures.render(command, fmt, dpi, config, key)
+        except EmptySlice as e:
+            return self._send(422, f'{e}\n'.encode('utf-8'))
+        except Exception as e:
+            figures._count('errors')
+            return self._send(500, f'{type(e).__name__}: {e}\n'.encode('utf-8'))
+        headers += [('X-Cache', source),
+                    ('Server-Timing', f'total;dur={(time.perf_counter() - start) * 1000:.1f}')]
+        self._send(200, data, CONTENT_TYPES[fmt], headers)
+
+def serve(port=DEFAULT_PORT, workers=2, cache_bytes=CACHE_MB << 20, quiet=False):
+    """Start the server on localhost (port 0 picks a free one); returns the HTTP server"""
+    httpd = ThreadingHTTPServer(('127.0.0.1', port), FigureHandler)
+    httpd.daemon_threads = True
+    httpd.figures = FigureServer(workers, cache_bytes)
+    httpd.quiet = quiet
+    return httpd
+
+def benchmark(workers=2):
+    """Time cold renders, cache hits, revalidation and coalesced requests"""
+    import http.client
+    import statistics
+    from concurrent.futures import ThreadPoolExecutor
+    from urllib.parse import quote
+
+    start = time.perf_counter()
+    httpd = serve(0, workers, quiet=True)
+    port = httpd.server_address[1]
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    for future in [httpd.figures.pool.submit(os.getpid) for _ in range(workers)]:
+        future.result()
+    print(f"Server with {workers} warm workers ready in {time.perf_counter() - start:.1f}s")
+
+    def get(path, etag=None):
+        connection = http.client.HTTPConnection('127.0.0.1', port, timeout=300)
+        began = time.perf_counter()
+        connection.request('GET', path, headers={'If-None-Match': etag} if etag else {})
+        response = connection.getresponse()
+        body = response.read()
+        connection.close()
+        if response.status not in (200, 304):
+            raise RuntimeError(f'{path}: {response.status} {body[:200]!r}')
+        return response, body, (time.perf_counter() - began) * 1000
+
+    def repeat(path, n=20, etag=None):
+        return statistics.median(get(path, etag)[2] for _ in range(n))
+
+    cases = [('full review', '/figures/dashboard.png'),
+             ('without qualitative studies',
+              '/figures/forest.png?exclude.study_type=Qualitative'),
+             ('college slice', '/figures/prisma.png?screening=' + quote('college OR ncaa'))]
+    print(f"{'request':30s} {'cold ms':>9s} {'hit ms':>8s} {'304 ms':>8s} {'bytes':>9s}")
+    for label, path in cases:
+        response, body, cold = get(path)
+        hit = repeat(path)
+        revalidate = repeat(path, etag=response.getheader('ETag'))
+        print(f"{label:30s} {cold:9.0f} {hit:8.2f} {revalidate:8.2f} {len(body):9d}")
+
+    path = '/figures/quality.png?dpi=120'
+    renders = httpd.figures.summary()['renders']
+    with ThreadPoolExecutor(8) as clients:
+        results = list(clients.map(lambda _: get(path), range(8)))
+    sources = [response.getheader('X-Cache') for response, _, _ in results]
+    print(f"8 concurrent identical requests: {httpd.figures.summary()['renders'] - renders} "
+          f"render(s), {sources.count('coalesced')} coalesced, "
+          f"slowest {max(ms for _, _, ms in results):.0f} ms")
+    print(json.dumps(httpd.figures.summary(), indent=2))
+    httpd.shutdown()
+    httpd.figures.close()
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Serve review figures rendered on demand')
+    parser.add_argument('--port', type=int, default=DEFAULT_PORT,
+                        help='localhost port (default: %(default)s)')
+    parser.add_argument('-j', '--jobs', type=int, default=min(4, os.cpu_count() or 1),
+                        help='warm render worker processes (default: %(default)s)')
+    parser.add_argument('--cache-mb', type=int, default=CACHE_MB,
+                        help='memory for rendered figures (default: %(default)s MB)')
+    parser.add_argument('--quiet', action='store_true', help='do not log requests')
+    parser.add_argument('--trace', metavar='FILE', default=None,
+                        help='write a Chrome trace of every render on exit (see render_trace)')
+    parser.add_argument('--benchmark', action='store_true',
+                        help='time cold, cached, revalidated and coalesced requests')
+    args = parser.parse_args()
+    if args.jobs < 1:
+        parser.error('--jobs must be >= 1')
+    if args.trace:
+        render_trace.start(args.trace)
+    if args.benchmark:
+        benchmark(args.jobs)
+        render_trace.finish()
+        sys.exit(0)
+    httpd = serve(args.port, args.jobs, args.cache_mb << 20, args.quiet)
+    print(f"Serving figures on http://127.0.0.1:{httpd.server_address[1]}/ "
+          f"with {args.jobs} workers (Ctrl-C to stop)")
+    try:
+        httpd.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        httpd.server_close()
+        httpd.figures.close()
+        render_trace.finish()
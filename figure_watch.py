@@ -0,0 +1,198 @@
+#!/usr/bin/env python3
+"""
+Re-render only the figures affected by edits to the review's input files
+
+Input files are polled, so no file-system notification package is needed.
+A burst of writes (an editor or Zotero saving several times) is debounced
+into one rebuild. The screening CSV and the extraction JSON are compared
+part by part: CSV columns and JSON sections (`effects`, or `studies.components`
+for one field of every study). A figure is rebuilt only when a part it
+reads changed. Other inputs, such as helper modules, are compared as whole
+files; a changed module also restarts the worker pool so the new code is
+loaded. Changes to the main script itself need a restart of `watch`.
+"""
+
+import csv
+import hashlib
+import json
+import os
+import sys
+import time
+import traceback
+from concurrent.futures import as_completed
+from concurrent.futures.process import BrokenProcessPool
+
+WHOLE_FILE = '*'
+
+def _hash(data):
+    return hashlib.sha256(data).hexdigest()
+
+def csv_part_digests(path):
+    """Digest of every column of a CSV file, keyed by header name"""
+    with open(path, encoding='utf-8-sig', newline='') as f:
+        reader = csv.reader(f)
+        header = next(reader, [])
+        rows = [row + [''] * (len(header) - len(row)) for row in reader]
+    columns = zip(*rows) if rows else [()] * len(header)
+    return {name: _hash('\x1f'.join(values).encode('utf-8'))
+            for name, values in zip(header, columns)}
+
+def _json_part(document, part):
+    section, _, field = part.partition('.')
+    value = document.get(section)
+    if field and isinstance(value, list):
+        value = [item.get(field) for item in value]
+    return value
+
+def json_part_digests(path, parts):
+    """Digest of each requested section (or per-item field) of a JSON file"""
+    with open(path, encoding='utf-8') as f:
+        document = json.load(f)
+    return {part: _hash(json.dumps(_json_part(document, part), sort_keys=True).encode('utf-8'))
+            for part in parts}
+
+class DependencyGraph:
+    """Which figures read which files, and which parts of those files.
+
+    `figures` are FIGURES entries (name, create, stem, inputs); `parts` maps
+    a figure's stem to {path: parts read} for inputs compared part by part.
+    """
+
+    def __init__(self, figures, parts):
+        self.figures = figures
+        self.parts = parts
+        self.files = sorted({path for _, _, _, inputs in figures for path in inputs})
+        self.watched_parts = {}
+        for by_path in parts.values():
+            for path, read in by_path.items():
+                self.watched_parts.setdefault(path, set()).update(read)
+
+    def digests(self, path):
+        """Current {part: digest} for `path`; unreadable files hash as missing"""
+        try:
+            if path in self.watched_parts:
+                if path.endswith('.csv'):
+                    return csv_part_digests(path)
+                return json_part_digests(path, sorted(self.watched_parts[path]))
+            with open(path, 'rb') as f:
+                return {WHOLE_FILE: _hash(f.read())}
+        except (OSError, ValueError, csv.Error):
+            return {WHOLE_FILE: None}
+
+    def affected(self, changed):
+        """Indices of figures reading any part in `changed` ({path: parts})"""
+        indices = []
+        for index, (_, _, stem, inputs) in enumerate(self.figures):
+            for path in inputs:
+                if path not in changed:
+                    continue
+                read = self.parts.get(stem, {}).get(path)
+                if read is None or WHOLE_FILE in changed[path] or changed[path] & set(read):
+                    indices.append(index)
+                    break
+        return indices
+
+def _stat(path):
+    try:
+        stat = os.stat(path)
+    except OSError:
+        return None
+    return stat.st_size, stat.st_mtime_ns
+
+def _changed_parts(old, new):
+    return {part for part in old.keys() | new.keys() if old.get(part) != new.get(part)}
+
+def watch(graph, make_pool, render, interval=0.25, debounce=0.5, on_rebuilt=None,
+          max_batches=None):
+    """Poll `graph.files` and re-render affected figures until interrupted.
+
+    `make_pool()` returns a warm process pool and `render(index)` is the
+    picklable task returning (index, seconds, error). `on_rebuilt(index,
+    seconds)` is called in this process after each successful render (e.g.
+    to update the render cache). If a worker dies, the pool is replaced and
+    the figures not yet rebuilt are queued once more.
+    """
+    stats = {path: _stat(path) for path in graph.files}
+    digests = {path: graph.digests(path) for path in graph.files}
+    pool = make_pool()
+    print(f"Watching {len(graph.files)} input files for {len(graph.figures)} figures "
+          f"(Ctrl-C to stop)")
+    dirty, last_event, batches = set(), None, 0
+    try:
+        while max_batches is None or batches < max_batches:
+            time.sleep(interval)
+            now = time.time()
+            for path in graph.files:
+                stat = _stat(path)
+                if stat != stats[path]:
+                    stats[path] = stat
+                    dirty.add(path)
+                    last_event = now
+            if not dirty or now - last_event < debounce:
+                continue
+
+            changed = {}
+            for path in sorted(dirty):
+                current = graph.digests(path)
+                parts = _changed_parts(digests[path], current)
+                digests[path] = current
+                if parts:
+                    changed[path] = parts
+            # Latency is measured from the last write of the batch
+            changed_at = max((stats[p][1] / 1e9 for p in dirty if stats[p]), default=now)
+            dirty = set()
+            if not changed:
+                continue
+            batches += 1
+            for path, parts in changed.items():
+                detail = ', '.join(sorted(parts)) if WHOLE_FILE not in parts else 'contents'
+                print(f"Changed {os.path.basename(path)}: {detail}")
+            if any(path.endswith('.py') for path in changed):
+                pool.shutdown()
+                pool = make_pool()
+
+            indices = graph.affected(changed)
+            skipped = len(graph.figures) - len(indices)
+            print(f"Rebuilding {len(indices)} figure(s), {skipped} unaffected")
+            pending, attempts = list(indices), 0
+            while pending:
+                attempts += 1
+                futures, broken = {}, False
+                try:
+                    for index in pending:
+                        futures[pool.submit(render, index)] = index
+                except BrokenProcessPool:
+                    broken = True
+                for future in as_completed(futures):
+                    index = futures[future]
+                    name = graph.figures[index][0]
+                    try:
+                        _, seconds, error = future.result()
+                    except BrokenProcessPool:
+                        broken = True
+                        continue
+                    except Exception:
+                        seconds, error = 0.0, traceback.format_exc()
+                    pending.remove(index)
+                    if error is not None:
+                        print(f"FAILED {name} ({seconds:.2f}s):\n{error}", file=sys.stderr)
+                        continue
+                    if on_rebuilt is not None:
+                        on_rebuilt(index, seconds)
+                    print(f"Rebuilt {name}: render {seconds:.2f}s, "
+                          f"{time.time() - changed_at:.2f}s after the change")
+                if not broken:
+                    break
+                # A worker died (e.g. out of memory); the pool cannot be reused
+                pool.shutdown(wait=False)
+                pool = make_pool()
+                if attempts > 1:
+                    for index in pending:
+                        print(f"FAILED {graph.figures[index][0]}: render worker died",
+                              file=sys.stderr)
+                    break
+                print(f"Render worker died; restarting the pool for {len(pending)} figure(s)")
+    except KeyboardInterrupt:
+        print("Stopped watching")
+    finally:
+        pool.shutdown(cancel_futures=True)
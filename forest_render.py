@@ -0,0 +1,162 @@
+#!/usr/bin/env python3
+"""
+Artist-batched forest plot drawing
+
+All confidence intervals and their caps go into one LineCollection and all
+point estimates into one scatter, so the artist count stays constant as the
+number of effect sizes grows. Per-row text labels are thinned to at most
+`max_labels` rows in dense plots.
+
+Run as a script to benchmark render time against row count:
+
+    python forest_render.py --sizes 10,100,1000,5000
+"""
+
+import argparse
+import json
+import time
+
+import matplotlib
+import numpy as np
+import pandas as pd
+from matplotlib.collections import LineCollection
+from matplotlib.colors import to_rgba_array
+
+from matrix_render import MAX_LABELS, label_rows
+
+# Vector outputs (PDF/SVG) rasterize the row artists above this many rows
+RASTERIZE_ROWS = 2000
+
+def forest_segments(lower, upper, y, cap=0.1):
+    """(3n, 2, 2) segments: each row's CI line followed by its two caps"""
+    lower = np.asarray(lower, float)
+    upper = np.asarray(upper, float)
+    y = np.asarray(y, float)
+    n = len(y)
+    segments = np.empty((n, 3, 2, 2))
+    segments[:, 0, :, 0] = np.column_stack([lower, upper])
+    segments[:, 0, :, 1] = y[:, np.newaxis]
+    segments[:, 1, :, 0] = lower[:, np.newaxis]
+    segments[:, 2, :, 0] = upper[:, np.newaxis]
+    segments[:, 1:, :, 1] = np.column_stack([y - cap, y + cap])[:, np.newaxis, :]
+    return segments.reshape(3 * n, 2, 2)
+
+def draw_forest(ax, effect, lower, upper, weight, colors, y=None,
+                label_mode='auto', max_labels=MAX_LABELS, ci_alpha=0.7):
+    """Draw CIs, caps and weighted point estimates with two artists.
+
+    `colors` is one color per row. Returns the rows selected by `label_rows`
+    so callers can thin their tick labels to match; value labels are drawn
+    for those rows except when 'auto' has fallen back to sparse ticks.
+    """
+    effect = np.asarray(effect, float)
+    lower = np.asarray(lower, float)
+    upper = np.asarray(upper, float)
+    n = len(effect)
+    y = np.arange(n, dtype=float) if y is None else np.asarray(y, float)
+    rgba = to_rgba_array(colors)
+    rasterize = n > RASTERIZE_ROWS
+
+    # CI line at `ci_alpha`, caps opaque, as in the per-row version
+    segment_colors = np.repeat(rgba, 3, axis=0)
+    segment_colors[0::3, 3] = ci_alpha
+    ax.add_collection(LineCollection(forest_segments(lower, upper, y),
+                                     colors=segment_colors, linewidths=2,
+                                     rasterized=rasterize))
+
+    sizes = np.sqrt(np.asarray(weight, float)) * 8  # Size proportional to weight
+    ax.scatter(effect, y, s=sizes, c=rgba, alpha=0.8, edgecolors='black',
+               linewidths=1 if n <= MAX_LABELS else 0.5, rasterized=rasterize)
+    ax.update_datalim(np.column_stack([np.r_[lower, upper], np.r_[y, y]]))
+    ax.autoscale_view()
+
+    rows = label_rows(n, label_mode, max_labels)
+    boxed = len(rows) <= MAX_LABELS
+    annotated = rows if label_mode != 'auto' or len(rows) == n else rows[:0]
+    for i in annotated:
+        ax.text(effect[i] + 0.05, y[i],
+                f"{effect[i]:.2f}\n[{lower[i]:.2f}, {upper[i]:.2f}]",
+                va='center', fontsize=8 if boxed else 6,
+                bbox=(dict(boxstyle="round,pad=0.2", facecolor='white', alpha=0.8)
+                      if boxed else None))
+    return rows
+
+def synthetic_effects(n, seed=0):
+    """A study table shaped like `ReviewDataset.effects` with `n` random rows"""
+    rng = np.random.default_rng(seed)
+    effect = rng.normal(0.4, 0.3, n)
+    se = rng.uniform(0.05, 0.35, n)
+    return pd.DataFrame({
+        'Study': [f'Study {i + 1}' for i in range(n)],
+        'Effect_Size': effect,
+        'Lower_CI': effect - 1.96 * se,
+        'Upper_CI': effect + 1.96 * se,
+        'Weight': 100 * (1 / se ** 2) / (1 / se ** 2).sum(),
+        'Study_Type': rng.choice(['RCT Pilot', 'Cross-sectional', 'Qualitative'], n),
+    })
+
+_BENCH_COLORS = {'RCT Pilot': '#2E86AB', 'Cross-sectional': '#A23B72',
+                 'Qualitative': '#F18F01'}
+
+def _draw_per_row(ax, df):
+    """The previous one-artist-per-element drawing, kept for comparison"""
+    for i, row in enumerate(df.itertuples()):
+        color = _BENCH_COLORS[row.Study_Type]
+        ax.plot([row.Lower_CI, row.Upper_CI], [i, i], color=color, linewidth=2, alpha=0.7)
+        ax.scatter(row.Effect_Size, i, s=np.sqrt(row.Weight) * 8, color=color,
+                   alpha=0.8, edgecolors='black', linewidth=1)
+        ax.plot([row.Lower_CI] * 2, [i - 0.1, i + 0.1], color=color, linewidth=2)
+        ax.plot([row.Upper_CI] * 2, [i - 0.1, i + 0.1], color=color, linewidth=2)
+        ax.text(row.Effect_Size + 0.05, i,
+                f"{row.Effect_Size:.2f}\n[{row.Lower_CI:.2f}, {row.Upper_CI:.2f}]",
+                va='center', fontsize=8,
+                bbox=dict(boxstyle="round,pad=0.2", facecolor='white', alpha=0.8))
+    ax.set_yticks(np.arange(len(df)))
+    ax.set_yticklabels(df['Study'])
+
+def _draw_batched(ax, df, label_mode='auto'):
+    rows = draw_forest(ax, df['Effect_Size'], df['Lower_CI'], df['Upper_CI'],
+                       df['Weight'], df['Study_Type'].map(_BENCH_COLORS),
+                       label_mode=label_mode)
+    ax.set_yticks(rows)
+    ax.set_yticklabels(df['Study'].to_numpy()[rows])
+
+def time_render(df, draw, repeats=3):
+    """Best-of-`repeats` seconds to build and rasterize one forest figure"""
+    import matplotlib.pyplot as plt
+    best = float('inf')
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fig, ax = plt.subplots(figsize=(10, 8))
+        draw(ax, df)
+        fig.canvas.draw()
+        n_artists = len(ax.get_children())
+        plt.close(fig)
+        best = min(best, time.perf_counter() - start)
+    return best, n_artists
+
+def benchmark(sizes=(10, 100, 1000, 5000), repeats=3, per_row_limit=1000):
+    """Render times of the batched (and, up to `per_row_limit`, per-row) path"""
+    results = []
+    for n in sizes:
+        df = synthetic_effects(n)
+        seconds, artists = time_render(df, _draw_batched, repeats)
+        result = {'rows': n, 'batched_s': round(seconds, 4), 'batched_artists': artists}
+        if n <= per_row_limit:
+            seconds, artists = time_render(df, _draw_per_row, repeats)
+            result.update(per_row_s=round(seconds, 4), per_row_artists=artists)
+        results.append(result)
+        print(json.dumps(result))
+    return results
+
+if __name__ == "__main__":
+    matplotlib.use('Agg')
+    parser = argparse.ArgumentParser(description='Benchmark forest plot rendering')
+    parser.add_argument('--sizes', default='10,100,1000,5000',
+                        help='comma-separated row counts')
+    parser.add_argument('--repeats', type=int, default=3)
+    parser.add_argument('--per-row-limit', type=int, default=1000,
+                        help='largest row count to also time the per-row path')
+    args = parser.parse_args()
+    benchmark([int(s) for s in args.sizes.split(',')], args.repeats,
+              args.per_row_limit)
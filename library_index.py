@@ -0,0 +1,368 @@
+#!/usr/bin/env python3
+"""
+Query the screened literature library through an on-disk index
+
+Title and abstract tokens are held in a `ScreeningIndex` term matrix, which
+is updated incrementally: only new or edited records are re-tokenized.
+`Manual Tags`, `Item Type` and `Publication Year` are held as bitmaps, one
+bit-packed row per distinct value, which are rebuilt from the cached export
+whenever it changes. Queries are evaluated as bitwise operations on packed
+record bitmaps:
+
+    nil retirement                  both words in title or abstract (stemmed)
+    "financial literacy"            phrase
+    tag:"Finance/Contracts"         exact tag (case-insensitive); tag:Finance/* for a prefix
+    type:journalArticle             Zotero item type
+    year:>2015  year:2010..2020     publication year, inclusive ranges
+    a OR b, NOT a, -a, ( ... )      AND is implicit between terms
+
+Stopwords and words under three letters ('AI') are not in the term matrix;
+they are matched as whole words by a scan of the normalized texts of the
+records the indexed terms leave.
+
+    python library_index.py 'tag:"Finance/Contracts" tag:"Behavioral Economics" year:>2015 nil'
+    python library_index.py 'tag:CRT' --export subset.csv --figures prisma -o figures/
+"""
+
+import argparse
+import csv
+import os
+import re
+import sys
+import time
+
+import numpy as np
+import pandas as pd
+
+import prisma_counts
+import zotero_export
+from matrix_render import BitMatrix
+from screening_priority import ScreeningIndex, index_term, normalize_text
+
+INDEX_DIRNAME = '.library_index'
+INDEX_VERSION = 1
+FIELDS = ('tag', 'type', 'year')
+
+_QUERY = re.compile(r'''
+    \s*(?:
+        (?P<open>\() | (?P<close>\)) |
+        (?P<negate>-)?(?:(?P<field>[A-Za-z]+):)?
+        (?:"(?P<phrase>[^"]*)" | (?P<word>[^\s()"]+))
+    )''', re.X)
+_YEAR_RANGE = re.compile(r'^(?:(?P<op>[<>]=?)(?P<bound>\d{4})|(?P<lo>\d{4})?(?:\.\.(?P<hi>\d{4})?)?)$')
+
+def year_bounds(value):
+    """'2015' / '2010..2020' / '..2000' / '>2015' / '<=2019' -> inclusive (lo, hi), None if open"""
+    match = _YEAR_RANGE.match(value)
+    if match is None or value in ('', '..'):
+        raise ValueError(f'bad year {value!r}; use 2015, 2010..2020, >2015 or <=2019')
+    if match['op']:
+        bound = int(match['bound'])
+        return {'>': (bound + 1, None), '>=': (bound, None),
+                '<': (None, bound - 1), '<=': (None, bound)}[match['op']]
+    lo = int(match['lo']) if match['lo'] else None
+    hi = int(match['hi']) if match['hi'] else (lo if '..' not in value else None)
+    return lo, hi
+
+def _field_bitmap(values, n):
+    """(sorted distinct values, BitMatrix of value x record) for per-record value lists"""
+    lengths = np.fromiter(map(len, values), dtype=np.int64, count=n)
+    flat = [v for record in values for v in record]
+    codes, uniques = pd.factorize(pd.Series(flat, dtype=object), sort=True)
+    records = np.repeat(np.arange(n), lengths)
+    return list(uniques), BitMatrix.from_coords(codes, records, (len(uniques), n))
+
+def parse_query(query):
+    """Parse a query into nested tuples: ('and'|'or', a, b), ('not', a), ('match', field, text, phrase)"""
+    tokens, position = [], 0
+    while position < len(query):
+        if query[position:].strip() == '':
+            break
+        match = _QUERY.match(query, position)
+        if match is None or match.end() == position:
+            raise ValueError(f'cannot parse query at {query[position:]!r}')
+        position = match.end()
+        tokens.append(match)
+
+    def atom(match):
+        field = (match['field'] or '').lower() or None
+        if field is not None and field not in FIELDS:
+            raise ValueError(f"unknown field {field!r}; use {', '.join(FIELDS)}")
+        phrase = match['phrase'] is not None
+        node = ('match', field, match['phrase'] if phrase else match['word'], phrase)
+        return ('not', node) if match['negate'] else node
+
+    def keyword(match, word):
+        return (match is not None and match['word'] == word and match['field'] is None
+                and not match['negate'])
+
+    def parse_or(i):
+        node, i = parse_and(i)
+        while i < len(tokens) and keyword(tokens[i], 'OR'):
+            right, i = parse_and(i + 1)
+            node = ('or', node, right)
+        return node, i
+
+    def parse_and(i):
+        node, i = parse_unary(i)
+        while i < len(tokens) and not tokens[i]['close'] and not keyword(tokens[i], 'OR'):
+            if keyword(tokens[i], 'AND'):
+                i += 1
+            right, i = parse_unary(i)
+            node = ('and', node, right)
+        return node, i
+
+    def parse_unary(i):
+        if i >= len(tokens):
+            raise ValueError('query ends where a term was expected')
+        token = tokens[i]
+        if keyword(token, 'NOT'):
+            node, i = parse_unary(i + 1)
+            return ('not', node), i
+        if token['open']:
+            node, i = parse_or(i + 1)
+            if i >= len(tokens) or not tokens[i]['close']:
+                raise ValueError('unbalanced parentheses')
+            return node, i + 1
+        if token['close']:
+            raise ValueError('unbalanced parentheses')
+        return atom(token), i + 1
+
+    if not tokens:
+        raise ValueError('empty query')
+    node, i = parse_or(0)
+    if i != len(tokens):
+        raise ValueError('unbalanced parentheses')
+    return node
+
+class LibraryIndex:
+    """Token and field bitmaps over the records of one Zotero export"""
+
+    def __init__(self, export_path, terms, texts, fields, digest):
+        self.export_path = export_path
+        self.terms = terms
+        self.texts = texts                       # normalized title + abstract per record
+        self.fields = fields                     # {field: (values, BitMatrix)}
+        self.digest = digest
+        self.n = len(terms.keys)
+        self._postings = None
+        self._everything = np.packbits(np.ones(self.n, dtype=bool))
+
+    @property
+    def keys(self):
+        return self.terms.keys
+
+    @staticmethod
+    def paths(export_path):
+        stem = os.path.splitext(os.path.basename(export_path))[0]
+        directory = os.path.join(os.path.dirname(os.path.abspath(export_path)), INDEX_DIRNAME)
+        return (os.path.join(directory, f'{stem}.terms.npz'),
+                os.path.join(directory, f'{stem}.fields.npz'))
+
+    @classmethod
+    def open(cls, export_path=prisma_counts.SCREENING_EXPORT):
+        """The index of `export_path`, brought up to date and saved if it changed"""
+        terms_path, fields_path = cls.paths(export_path)
+        digest = zotero_export.export_digest(export_path)
+        saved = cls._load(export_path, terms_path, fields_path, digest)
+        if saved is not None:
+            return saved
+
+        df = zotero_export.load_export(export_path).reset_index(drop=True)
+        title = df['Title'].fillna('') if 'Title' in df else pd.Series('', index=df.index)
+        abstract = (df['Abstract Note'].fillna('') if 'Abstract Note' in df
+                    else pd.Series('', index=df.index))
+        texts = (title + ' ' + abstract).tolist()
+        terms = ScreeningIndex.load(terms_path)
+        reused, tokenized, dropped = terms.update(df['Key'].astype(str).tolist(), texts)
+        print(f"Indexed {len(df)} records: {tokenized} tokenized, {reused} reused, "
+              f"{dropped} dropped", file=sys.stderr)
+
+        n = len(df)
+        tags = df['Tags'] if 'Tags' in df else pd.Series([[]] * n)
+        item_type = df['Item Type'].astype(str) if 'Item Type' in df else pd.Series('', index=df.index)
+        year = df['Publication Year']
+        fields = {
+            'tag': _field_bitmap([[t.lower() for t in record] for record in tags], n),
+            'type': _field_bitmap([[t.lower()] if t else [] for t in item_type], n),
+            'year': _field_bitmap([[] if pd.isna(y) else [int(y)] for y in year], n),
+        }
+        index = cls(export_path, terms, np.asarray([normalize_text(t) for t in texts], dtype=str),
+                    fields, digest)
+        index.save()
+        return index
+
+    @classmethod
+    def _load(cls, export_path, terms_path, fields_path, digest):
+        try:
+            with np.load(fields_path) as saved:
+                if (int(saved['version']) != INDEX_VERSION
+                        or str(saved['digest']) != digest):
+                    return None
+                fields = {}
+                for field in FIELDS:
+                    values = saved[f'{field}_values'].tolist()
+                    fields[field] = (values, BitMatrix(saved[f'{field}_bits'],
+                                                       (len(values), int(saved['n']))))
+                texts = saved['texts']
+        except (OSError, KeyError, ValueError):
+            return None
+        terms = ScreeningIndex.load(terms_path)
+        if len(terms.keys) != len(texts):
+            return None
+        return cls(export_path, terms, texts, fields, digest)
+
+    def save(self):
+        terms_path, fields_path = self.paths(self.export_path)
+        self.terms.save(terms_path)
+        arrays = {'version': INDEX_VERSION, 'digest': self.digest, 'n': self.n,
+                  'texts': self.texts}
+        for field, (values, bits) in self.fields.items():
+            arrays[f'{field}_values'] = np.asarray(values)
+            arrays[f'{field}_bits'] = bits.bits
+        partial = fields_path + '.tmp.npz'
+        np.savez_compressed(partial, **arrays)
+        os.replace(partial, fields_path)
+
+    def _term_bitmap(self, term):
+        if self._postings is None:
+            self._postings = self.terms.counts.tocsc()
+        position = self.terms.term_ids.get(term)
+        hits = np.zeros(self.n, dtype=bool)
+        if position is not None:
+            postings = self._postings
+            hits[postings.indices[postings.indptr[position]:postings.indptr[position + 1]]] = True
+        return np.packbits(hits)
+
+    def _scan(self, bitmap, needles):
+        """Narrow `bitmap` to records whose normalized text contains every needle"""
+        candidates = np.flatnonzero(np.unpackbits(bitmap, count=self.n))
+        hits = np.zeros(self.n, dtype=bool)
+        hits[[i for i in candidates
+              if all(needle in f' {self.texts[i]} ' for needle in needles)]] = True
+        return np.packbits(hits)
+
+    def _text_bitmap(self, text, phrase):
+        words = normalize_text(text).split()
+        if not words:
+            return np.zeros_like(self._everything)
+        bitmap = self._everything
+        unindexed = []
+        for word in words:
+            term = index_term(word)
+            if term is None:
+                unindexed.append(word)
+            else:
+                bitmap = bitmap & self._term_bitmap(term)
+        # Stopwords and short words ('AI') are not indexed: scan the texts for them
+        if phrase and len(words) > 1:
+            return self._scan(bitmap, [f" {' '.join(words)} "])
+        if unindexed:
+            return self._scan(bitmap, [f' {word} ' for word in unindexed])
+        return bitmap
+
+    def _field_bitmap(self, field, value):
+        values, bits = self.fields[field]
+        if field == 'year':
+            lo, hi = year_bounds(value)
+            rows = [i for i, year in enumerate(values)
+                    if (lo is None or year >= lo) and (hi is None or year <= hi)]
+        elif value.endswith('*'):
+            prefix = value[:-1].lower()
+            rows = [i for i, v in enumerate(values) if v.startswith(prefix)]
+        else:
+            value = value.lower()
+            rows = [i for i, v in enumerate(values) if v == value]
+        if not rows:
+            return np.zeros_like(self._everything)
+        return np.bitwise_or.reduce(bits.bits[rows], axis=0)
+
+    def _evaluate(self, node):
+        kind = node[0]
+        if kind == 'and':
+            return self._evaluate(node[1]) & self._evaluate(node[2])
+        if kind == 'or':
+            return self._evaluate(node[1]) | self._evaluate(node[2])
+        if kind == 'not':
+            return ~self._evaluate(node[1]) & self._everything
+        _, field, text, phrase = node
+        if field is None:
+            return self._text_bitmap(text, phrase)
+        return self._field_bitmap(field, text)
+
+    def search(self, query):
+        """Row positions (in export order) of the records matching `query`"""
+        return np.flatnonzero(np.unpackbits(self._evaluate(parse_query(query)), count=self.n))
+
+    def records(self, rows):
+        """The export's rows at `rows` as a DataFrame"""
+        df = zotero_export.load_export(self.export_path).reset_index(drop=True)
+        return df.iloc[rows]
+
+    def export_subset(self, rows, path):
+        """Write the matching records as a Zotero CSV export with the original columns"""
+        wanted = set(self.keys[rows])
+        with open(self.export_path, encoding='utf-8-sig', newline='') as source, \
+                open(path, 'w', encoding='utf-8', newline='') as target:
+            reader, writer = csv.reader(source), csv.writer(target)
+            header = next(reader)
+            writer.writerow(header)
+            key = header.index('Key')
+            writer.writerows(row for row in reader if len(row) > key and row[key] in wanted)
+        return path
+
+def render_subset(subset_path, commands, output_dir, formats=None):
+    """Render figures (COMMANDS names) with the subset export as screening data"""
+    import create_systematic_review_visualizations as figures
+    import figure_export
+    import review_dataset
+    figures._init_render_worker(figure_export.ExportConfig(output_dir, formats))
+    dataset = review_dataset.ReviewDataset(subset_path)
+    for command in commands:
+        stem = figures.COMMANDS[command]
+        name, create, _, _ = next(f for f in figures.FIGURES if f[2] == stem)
+        create(dataset)
+        print(f"Created {name} for {os.path.basename(subset_path)} in {output_dir}")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Query the screened literature library')
+    parser.add_argument('query', help='query, e.g. \'tag:"Finance/NIL" year:>2015 contract\'')
+    parser.add_argument('--library', default=prisma_counts.SCREENING_EXPORT,
+                        help='Zotero CSV export (default: the review screening export)')
+    parser.add_argument('--limit', type=int, default=20,
+                        help='matching records to print (default: %(default)s)')
+    parser.add_argument('--export', metavar='CSV', default=None,
+                        help='write the matching records as a Zotero CSV export')
+    parser.add_argument('--figures', default=None,
+                        help='comma-separated figures to render from the exported subset, '
+                             'e.g. prisma,dashboard (needs --export)')
+    parser.add_argument('-o', '--output-dir', default='.',
+                        help='directory for --figures output (default: current directory)')
+    parser.add_argument('--formats', default='png:300,pdf:300',
+                        help='formats for --figures (default: %(default)s)')
+    args = parser.parse_args()
+    if args.figures and not args.export:
+        parser.error('--figures needs --export')
+
+    index = LibraryIndex.open(args.library)
+    start = time.perf_counter()
+    try:
+        rows = index.search(args.query)
+    except ValueError as e:
+        parser.error(str(e))
+    elapsed = time.perf_counter() - start
+    shown = index.records(rows[:args.limit])
+    columns = [c for c in ('Key', 'Publication Year', 'Item Type', 'Title') if c in shown]
+    with pd.option_context('display.max_colwidth', 80, 'display.width', 200):
+        if len(shown):
+            print(shown[columns].to_string(index=False))
+    print(f"{len(rows)} of {index.n} records match ({elapsed * 1000:.1f} ms)")
+
+    if args.export:
+        index.export_subset(rows, args.export)
+        print(f"Wrote {len(rows)} records to {args.export}")
+    if args.figures:
+        import figure_export
+        commands = [c.strip() for c in args.figures.split(',') if c.strip()]
+        render_subset(args.export, commands, args.output_dir,
+                      figure_export.parse_formats(args.formats))
@@ -0,0 +1,218 @@
+#!/usr/bin/env python3
+"""
+Shared cell-matrix rendering for the components chart and quality heatmap
+
+Presence/absence matrices are held bit-packed (`BitMatrix`), eight cells per
+byte. Cell glyphs (✓/✗, risk scores) are placed with one scatter per glyph
+instead of one text artist per cell. Above `RASTER_CELLS` cells the matrix
+is drawn as a single image with glyphs dropped and tick labels thinned, so
+PDF size and draw time stay bounded while axis labels remain vector text.
+Rows and columns of large matrices are ordered by hierarchical clustering.
+
+Run as a script to benchmark render time and PDF size against matrix size:
+
+    python matrix_render.py --sizes 9x5,100x20,500x60,2000x60
+"""
+
+import argparse
+import io
+import json
+import time
+from dataclasses import dataclass
+
+import matplotlib
+import numpy as np
+from matplotlib.colors import Normalize
+from scipy.cluster.hierarchy import leaves_list, linkage, optimal_leaf_ordering
+from scipy.spatial.distance import pdist
+
+# Above this many cells: one raster image, no glyphs, clustered order
+RASTER_CELLS = 2500
+MAX_TICKS = 60
+# Hierarchical clustering is O(n^2) memory; beyond this use a spectral order
+CLUSTER_LIMIT = 3000
+OPTIMAL_LEAF_LIMIT = 400
+ORDERS = ('auto', 'cluster', 'none')
+LABEL_MODES = ('auto', 'all', 'sparse', 'none')
+# Rows labelled before the 'auto' label mode thins them out
+MAX_LABELS = 40
+
+@dataclass
+class BitMatrix:
+    """Boolean matrix stored bit-packed along each row"""
+    bits: np.ndarray             # uint8, shape (n_rows, ceil(n_cols / 8))
+    shape: tuple
+
+    @classmethod
+    def from_dense(cls, matrix):
+        matrix = np.asarray(matrix) != 0
+        return cls(np.packbits(matrix, axis=1), matrix.shape)
+
+    @classmethod
+    def from_coords(cls, rows, cols, shape):
+        """Build from the (row, col) positions of the set cells"""
+        bits = np.zeros((shape[0], (shape[1] + 7) // 8), dtype=np.uint8)
+        rows = np.asarray(rows, dtype=np.int64)
+        cols = np.asarray(cols, dtype=np.int64)
+        np.bitwise_or.at(bits, (rows, cols >> 3),
+                         (0x80 >> (cols & 7)).astype(np.uint8))
+        return cls(bits, tuple(shape))
+
+    def to_dense(self, dtype=np.uint8):
+        return np.unpackbits(self.bits, axis=1, count=self.shape[1]).astype(dtype)
+
+    @property
+    def nnz(self):
+        return int(np.unpackbits(self.bits).sum())
+
+def label_rows(n, mode='auto', max_labels=MAX_LABELS):
+    """Indices of the rows that get a text label.
+
+    'all' labels every row, 'none' none, 'sparse' at most `max_labels` evenly
+    spaced rows, and 'auto' every row up to `max_labels` rows, then sparse
+    tick labels only.
+    """
+    if mode not in LABEL_MODES:
+        raise ValueError(f"label mode must be one of {', '.join(LABEL_MODES)}")
+    if mode == 'none' or n == 0:
+        return np.array([], dtype=int)
+    if mode == 'all' or (mode == 'auto' and n <= max_labels):
+        return np.arange(n)
+    return np.unique(np.linspace(0, n - 1, min(n, max_labels)).round().astype(int))
+
+def cluster_order(matrix, metric='euclidean'):
+    """Leaf order of an average-linkage clustering of the rows of `matrix`.
+
+    NaN cells count as 0. Very tall matrices are ordered by their leading
+    singular vector instead, which needs no pairwise distance matrix.
+    """
+    matrix = np.nan_to_num(np.asarray(matrix, dtype=float))
+    n = len(matrix)
+    if n < 3:
+        return np.arange(n)
+    if n > CLUSTER_LIMIT:
+        u, _, _ = np.linalg.svd(matrix - matrix.mean(axis=0), full_matrices=False)
+        return np.argsort(u[:, 0], kind='stable')
+    if metric == 'jaccard':
+        matrix = matrix != 0
+    distances = np.nan_to_num(pdist(matrix, metric))
+    tree = linkage(distances, 'average')
+    if n <= OPTIMAL_LEAF_LIMIT:
+        tree = optimal_leaf_ordering(tree, distances)
+    return leaves_list(tree)
+
+def _glyph_color(cmap, norm, value):
+    """Black or white, whichever reads better on the cell color"""
+    r, g, b, _ = cmap(norm(value))
+    return 'black' if 0.2126 * r + 0.7152 * g + 0.0722 * b > 0.408 else 'white'
+
+def draw_matrix(ax, values, row_labels, col_labels, cmap='viridis', vmin=None,
+                vmax=None, glyphs=None, glyph_size=9, order='auto',
+                metric='euclidean', linewidths=0, na_color='lightgrey',
+                raster_cells=RASTER_CELLS, max_ticks=MAX_TICKS):
+    """Draw a cell matrix with a fixed number of artists.
+
+    `values` is a dense array (NaN = not applicable) or a `BitMatrix`.
+    `glyphs` maps cell values to a glyph or a (glyph, color) pair; without a
+    color the glyph is black or white to contrast with the cell. `order` is
+    'cluster', 'none', or 'auto' (cluster only above `raster_cells`).
+    `linewidths` > 0 draws white cell borders in small matrices.
+
+    Returns (mappable, row_order, col_order) for colorbars and callers that
+    need to relate drawn positions back to the input.
+    """
+    if order not in ORDERS:
+        raise ValueError(f"order must be one of {', '.join(ORDERS)}")
+    if isinstance(values, BitMatrix):
+        data = values.to_dense(np.float32)
+        metric = 'jaccard'
+    else:
+        data = np.asarray(values, dtype=float)
+    n_rows, n_cols = data.shape
+    large = data.size > raster_cells
+
+    row_order, col_order = np.arange(n_rows), np.arange(n_cols)
+    if order == 'cluster' or (order == 'auto' and large):
+        row_order = cluster_order(data, metric)
+        col_order = cluster_order(data.T, metric)
+        data = data[np.ix_(row_order, col_order)]
+
+    cmap = matplotlib.colormaps[cmap] if isinstance(cmap, str) else cmap
+    cmap = cmap.with_extremes(bad=na_color)
+    norm = Normalize(vmin=np.nanmin(data) if vmin is None else vmin,
+                     vmax=np.nanmax(data) if vmax is None else vmax)
+    cells = np.ma.masked_invalid(data)
+    if large or not linewidths:
+        mappable = ax.imshow(cells, cmap=cmap, norm=norm, aspect='auto',
+                             interpolation='nearest')
+    else:
+        mappable = ax.pcolormesh(np.arange(n_cols + 1) - 0.5,
+                                 np.arange(n_rows + 1) - 0.5, cells, cmap=cmap,
+                                 norm=norm, edgecolors='white', linewidth=linewidths)
+        ax.set_xlim(-0.5, n_cols - 0.5)
+        ax.set_ylim(n_rows - 0.5, -0.5)
+
+    if glyphs and not large:
+        for value, glyph in glyphs.items():
+            text, color = glyph if isinstance(glyph, tuple) else (glyph, None)
+            rows, cols = np.nonzero(data == value)
+            if len(rows):
+                ax.scatter(cols, rows, marker=f'${text}$', s=glyph_size ** 2,
+                           c=color or _glyph_color(cmap, norm, value),
+                           linewidths=0)
+
+    ticks_y = label_rows(n_rows, 'auto', max_ticks)
+    ticks_x = label_rows(n_cols, 'auto', max_ticks)
+    ax.set_yticks(ticks_y)
+    ax.set_yticklabels(np.asarray(row_labels, dtype=object)[row_order][ticks_y],
+                       fontsize=None if len(ticks_y) == n_rows else 7)
+    ax.set_xticks(ticks_x)
+    ax.set_xticklabels(np.asarray(col_labels, dtype=object)[col_order][ticks_x],
+                       fontsize=None if len(ticks_x) == n_cols else 7)
+    return mappable, row_order, col_order
+
+def synthetic_components(n_components, n_studies, seed=0):
+    """A BitMatrix with a few overlapping blocks of co-occurring components"""
+    rng = np.random.default_rng(seed)
+    groups = max(2, n_components // 8)
+    component_group = rng.integers(0, groups, n_components)
+    study_groups = rng.random((n_studies, groups)) < 0.3
+    p = np.where(study_groups[:, component_group].T, 0.7, 0.05)
+    rows, cols = np.nonzero(rng.random((n_components, n_studies)) < p)
+    return BitMatrix.from_coords(rows, cols, (n_components, n_studies))
+
+def benchmark(sizes=((9, 5), (100, 20), (500, 60), (2000, 60)), repeats=3):
+    """Render time, artist count and PDF size of the components chart shape"""
+    import matplotlib.pyplot as plt
+    results = []
+    for n_rows, n_cols in sizes:
+        matrix = synthetic_components(n_rows, n_cols)
+        best = float('inf')
+        for _ in range(repeats):
+            start = time.perf_counter()
+            fig, ax = plt.subplots(figsize=(12, 8))
+            draw_matrix(ax, matrix, [f'Component {i}' for i in range(n_rows)],
+                        [f'Study {j}' for j in range(n_cols)], cmap='RdYlBu_r',
+                        glyphs={1: ('✓', 'white'), 0: ('✗', 'black')})
+            fig.canvas.draw()
+            best = min(best, time.perf_counter() - start)
+            artists = len(ax.get_children())
+            pdf = io.BytesIO()
+            fig.savefig(pdf, format='pdf')
+            plt.close(fig)
+        result = {'cells': f'{n_rows}x{n_cols}', 'render_s': round(best, 4),
+                  'artists': artists, 'pdf_bytes': pdf.getbuffer().nbytes,
+                  'packed_bytes': matrix.bits.nbytes}
+        results.append(result)
+        print(json.dumps(result))
+    return results
+
+if __name__ == "__main__":
+    matplotlib.use('Agg')
+    parser = argparse.ArgumentParser(description='Benchmark matrix rendering')
+    parser.add_argument('--sizes', default='9x5,100x20,500x60,2000x60',
+                        help='comma-separated ROWSxCOLS matrix sizes')
+    parser.add_argument('--repeats', type=int, default=3)
+    args = parser.parse_args()
+    benchmark([tuple(int(v) for v in s.split('x')) for s in args.sizes.split(',')],
+              args.repeats)
@@ -0,0 +1,151 @@
+#!/usr/bin/env python3
+"""
+Vectorized fixed- and random-effects meta-analysis
+
+All estimators work on 2-D arrays of shape (n_analyses, max_studies), with
+NaN marking unused cells, so many outcomes (or resamples) are pooled in one
+call without Python loops over analyses.
+"""
+
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+
+Z_95 = 1.959963984540054
+METHODS = ('FE', 'DL', 'REML')
+
+@dataclass
+class MetaResult:
+    """Pooled estimates, one entry per analysis (row of the input)"""
+    method: str
+    k: np.ndarray                # studies per analysis
+    estimate: np.ndarray
+    se: np.ndarray
+    lower: np.ndarray
+    upper: np.ndarray
+    tau2: np.ndarray
+    q: np.ndarray                # Cochran's Q
+    i2: np.ndarray               # percent
+    weights: np.ndarray          # percent of each study, same shape as input
+
+def se_from_ci(lower, upper, level_z=Z_95):
+    """Standard error implied by a symmetric confidence interval"""
+    return (np.asarray(upper, float) - np.asarray(lower, float)) / (2 * level_z)
+
+def _as_rows(values):
+    values = np.asarray(values, dtype=float)
+    return values[np.newaxis, :] if values.ndim == 1 else values
+
+def _pool(y, v, tau2):
+    w = np.where(np.isnan(y), 0.0, 1.0 / (v + tau2[:, np.newaxis]))
+    y0 = np.nan_to_num(y)
+    sum_w = w.sum(axis=1)
+    estimate = (w * y0).sum(axis=1) / sum_w
+    return w, sum_w, estimate
+
+def _dersimonian_laird(y, v, q, df):
+    w = np.where(np.isnan(y), 0.0, 1.0 / v)
+    sum_w = w.sum(axis=1)
+    c = sum_w - (w ** 2).sum(axis=1) / sum_w
+    with np.errstate(invalid='ignore', divide='ignore'):
+        tau2 = np.where(c > 0, (q - df) / c, 0.0)
+    return np.maximum(tau2, 0.0)
+
+def _reml(y, v, start, max_iter=200, tol=1e-10):
+    """Fixed-point REML iteration (Viechtbauer 2005), run for all rows at once"""
+    tau2 = start.copy()
+    active = np.ones(len(tau2), dtype=bool)
+    for _ in range(max_iter):
+        w, sum_w, estimate = _pool(y, v, tau2)
+        resid = np.nan_to_num(y) - estimate[:, np.newaxis]
+        w2 = w ** 2
+        with np.errstate(invalid='ignore', divide='ignore'):
+            updated = ((w2 * (resid ** 2 - np.nan_to_num(v))).sum(axis=1)
+                       / w2.sum(axis=1) + 1.0 / sum_w)
+        updated = np.maximum(np.nan_to_num(updated), 0.0)
+        change = np.abs(updated - tau2)
+        tau2 = np.where(active, updated, tau2)
+        active &= change > tol
+        if not active.any():
+            break
+    return tau2
+
+def meta_analyze(effects, se=None, lower=None, upper=None, method='REML'):
+    """Pool effect sizes by inverse variance.
+
+    `effects` is 1-D (one analysis) or 2-D (one analysis per row, NaN-padded).
+    Give either standard errors `se` or 95% CI bounds `lower`/`upper`.
+    `method` is 'FE' (fixed effect), 'DL' (DerSimonian-Laird) or 'REML'.
+    """
+    if method not in METHODS:
+        raise ValueError(f"method must be one of {', '.join(METHODS)}")
+    y = _as_rows(effects)
+    if se is None:
+        if lower is None or upper is None:
+            raise ValueError('give either se or both lower and upper')
+        se = se_from_ci(lower, upper)
+    v = _as_rows(se) ** 2
+    v = np.where(np.isnan(y), np.nan, v)
+
+    k = (~np.isnan(y)).sum(axis=1)
+    df = np.maximum(k - 1, 0)
+    w_fixed, _, fixed = _pool(y, v, np.zeros(len(y)))
+    q = (w_fixed * (np.nan_to_num(y) - fixed[:, np.newaxis]) ** 2).sum(axis=1)
+
+    if method == 'FE':
+        tau2 = np.zeros(len(y))
+    else:
+        tau2 = _dersimonian_laird(y, v, q, df)
+        if method == 'REML':
+            tau2 = np.where(k > 1, _reml(y, v, tau2), 0.0)
+
+    w, sum_w, estimate = _pool(y, v, tau2)
+    pooled_se = np.sqrt(1.0 / sum_w)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        i2 = np.where(q > 0, np.maximum((q - df) / q, 0.0) * 100, 0.0)
+    weights = np.where(np.isnan(y), np.nan, 100 * w / sum_w[:, np.newaxis])
+
+    squeeze = np.ndim(effects) == 1
+    pick = (lambda a: a[0]) if squeeze else (lambda a: a)
+    return MetaResult(method=method, k=pick(k), estimate=pick(estimate),
+                      se=pick(pooled_se),
+                      lower=pick(estimate - Z_95 * pooled_se),
+                      upper=pick(estimate + Z_95 * pooled_se),
+                      tau2=pick(tau2), q=pick(q), i2=pick(i2),
+                      weights=pick(weights))
+
+def pad_groups(values, groups):
+    """Scatter a 1-D column into a NaN-padded (n_groups, max_size) array"""
+    codes, labels = pd.factorize(pd.Series(groups), sort=False)
+    order = np.argsort(codes, kind='stable')
+    sizes = np.bincount(codes, minlength=len(labels))
+    position = np.empty(len(codes), dtype=np.int64)
+    position[order] = np.arange(len(codes)) - np.repeat(
+        np.concatenate([[0], np.cumsum(sizes)[:-1]]), sizes)
+    padded = np.full((len(labels), sizes.max() if len(sizes) else 0), np.nan)
+    padded[codes, position] = np.asarray(values, dtype=float)
+    return padded, codes, position, labels
+
+def meta_analyze_table(df, by=None, effect='Effect_Size', lower='Lower_CI',
+                       upper='Upper_CI', se=None, method='REML'):
+    """Pool a study table overall or per `by` group in a single vectorized call.
+
+    Returns (summary, weights): one summary row per group and each input
+    row's percent weight within its group (aligned to `df.index`).
+    """
+    groups = df[by] if by is not None else np.zeros(len(df), dtype=int)
+    y, codes, position, labels = pad_groups(df[effect], groups)
+    if se is not None:
+        s, *_ = pad_groups(df[se], groups)
+    else:
+        s, *_ = pad_groups(se_from_ci(df[lower], df[upper]), groups)
+    result = meta_analyze(y, se=s, method=method)
+    summary = pd.DataFrame({
+        'k': result.k, 'estimate': result.estimate, 'se': result.se,
+        'lower': result.lower, 'upper': result.upper, 'tau2': result.tau2,
+        'Q': result.q, 'I2': result.i2,
+    }, index=pd.Index(labels if by is not None else ['Overall'], name=by))
+    weights = pd.Series(result.weights[codes, position], index=df.index,
+                        name='Weight')
+    return summary, weights
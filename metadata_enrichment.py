@@ -0,0 +1,636 @@
+#!/usr/bin/env python3
+"""
+Fill missing DOI, abstract and venue metadata of a screening export
+
+Records with a blank `DOI`, `Abstract Note` or `Publication Title` are
+looked up through a metadata backend (Crossref by default): by DOI when the
+record has one (also recovered from its URL), otherwise by a bibliographic
+search whose best hit is accepted only when its title nearly matches and
+its year agrees. Lookups run concurrently on one asyncio event loop over a
+small keep-alive HTTP/1.1 client: connections are pooled per host, at most
+`--concurrency` requests are in flight, each host is held to its rate
+limit, and connection errors, timeouts, 429s and 5xx responses are retried
+with exponential backoff (honouring Retry-After).
+
+Responses (404s for unknown DOIs included) are kept in an SQLite cache
+under `.enrichment_cache/`, so a rerun does no network I/O and `--offline`
+works from the cache alone. Found values go to a sidecar next to the export
+(`<export>.enrichment.csv`). `zotero_export.load_export` fills blank cells
+from it, so dedup, screening and the figures all see the enriched records
+while the export itself stays as Zotero wrote it.
+
+    python metadata_enrichment.py [export.csv] --mailto you@example.org
+    python metadata_enrichment.py --offline
+    python metadata_enrichment.py --benchmark 2000
+"""
+
+import argparse
+import asyncio
+import difflib
+import gzip
+import html
+import json
+import os
+import random
+import re
+import sqlite3
+import ssl
+import threading
+import time
+import zlib
+from collections import Counter
+from dataclasses import dataclass, field
+from http import HTTPStatus
+from urllib.parse import parse_qs, quote, unquote, urlencode, urlsplit
+
+import numpy as np
+import pandas as pd
+
+import dedup
+import prisma_counts
+
+# Export columns the enrichment may fill; a blank LOOKUP column triggers a lookup
+ENRICHED_COLUMNS = ['DOI', 'Abstract Note', 'Publication Title', 'ISSN',
+                    'Volume', 'Issue', 'Pages', 'Url']
+LOOKUP_COLUMNS = ['DOI', 'Abstract Note', 'Publication Title']
+SOURCE_COLUMN = 'Enrichment Source'
+
+CACHE_DIRNAME = '.enrichment_cache'
+CONCURRENCY = 5
+RATE_LIMITS = {'api.crossref.org': 10.0}     # requests per second; 0 = unlimited
+DEFAULT_RATE = 5.0
+MAX_RETRIES = 4
+TIMEOUT = 30
+TITLE_MATCH = 0.9                            # difflib ratio of normalized titles
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+CACHED_STATUSES = {200, 404}
+USER_AGENT = 'athlete-wealth-review-enrichment/1.0'
+
+class FetchError(Exception):
+    """A request that still failed after every retry"""
+
+@dataclass
+class Response:
+    status: int
+    headers: dict
+    body: bytes
+
+# --- HTTP ------------------------------------------------------------------
+
+class ConnectionPool:
+    """Keep-alive HTTP/1.1 connections, reused per (scheme, host, port)"""
+
+    def __init__(self, per_host=CONCURRENCY, timeout=TIMEOUT):
+        self.per_host = per_host
+        self.timeout = timeout
+        self.opened = 0
+        self._idle = {}
+        self._slots = {}
+        self._ssl = None
+
+    async def _connect(self, scheme, host, port):
+        context = None
+        if scheme == 'https':
+            self._ssl = self._ssl or ssl.create_default_context()
+            context = self._ssl
+        connection = await asyncio.wait_for(
+            asyncio.open_connection(host, port, ssl=context), self.timeout)
+        self.opened += 1
+        return connection
+
+    async def get(self, url, headers):
+        parts = urlsplit(url)
+        port = parts.port or (443 if parts.scheme == 'https' else 80)
+        origin = (parts.scheme, parts.hostname, port)
+        target = (parts.path or '/') + (f'?{parts.query}' if parts.query else '')
+        lines = [f'GET {target} HTTP/1.1', f'Host: {parts.netloc}',
+                 *(f'{name}: {value}' for name, value in headers.items())]
+        request = ('\r\n'.join(lines) + '\r\n\r\n').encode('latin-1')
+
+        slots = self._slots.setdefault(origin, asyncio.Semaphore(self.per_host))
+        async with slots:
+            idle = self._idle.setdefault(origin, [])
+            while True:
+                reused = bool(idle)
+                reader, writer = idle.pop() if reused else await self._connect(*origin)
+                try:
+                    response, keep_alive = await asyncio.wait_for(
+                        self._exchange(reader, writer, request), self.timeout)
+                except asyncio.TimeoutError:
+                    writer.close()
+                    raise
+                except (OSError, asyncio.IncompleteReadError, ValueError):
+                    writer.close()
+                    # The server may have closed an idle connection; try another
+                    if reused:
+                        continue
+                    raise
+                break
+            if keep_alive:
+                idle.append((reader, writer))
+            else:
+                writer.close()
+            return response
+
+    async def _exchange(self, reader, writer, request):
+        writer.write(request)
+        await writer.drain()
+        head = (await reader.readuntil(b'\r\n\r\n')).decode('latin-1').split('\r\n')
+        version, status = head[0].split(' ', 2)[:2]
+        headers = {}
+        for line in head[1:]:
+            if ':' in line:
+                name, value = line.split(':', 1)
+                headers[name.strip().lower()] = value.strip()
+
+        keep_alive = (version == 'HTTP/1.1'
+                      and headers.get('connection', '').lower() != 'close')
+        if headers.get('transfer-encoding', '').lower() == 'chunked':
+            chunks = []
+            while True:
+                size = int((await reader.readline()).split(b';')[0], 16)
+                if size == 0:
+                    break
+                chunks.append(await reader.readexactly(size))
+                await reader.readexactly(2)
+            while (await reader.readline()) not in (b'\r\n', b''):
+                pass
+            body = b''.join(chunks)
+        elif 'content-length' in headers:
+            body = await reader.readexactly(int(headers['content-length']))
+        else:
+            body = await reader.read()
+            keep_alive = False
+        if headers.get('content-encoding', '').lower() == 'gzip':
+            body = gzip.decompress(body)
+        return Response(int(status), headers, body), keep_alive
+
+    def close(self):
+        for connections in self._idle.values():
+            for _, writer in connections:
+                writer.close()
+        self._idle.clear()
+
+class RateLimiter:
+    """Spaces requests to one host at least 1/rate seconds apart"""
+
+    def __init__(self, rate):
+        self.interval = 1 / rate if rate else 0.0
+        self._next = 0.0
+
+    async def wait(self):
+        now = asyncio.get_running_loop().time()
+        start = max(now, self._next)
+        self._next = start + self.interval
+        if start > now:
+            await asyncio.sleep(start - now)
+
+    def pause(self, seconds):
+        """Hold every request to this host for `seconds` (e.g. after a 429)"""
+        self._next = max(self._next, asyncio.get_running_loop().time() + seconds)
+
+class ResponseCache:
+    """URL -> (status, body) of past responses, in one SQLite file"""
+
+    def __init__(self, path):
+        os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.db = sqlite3.connect(path)
+        self.db.execute('PRAGMA journal_mode=WAL')
+        self.db.execute('CREATE TABLE IF NOT EXISTS responses '
+                        '(url TEXT PRIMARY KEY, status INTEGER, body BLOB, fetched REAL)')
+        self._uncommitted = 0
+
+    def get(self, url):
+        row = self.db.execute('SELECT status, body FROM responses WHERE url = ?',
+                              (url,)).fetchone()
+        if row is None:
+            return None
+        return Response(row[0], {}, zlib.decompress(row[1]))
+
+    def put(self, url, response):
+        self.db.execute('INSERT OR REPLACE INTO responses VALUES (?, ?, ?, ?)',
+                        (url, response.status, zlib.compress(response.body), time.time()))
+        self._uncommitted += 1
+        if self._uncommitted >= 100:
+            self.db.commit()
+            self._uncommitted = 0
+
+    def __len__(self):
+        return self.db.execute('SELECT COUNT(*) FROM responses').fetchone()[0]
+
+    def close(self):
+        self.db.commit()
+        self.db.close()
+
+def _retry_after(headers):
+    try:
+        return max(float(headers.get('retry-after', '')), 0.0)
+    except ValueError:
+        return None
+
+class MetadataClient:
+    """Cached, rate-limited, retrying GETs over one connection pool.
+
+    Must be used from a single event loop. Concurrent requests for the same
+    URL share one fetch. `stats` counts cached, fetched, retried, failed and
+    offline (cache-miss) requests.
+    """
+
+    def __init__(self, cache, concurrency=CONCURRENCY, rate_limits=None,
+                 retries=MAX_RETRIES, timeout=TIMEOUT, offline=False, mailto=None):
+        self.cache = cache
+        self.pool = ConnectionPool(concurrency, timeout)
+        self.rate_limits = {**RATE_LIMITS, **(rate_limits or {})}
+        self.retries = retries
+        self.offline = offline
+        self.stats = Counter()
+        agent = f'{USER_AGENT} (mailto:{mailto})' if mailto else USER_AGENT
+        self.headers = {'User-Agent': agent, 'Accept': 'application/json',
+                        'Accept-Encoding': 'gzip'}
+        self._in_flight = asyncio.Semaphore(concurrency)
+        self._limiters = {}
+        self._pending = {}
+
+    def _limiter(self, host):
+        if host not in self._limiters:
+            self._limiters[host] = RateLimiter(self.rate_limits.get(host, DEFAULT_RATE))
+        return self._limiters[host]
+
+    async def get(self, url):
+        """The response for `url`, or None when offline and not cached"""
+        cached = self.cache.get(url)
+        if cached is not None:
+            self.stats['cached'] += 1
+            return cached
+        if self.offline:
+            self.stats['offline'] += 1
+            return None
+        if url not in self._pending:
+            self._pending[url] = asyncio.ensure_future(self._fetch(url))
+            self._pending[url].add_done_callback(lambda _: self._pending.pop(url, None))
+        return await asyncio.shield(self._pending[url])
+
+    async def _fetch(self, url):
+        limiter = self._limiter(urlsplit(url).hostname)
+        for attempt in range(self.retries + 1):
+            delay = min(0.5 * 2 ** attempt, 30) * random.uniform(0.5, 1.0)
+            async with self._in_flight:
+                await limiter.wait()
+                try:
+                    response = await self.pool.get(url, self.headers)
+                except (OSError, asyncio.TimeoutError, asyncio.IncompleteReadError,
+                        ValueError) as error:
+                    response, failure = None, f'{type(error).__name__}: {error}'
+            if response is not None and response.status not in RETRY_STATUSES:
+                self.stats['fetched'] += 1
+                if response.status in CACHED_STATUSES:
+                    self.cache.put(url, response)
+                return response
+            if response is not None:
+                failure = f'HTTP {response.status}'
+                wait = _retry_after(response.headers)
+                if wait is not None:
+                    delay = max(delay, wait)
+                if response.status == 429:
+                    limiter.pause(delay)
+            if attempt < self.retries:
+                self.stats['retried'] += 1
+                await asyncio.sleep(delay)
+        self.stats['failed'] += 1
+        raise FetchError(f'{url}: {failure} after {self.retries + 1} attempts')
+
+    def close(self):
+        self.pool.close()
+        self.cache.close()
+
+# --- Backends ----------------------------------------------------------------
+
+_TAGS = re.compile(r'<[^>]+>')
+_SPACES = re.compile(r'\s+')
+
+def clean_abstract(text):
+    """Plain text of a JATS/HTML abstract, without a leading 'Abstract' heading"""
+    text = _SPACES.sub(' ', html.unescape(_TAGS.sub(' ', text or ''))).strip()
+    return re.sub(r'^abstract[\s.:]*', '', text, flags=re.I)
+
+class CrossrefBackend:
+    """Crossref REST API: /works/<doi> lookups and /works?query.bibliographic= search.
+
+    A backend turns a record into a lookup URL (`lookup`) and a response
+    body into candidate records (`candidates`): dicts of export columns plus
+    `title` and `year` for matching. `base_url` points it at a mirror or a
+    local stand-in server.
+    """
+    name = 'crossref'
+    SELECT = 'DOI,title,container-title,ISSN,volume,issue,page,abstract,URL,issued'
+
+    def __init__(self, base_url='https://api.crossref.org', rows=5):
+        self.base_url = base_url.rstrip('/')
+        self.rows = rows
+
+    def lookup(self, record):
+        """('doi' | 'search', url) for `record`, or (None, None) if it has nothing to look up"""
+        if record['doi']:
+            return 'doi', f"{self.base_url}/works/{quote(record['doi'], safe='/')}"
+        if record['title']:
+            query = {'query.bibliographic': record['title'], 'rows': self.rows,
+                     'select': self.SELECT}
+            if record['surname']:
+                query['query.author'] = record['surname']
+            return 'search', f'{self.base_url}/works?{urlencode(query)}'
+        return None, None
+
+    def candidates(self, body):
+        message = json.loads(body).get('message', {})
+        items = message['items'] if 'items' in message else [message]
+        return [self._record(item) for item in items]
+
+    @staticmethod
+    def _record(item):
+        first = lambda values: values[0] if values else ''
+        issued = (item.get('issued') or {}).get('date-parts') or [[None]]
+        return {
+            'title': first(item.get('title')),
+            'year': issued[0][0] if issued[0] else None,
+            'DOI': item.get('DOI', ''),
+            'Abstract Note': clean_abstract(item.get('abstract')),
+            'Publication Title': first(item.get('container-title')),
+            'ISSN': ', '.join(item.get('ISSN') or []),
+            'Volume': item.get('volume', ''),
+            'Issue': item.get('issue', ''),
+            'Pages': item.get('page', ''),
+            'Url': item.get('URL', ''),
+        }
+
+BACKENDS = {'crossref': CrossrefBackend}
+
+# --- Enrichment -----------------------------------------------------------------
+
+def lookup_records(df):
+    """Rows of `df` with a blank lookup column, as dicts for the backends"""
+    columns = [c for c in LOOKUP_COLUMNS if c in df]
+    blank = (df[columns] == '').any(axis=1).to_numpy()
+    rows = df[blank]
+    # A DOI may sit in the URL field of records with no DOI column value
+    doi = dedup.normalize_doi(rows['DOI'] + ' ' + rows.get('Url', ''))
+    year = rows['Publication Year'].astype('Float64').to_numpy(dtype=float, na_value=np.nan)
+    return [{'key': key, 'doi': d, 'title': title, 'title_key': title_key,
+             'surname': surname, 'year': None if np.isnan(y) else int(y),
+             'blank': [c for c in ENRICHED_COLUMNS if c in rows and value[c] == '']}
+            for key, d, title, title_key, surname, y, value in zip(
+                rows['Key'], doi, rows['Title'], dedup.normalize_title(rows['Title']),
+                dedup.first_author_surname(rows['Author']), year,
+                rows.to_dict('records'))]
+
+def best_match(record, candidates, threshold=TITLE_MATCH):
+    """(candidate, title similarity) of the best search hit, or (None, 0)"""
+    best, best_score = None, 0.0
+    titles = dedup.normalize_title(pd.Series([c['title'] for c in candidates], dtype=object))
+    for candidate, title in zip(candidates, titles):
+        if record['year'] and candidate['year'] and abs(record['year'] - candidate['year']) > 1:
+            continue
+        score = difflib.SequenceMatcher(None, record['title_key'], title).ratio()
+        if score >= threshold and score > best_score:
+            best, best_score = candidate, score
+    return best, best_score
+
+async def _enrich(records, backend, client):
+    async def one(record):
+        kind, url = backend.lookup(record)
+        if url is None:
+            return None
+        try:
+            response = await client.get(url)
+        except FetchError:
+            return 'failed'
+        if response is None or response.status != 200:
+            return None
+        candidates = backend.candidates(response.body)
+        if kind == 'doi':
+            match, source = (candidates[0] if candidates else None), f'{backend.name} doi'
+        else:
+            match, score = best_match(record, candidates)
+            source = f'{backend.name} search {score:.2f}'
+        if match is None:
+            return None
+        fills = {c: match[c] for c in record['blank'] if match.get(c)}
+        return dict(fills, Key=record['key'], **{SOURCE_COLUMN: source}) if fills else None
+
+    return await asyncio.gather(*(one(record) for record in records))
+
+@dataclass
+class EnrichmentResult:
+    """Values found for an export's records, with lookup statistics"""
+    fills: pd.DataFrame          # Key, filled columns, Enrichment Source
+    looked_up: int
+    failed: int
+    requests: Counter = field(default_factory=Counter)
+    connections: int = 0
+
+    def summary(self):
+        filled = {c: int((self.fills[c] != '').sum()) for c in ENRICHED_COLUMNS
+                  if c in self.fills}
+        counts = ', '.join(f'{n} {c}' for c, n in filled.items() if n) or 'nothing'
+        requests = ', '.join(f'{n} {kind}' for kind, n in sorted(self.requests.items()))
+        return (f"{self.looked_up} records looked up, {len(self.fills)} enriched "
+                f"({counts}), {self.failed} failed; requests: {requests or 'none'}; "
+                f"{self.connections} connection(s) opened")
+
+def enrich_frame(df, backend=None, cache_path=None, limit=None, **client_options):
+    """Look up the records of `df` missing metadata; see `MetadataClient` for options"""
+    backend = backend or CrossrefBackend()
+    records = lookup_records(df)[:limit]
+    cache = ResponseCache(cache_path or os.path.join(CACHE_DIRNAME, 'responses.sqlite'))
+
+    async def run():
+        client = MetadataClient(cache, **client_options)
+        try:
+            return await _enrich(records, backend, client), client
+        finally:
+            client.close()
+    results, client = asyncio.run(run())
+
+    found = [r for r in results if isinstance(r, dict)]
+    fills = pd.DataFrame(found, columns=['Key'] + ENRICHED_COLUMNS + [SOURCE_COLUMN]).fillna('')
+    return EnrichmentResult(fills, len(records), results.count('failed'),
+                            client.stats, client.pool.opened)
+
+def write_sidecar(path, fills):
+    """Merge `fills` into the sidecar at `path`; earlier values for a Key are kept"""
+    if os.path.exists(path):
+        previous = pd.read_csv(path, encoding='utf-8', dtype=str,
+                               keep_default_na=False, na_filter=False)
+        fills = pd.concat([previous, fills], ignore_index=True).fillna('')
+        # First non-blank value per Key and column
+        fills = fills.replace('', None).groupby('Key', sort=False).first().fillna('').reset_index()
+    partial = path + '.tmp'
+    fills.to_csv(partial, index=False, encoding='utf-8')
+    os.replace(partial, path)
+
+def enrich_export(export_path=prisma_counts.SCREENING_EXPORT, backend=None, limit=None,
+                  **client_options):
+    """Enrich an export and record the found values in its sidecar"""
+    import zotero_export
+    df = zotero_export.load_export(export_path)
+    cache_path = os.path.join(os.path.dirname(os.path.abspath(export_path)),
+                              CACHE_DIRNAME, 'responses.sqlite')
+    result = enrich_frame(df, backend, cache_path, limit, **client_options)
+    # Rewrite only on news, so reruns leave downstream caches valid
+    if len(result.fills):
+        write_sidecar(prisma_counts.enrichment_path(export_path), result.fills)
+    return result
+
+# --- Stand-in server and benchmark ----------------------------------------------
+
+class StandInServer:
+    """Local Crossref-like HTTP server over a fixed catalogue, run on a thread.
+
+    Answers /works/<doi> and /works?query.bibliographic=<title> with
+    `latency` seconds of delay, and fails a fraction `error_rate` of requests
+    with 503 or 429 (Retry-After: 0) to exercise the retry path.
+    """
+
+    def __init__(self, catalogue, latency=0.02, error_rate=0.0, seed=0):
+        self.by_doi = {item['DOI'].lower(): item for item in catalogue}
+        titles = dedup.normalize_title(pd.Series([item['title'][0] for item in catalogue]))
+        self.by_title = dict(zip(titles, catalogue))
+        self.latency = latency
+        self.error_rate = error_rate
+        self.rng = random.Random(seed)
+        self.requests = self.connections = 0
+        self._loop = asyncio.new_event_loop()
+        self._ready = threading.Event()
+
+    def _respond(self, target):
+        if self.rng.random() < self.error_rate:
+            return (429, {'Retry-After': '0'}) if self.rng.random() < 0.5 else (503, {}), b''
+        parts = urlsplit(target)
+        if parts.path.startswith('/works/'):
+            item = self.by_doi.get(unquote(parts.path[len('/works/'):]).lower())
+            if item is None:
+                return (404, {}), b'Resource not found.'
+            return (200, {}), json.dumps({'status': 'ok', 'message': item}).encode()
+        query = parse_qs(parts.query).get('query.bibliographic', [''])[0]
+        hit = self.by_title.get(dedup.normalize_title(pd.Series([query]))[0])
+        items = [hit] if hit else []
+        return (200, {}), json.dumps({'status': 'ok', 'message': {'items': items}}).encode()
+
+    async def _serve(self, reader, writer):
+        self.connections += 1
+        try:
+            while True:
+                head = await reader.readuntil(b'\r\n\r\n')
+                self.requests += 1
+                await asyncio.sleep(self.latency)
+                (status, extra), body = self._respond(head.split(b' ', 2)[1].decode())
+                lines = [f'HTTP/1.1 {status} {HTTPStatus(status).phrase}',
+                         'Content-Type: application/json', f'Content-Length: {len(body)}',
+                         *(f'{name}: {value}' for name, value in extra.items())]
+                writer.write(('\r\n'.join(lines) + '\r\n\r\n').encode() + body)
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    def _run(self):
+        asyncio.set_event_loop(self._loop)
+        self.server = self._loop.run_until_complete(
+            asyncio.start_server(self._serve, '127.0.0.1', 0))
+        self.url = 'http://127.0.0.1:%d' % self.server.sockets[0].getsockname()[1]
+        self._ready.set()
+        self._loop.run_forever()
+
+    def __enter__(self):
+        self._thread = threading.Thread(target=self._run, daemon=True)
+        self._thread.start()
+        self._ready.wait()
+        return self
+
+    def __exit__(self, *exc):
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+
+_WORDS = ('financial literacy athlete wealth career transition retirement money '
+          'management education intervention college professional sport income '
+          'planning debt savings behavior outcomes study program').split()
+
+def synthetic_export(n, seed=0):
+    """An export of `n` records with blank metadata, and the catalogue holding it"""
+    rng = np.random.default_rng(seed)
+    rows, catalogue = [], []
+    for i in range(n):
+        title = ' '.join(rng.choice(_WORDS, 8)).capitalize() + f' {i}'
+        year = int(rng.integers(1990, 2026))
+        doi = f'10.5555/synthetic.{i}'
+        catalogue.append({'DOI': doi, 'title': [title], 'issued': {'date-parts': [[year]]},
+                          'container-title': ['Journal of Synthetic Studies'],
+                          'abstract': f'<jats:p>Abstract of record {i}.</jats:p>',
+                          'volume': str(i % 40), 'page': f'{i}-{i + 9}',
+                          'URL': f'https://doi.org/{doi}'})
+        # Half know their DOI and miss the abstract; half have only a title
+        known = i % 2 == 0
+        rows.append({'Key': f'K{i:07d}', 'Title': title, 'Author': f'Author{i}, A.',
+                     'Publication Year': year, 'DOI': doi if known else '',
+                     'Url': '', 'Abstract Note': '', 'Publication Title': '',
+                     'ISSN': '', 'Volume': '', 'Issue': '', 'Pages': ''})
+    df = pd.DataFrame(rows)
+    df['Publication Year'] = df['Publication Year'].astype('Int16')
+    return df, catalogue
+
+def benchmark(n, latency=0.02, error_rate=0.02):
+    import tempfile
+    df, catalogue = synthetic_export(n)
+    with tempfile.TemporaryDirectory() as scratch, \
+            StandInServer(catalogue, latency, error_rate) as server:
+        backend = CrossrefBackend(server.url)
+        host = urlsplit(server.url).hostname
+        runs = [('sequential', 'sequential.sqlite', 1),
+                ('pooled', 'pooled.sqlite', 16),
+                ('rerun', 'pooled.sqlite', 16)]
+        for label, cache_name, concurrency in runs:
+            start = time.perf_counter()
+            result = enrich_frame(df, backend, os.path.join(scratch, cache_name),
+                                  concurrency=concurrency, rate_limits={host: 0})
+            print(f"{label} (concurrency {concurrency}): "
+                  f"{time.perf_counter() - start:.2f}s; {result.summary()}")
+    print(f"stand-in server: {server.requests} requests over "
+          f"{server.connections} connections, {latency * 1000:.0f} ms latency, "
+          f"{error_rate:.0%} transient errors")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Fill missing export metadata from a metadata API')
+    parser.add_argument('export', nargs='?', default=prisma_counts.SCREENING_EXPORT,
+                        help='Zotero CSV export (default: the review screening export)')
+    parser.add_argument('--backend', choices=sorted(BACKENDS), default='crossref')
+    parser.add_argument('--base-url', default=None,
+                        help='API root, e.g. a mirror or local stand-in server')
+    parser.add_argument('--mailto', default=os.environ.get('CROSSREF_MAILTO'),
+                        help="contact address for Crossref's polite pool "
+                             "(default: $CROSSREF_MAILTO)")
+    parser.add_argument('--concurrency', type=int, default=CONCURRENCY,
+                        help='requests in flight (default: %(default)s)')
+    parser.add_argument('--rate', type=float, default=None,
+                        help='requests per second to the API host (0 = unlimited)')
+    parser.add_argument('--retries', type=int, default=MAX_RETRIES)
+    parser.add_argument('--limit', type=int, default=None, help='look up at most N records')
+    parser.add_argument('--offline', action='store_true',
+                        help='use cached responses only, no network I/O')
+    parser.add_argument('--benchmark', type=int, default=None, metavar='N',
+                        help='time N synthetic records against a local stand-in server')
+    args = parser.parse_args()
+
+    if args.benchmark:
+        benchmark(args.benchmark)
+    else:
+        backend = BACKENDS[args.backend](*([args.base_url] if args.base_url else []))
+        rate_limits = None
+        if args.rate is not None:
+            rate_limits = {urlsplit(backend.base_url).hostname: args.rate}
+        result = enrich_export(args.export, backend, args.limit,
+                               concurrency=args.concurrency, rate_limits=rate_limits,
+                               retries=args.retries, offline=args.offline,
+                               mailto=args.mailto)
+        print(result.summary())
+        if len(result.fills):
+            print(f"Wrote {prisma_counts.enrichment_path(args.export)}")
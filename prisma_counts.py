@@ -0,0 +1,271 @@
+#!/usr/bin/env python3
+"""
+Stream a Zotero screening export and derive PRISMA flow counts
+
+Screening decisions are read from `Manual Tags` (and, for exclusion reasons
+and sources, from `Notes`) using this vocabulary; the `PRISMA/` prefix is
+optional and matching is case-insensitive:
+
+    PRISMA/Duplicate                       removed before screening
+    PRISMA/Excluded: <reason>              excluded at title/abstract
+    PRISMA/Full-text                       passed title/abstract screening
+    PRISMA/Full-text excluded: <reason>    excluded after full-text review
+    PRISMA/Included                        included in the review
+    PRISMA/Design: <study design>          design of an included study
+
+A note paragraph `Exclusion reason: <reason>` supplies the reason when the
+exclusion tag has none. The database a record came from is taken from a
+`Source: ...` note, then the `Archive` / `Library Catalog` columns, then the
+URL host.
+"""
+
+import csv
+import json
+import os
+import re
+import sys
+from collections import Counter
+from dataclasses import dataclass, field
+
+SCREENING_EXPORT = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                '810 25SP Head Screened.csv')
+
+def enrichment_path(export_path):
+    """Sidecar of looked-up metadata that `zotero_export` merges into an export"""
+    return os.path.splitext(export_path)[0] + '.enrichment.csv'
+
+def decision_log_path(export_path):
+    """Append-only screening decision log of an export (see `decision_log`)"""
+    return os.path.splitext(export_path)[0] + '.decisions.sqlite'
+
+def decision_log_files(export_path):
+    """The decision log database and its write-ahead log, when they exist"""
+    database = decision_log_path(export_path)
+    return [p for p in (database, database + '-wal') if os.path.exists(p)]
+
+def export_files(export_path):
+    """The export plus its enrichment sidecar, when there is one"""
+    sidecar = enrichment_path(export_path)
+    return [export_path] + ([sidecar] if os.path.exists(sidecar) else [])
+
+NO_REASON = 'Reason not recorded'
+OTHER_SOURCE = 'Other sources'
+
+# First match wins; searched in source notes, archive/catalog and URL
+SOURCE_PATTERNS = [
+    ('PubMed', re.compile(r'pubmed|ncbi\.nlm\.nih', re.I)),
+    ('Google Scholar', re.compile(r'google scholar|scholar\.google', re.I)),
+    ('SciSpace', re.compile(r'scispace|typeset\.io', re.I)),
+    ('ProQuest', re.compile(r'proquest|research library', re.I)),
+    ('EBSCO', re.compile(r'ebsco', re.I)),
+    ('Web of Science', re.compile(r'web of science|webofscience', re.I)),
+    ('Scopus', re.compile(r'scopus', re.I)),
+    ('ERIC', re.compile(r'\beric\b|eric\.ed\.gov', re.I)),
+    ('SPORTDiscus', re.compile(r'sportdiscus', re.I)),
+]
+
+_TAG_RULES = [
+    ('duplicate', re.compile(r'^(?:prisma/)?duplicate$', re.I)),
+    ('fulltext_excluded',
+     re.compile(r'^(?:prisma/)?full[- ]?text excluded(?:\s*:\s*(?P<reason>.+))?$', re.I)),
+    ('excluded', re.compile(r'^(?:prisma/)?excluded(?:\s*:\s*(?P<reason>.+))?$', re.I)),
+    ('fulltext', re.compile(r'^(?:prisma/)?full[- ]?text$', re.I)),
+    ('included', re.compile(r'^(?:prisma/)?included$', re.I)),
+    ('design', re.compile(r'^(?:prisma/)?design\s*:\s*(?P<reason>.+)$', re.I)),
+]
+
+# Export columns `count_prisma` reads
+RECORD_COLUMNS = ['Key', 'Manual Tags', 'Notes', 'Archive', 'Library Catalog', 'Url']
+
+_NOTE_SOURCE = re.compile(r'Source:\s*([^<;]+)', re.I)
+_NOTE_REASON = re.compile(r'Exclusion reason:\s*([^<;]+)', re.I)
+
+@dataclass
+class PrismaCounts:
+    """Record counts at each PRISMA stage of a screening export"""
+    identified: int = 0
+    by_source: Counter = field(default_factory=Counter)
+    duplicates: int = 0
+    screened: int = 0
+    awaiting_screening: int = 0
+    screen_excluded: int = 0
+    screen_exclusion_reasons: Counter = field(default_factory=Counter)
+    fulltext_assessed: int = 0
+    awaiting_fulltext: int = 0
+    fulltext_excluded: int = 0
+    fulltext_exclusion_reasons: Counter = field(default_factory=Counter)
+    included: int = 0
+    included_designs: Counter = field(default_factory=Counter)
+
+    def top_sources(self, n=3):
+        """The `n` largest sources, with the remainder merged into one entry"""
+        ranked = self.by_source.most_common()
+        top = [(s, c) for s, c in ranked if s != OTHER_SOURCE][:n]
+        rest = self.identified - sum(c for _, c in top)
+        if rest:
+            top.append((OTHER_SOURCE, rest))
+        return top
+
+    def stages(self):
+        """(label, count) pairs for a selection funnel"""
+        return [('Identified', self.identified),
+                ('Screened', self.screened),
+                ('Eligible', self.fulltext_assessed),
+                ('Included', self.included)]
+
+    def to_dict(self):
+        return {name: (dict(value.most_common()) if isinstance(value, Counter)
+                       else value)
+                for name, value in self.__dict__.items()}
+
+def _source_of(text, memo):
+    if text in memo:
+        return memo[text]
+    source = None
+    for name, pattern in SOURCE_PATTERNS:
+        if pattern.search(text):
+            source = name
+            break
+    memo[text] = source
+    return source
+
+def _classify_tags(tags, memo):
+    """Map a raw `Manual Tags` cell to {kind: reason}; memoized per cell"""
+    if tags in memo:
+        return memo[tags]
+    found = {}
+    for tag in tags.split(';'):
+        tag = tag.strip()
+        if not tag:
+            continue
+        for kind, pattern in _TAG_RULES:
+            match = pattern.match(tag)
+            if match:
+                found.setdefault(kind, (match.groupdict().get('reason') or '').strip())
+                break
+    memo[tags] = found
+    return found
+
+def classify_tags(tags, memo=None):
+    """Screening decisions in a `Manual Tags` cell as {kind: reason}"""
+    return _classify_tags(tags, {} if memo is None else memo) if tags else {}
+
+def iter_records(path, columns):
+    """Yield tuples of the requested columns, one CSV row at a time"""
+    with open(path, encoding='utf-8-sig', newline='') as f:
+        reader = csv.reader(f)
+        header = next(reader)
+        positions = [header.index(c) if c in header else None for c in columns]
+        width = len(header)
+        for row in reader:
+            if len(row) < width:
+                row += [''] * (width - len(row))
+            yield tuple(row[p] if p is not None else '' for p in positions)
+
+def _count_logged(counts, status, reason, design):
+    """Count a record whose funnel status comes from the decision log"""
+    if status == 'awaiting_screening':
+        counts.awaiting_screening += 1
+    elif status == 'screen_excluded':
+        counts.screen_excluded += 1
+        counts.screen_exclusion_reasons[reason] += 1
+    else:
+        counts.fulltext_assessed += 1
+        if status == 'awaiting_fulltext':
+            counts.awaiting_fulltext += 1
+        elif status == 'fulltext_excluded':
+            counts.fulltext_excluded += 1
+            counts.fulltext_exclusion_reasons[reason] += 1
+        else:
+            counts.included += 1
+            counts.included_designs[design or 'Design not recorded'] += 1
+
+def count_prisma(path=SCREENING_EXPORT, duplicate_keys=(), decisions=None):
+    """Derive PRISMA counts from a Zotero CSV export in one streaming pass.
+
+    Records whose Key is in `duplicate_keys` (e.g. from `dedup`) are counted
+    as duplicates in addition to those tagged as such. With `decisions`
+    (`decision_log.Aggregates`), a record's screening status is read from
+    the decision log; records the log has no decision for fall back to
+    their tags.
+    """
+    counts = PrismaCounts()
+    tag_memo, source_memo = {}, {}
+    for key, tags, notes, archive, catalog, url in iter_records(path, RECORD_COLUMNS):
+        counts.identified += 1
+
+        source = None
+        if notes:
+            match = _NOTE_SOURCE.search(notes)
+            if match:
+                source = _source_of(match.group(1), source_memo)
+        for text in (archive, catalog, url):
+            if source is None and text:
+                source = _source_of(text, source_memo)
+        counts.by_source[source or OTHER_SOURCE] += 1
+
+        decision = _classify_tags(tags, tag_memo) if tags else {}
+        if 'duplicate' in decision or key in duplicate_keys:
+            counts.duplicates += 1
+            continue
+        counts.screened += 1
+
+        logged = decisions.status.get(key) if decisions is not None else None
+        if logged is not None:
+            _count_logged(counts, *logged, decision.get('design'))
+            continue
+
+        note_reason = None
+        if notes and ('excluded' in decision or 'fulltext_excluded' in decision):
+            match = _NOTE_REASON.search(notes)
+            if match:
+                note_reason = match.group(1).strip()
+
+        if 'included' in decision:
+            counts.fulltext_assessed += 1
+            counts.included += 1
+            counts.included_designs[decision.get('design') or 'Design not recorded'] += 1
+        elif 'fulltext_excluded' in decision:
+            counts.fulltext_assessed += 1
+            counts.fulltext_excluded += 1
+            reason = decision['fulltext_excluded'] or note_reason or NO_REASON
+            counts.fulltext_exclusion_reasons[reason] += 1
+        elif 'fulltext' in decision:
+            counts.fulltext_assessed += 1
+            counts.awaiting_fulltext += 1
+        elif 'excluded' in decision:
+            counts.screen_excluded += 1
+            reason = decision['excluded'] or note_reason or NO_REASON
+            counts.screen_exclusion_reasons[reason] += 1
+        else:
+            counts.awaiting_screening += 1
+    return counts
+
+_loaded = {}
+
+def load_counts(path=SCREENING_EXPORT, detect_duplicates=True):
+    """`count_prisma`, memoized per file version within this process.
+
+    With `detect_duplicates`, duplicates found by `dedup` are removed before
+    screening alongside records tagged `PRISMA/Duplicate`. When the export
+    has a decision log, screening statuses come from its aggregates.
+    """
+    decisions = None
+    if decision_log_files(path):
+        import decision_log
+        decisions = decision_log.open_log(decision_log_path(path)).aggregates
+    # Enriched DOIs change what dedup finds, so the sidecar is part of the version
+    key = (tuple((os.path.abspath(p), os.stat(p).st_size, os.stat(p).st_mtime_ns)
+                 for p in export_files(path)),
+           decisions.seq if decisions is not None else None, detect_duplicates)
+    if key not in _loaded:
+        duplicate_keys = set()
+        if detect_duplicates:
+            import dedup
+            duplicate_keys = dedup.find_duplicates_in_export(path).duplicate_keys()
+        _loaded[key] = count_prisma(path, duplicate_keys, decisions)
+    return _loaded[key]
+
+if __name__ == "__main__":
+    export = sys.argv[1] if len(sys.argv) > 1 else SCREENING_EXPORT
+    print(json.dumps(load_counts(export).to_dict(), indent=2))
@@ -0,0 +1,186 @@
+#!/usr/bin/env python3
+"""
+Content-addressed on-disk cache for rendered systematic review figures
+"""
+
+import hashlib
+import importlib.metadata
+import inspect
+import json
+import os
+import shutil
+import time
+
+CACHE_VERSION = 1
+
+# Library versions that change rendered output when upgraded
+_VERSIONED_PACKAGES = ['matplotlib', 'numpy', 'pandas', 'seaborn']
+
+# Global values of these types referenced by a figure function are hashed
+_DATA_TYPES = (dict, list, tuple, str, int, float)
+
+def _package_versions():
+    versions = {}
+    for package in _VERSIONED_PACKAGES:
+        try:
+            versions[package] = importlib.metadata.version(package)
+        except importlib.metadata.PackageNotFoundError:
+            versions[package] = None
+    return versions
+
+def _file_digest(path):
+    # Optional inputs (e.g. an enrichment sidecar) hash as missing until created
+    if not os.path.exists(path):
+        return 'missing'
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1 << 20), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+def style_fingerprint(rc_params):
+    """Stable text form of the active rcParams (style, palette, fonts, DPI)"""
+    return json.dumps({k: repr(v) for k, v in sorted(rc_params.items())},
+                      sort_keys=True)
+
+def figure_key(name, create, style, inputs=()):
+    """Hash a figure's generating code, style settings and input files.
+
+    `create` is the figure function; its source and the module-level data
+    it references hold the hard-coded study data. `inputs` lists extra files
+    (CSV exports, extraction data, helper modules) whose bytes the figure
+    depends on.
+    """
+    digest = hashlib.sha256()
+    parts = [
+        f'version={CACHE_VERSION}',
+        f'name={name}',
+        inspect.getsource(create),
+        style,
+        json.dumps(_package_versions(), sort_keys=True),
+    ]
+    # Module-level data tables the function reads (e.g. EFFECT_SIZE_DATA)
+    for global_name in sorted(set(create.__code__.co_names)):
+        value = create.__globals__.get(global_name)
+        if isinstance(value, _DATA_TYPES):
+            parts.append(f'{global_name}={value!r}')
+    for path in sorted(inputs):
+        parts.append(f'{path}={_file_digest(path)}')
+    for part in parts:
+        digest.update(part.encode('utf-8'))
+        digest.update(b'\0')
+    return digest.hexdigest()
+
+class RenderCache:
+    """Stores each figure's outputs under the hash of everything that made them.
+
+    Layout of `cache_dir`:
+        index.json           figure name -> {key: {outputs, last_used}}
+        objects/<key>/...    copies of the rendered files for that key
+        manifest.json        what the most recent run reused/rebuilt/evicted
+    """
+
+    def __init__(self, cache_dir, keep_per_figure=2):
+        self.cache_dir = cache_dir
+        self.keep_per_figure = keep_per_figure
+        self.index_path = os.path.join(cache_dir, 'index.json')
+        self.manifest_path = os.path.join(cache_dir, 'manifest.json')
+        self.objects_dir = os.path.join(cache_dir, 'objects')
+        self.index = self._load_index()
+        self.records = {}
+
+    def _load_index(self):
+        try:
+            with open(self.index_path) as f:
+                index = json.load(f)
+        except (OSError, ValueError):
+            return {}
+        if index.get('version') != CACHE_VERSION:
+            return {}
+        return index.get('figures', {})
+
+    def _object_path(self, key, output):
+        return os.path.join(self.objects_dir, key, os.path.basename(output))
+
+    def restore(self, name, key, outputs):
+        """Put cached outputs for `key` in place; True on a cache hit.
+
+        Outputs already on disk with the cached content are left untouched,
+        missing or modified ones are copied back from the object store.
+        """
+        entry = self.index.get(name, {}).get(key)
+        if entry is None or sorted(entry['outputs']) != sorted(outputs):
+            return False
+        for output in outputs:
+            cached = self._object_path(key, output)
+            if not os.path.exists(cached):
+                return False
+        digests = entry.get('digests', {})
+        for output in outputs:
+            cached = self._object_path(key, output)
+            if (not os.path.exists(output)
+                    or os.path.getsize(output) != os.path.getsize(cached)
+                    or _file_digest(output) != digests.get(output)):
+                os.makedirs(os.path.dirname(output) or '.', exist_ok=True)
+                shutil.copy2(cached, output)
+        entry['last_used'] = time.time()
+        self.records[name] = {'status': 'reused', 'key': key,
+                              'outputs': list(outputs)}
+        return True
+
+    def store(self, name, key, outputs, elapsed=None):
+        """Copy freshly rendered outputs into the object store under `key`"""
+        object_dir = os.path.join(self.objects_dir, key)
+        os.makedirs(object_dir, exist_ok=True)
+        for output in outputs:
+            shutil.copy2(output, self._object_path(key, output))
+        self.index.setdefault(name, {})[key] = {
+            'outputs': list(outputs),
+            'digests': {output: _file_digest(output) for output in outputs},
+            'last_used': time.time(),
+        }
+        self.records[name] = {'status': 'rebuilt', 'key': key,
+                              'outputs': list(outputs), 'seconds': elapsed}
+
+    def mark_failed(self, name, key):
+        self.records[name] = {'status': 'failed', 'key': key}
+
+    def evict(self, live_names):
+        """Drop figures no longer registered and all but the newest keys of each"""
+        evicted = []
+        for name in list(self.index):
+            entries = self.index[name]
+            ranked = sorted(entries, key=lambda k: entries[k]['last_used'],
+                            reverse=True)
+            keep = ranked[:self.keep_per_figure] if name in live_names else []
+            for key in ranked:
+                if key not in keep:
+                    del entries[key]
+                    shutil.rmtree(os.path.join(self.objects_dir, key),
+                                  ignore_errors=True)
+                    evicted.append({'figure': name, 'key': key})
+            if not entries:
+                del self.index[name]
+        return evicted
+
+    def save(self, live_names):
+        """Evict stale entries, then write the index and this run's manifest"""
+        evicted = self.evict(live_names)
+        os.makedirs(self.cache_dir, exist_ok=True)
+        with open(self.index_path, 'w') as f:
+            json.dump({'version': CACHE_VERSION, 'figures': self.index},
+                      f, indent=2, sort_keys=True)
+        manifest = {
+            'created': time.strftime('%Y-%m-%dT%H:%M:%S'),
+            'reused': sorted(n for n, r in self.records.items()
+                             if r['status'] == 'reused'),
+            'rebuilt': sorted(n for n, r in self.records.items()
+                              if r['status'] == 'rebuilt'),
+            'failed': sorted(n for n, r in self.records.items()
+                             if r['status'] == 'failed'),
+            'evicted': evicted,
+            'figures': self.records,
+        }
+        with open(self.manifest_path, 'w') as f:
+            json.dump(manifest, f, indent=2, sort_keys=True)
+        return manifest
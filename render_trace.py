@@ -0,0 +1,186 @@
+#!/usr/bin/env python3
+"""
+Opt-in timing spans and profiles for the figure render pipeline
+
+Enable with `--trace FILE` (and optionally `--profile DIR`) or the
+REVIEW_TRACE / REVIEW_PROFILE environment variables. Spans cover each
+figure, dataset view construction, `tight_layout`, the tight-bbox pass and
+every `savefig` (PDF font embedding happens inside `savefig.pdf`). Each
+figure span records the process's peak RSS and the figure's artist count.
+The trace is written in the Chrome trace-event format, viewable in
+chrome://tracing or https://ui.perfetto.dev; render workers write their own
+part files, which are merged into FILE at the end of the run. With
+`--profile`, a cProfile dump per figure is written to DIR/<stem>.prof.
+
+When disabled, `span` returns a shared no-op context manager and nothing
+else runs.
+"""
+
+import contextlib
+import functools
+import glob
+import json
+import os
+import resource
+import sys
+import threading
+import time
+
+TRACE_ENV = 'REVIEW_TRACE'
+PROFILE_ENV = 'REVIEW_PROFILE'
+
+_NULL = contextlib.nullcontext()
+_tracer = None
+
+def _peak_rss_mb():
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return round(peak / 2 ** 20 if sys.platform == 'darwin' else peak / 2 ** 10, 1)
+
+class Tracer:
+    """Collects trace events in this process and appends them to a part file"""
+
+    def __init__(self, path, profile_dir=None):
+        self.path = path
+        self.profile_dir = profile_dir
+        self.pid = os.getpid()
+        self.events = [{'name': 'process_name', 'ph': 'M', 'pid': self.pid,
+                        'args': {'name': f'{os.path.basename(sys.argv[0])} {self.pid}'}}]
+        self._open = threading.local()
+        self._lock = threading.Lock()
+        # Wall-clock microseconds, so spans from different processes line up
+        self._epoch = time.time() - time.perf_counter()
+
+    def _now(self):
+        return (time.perf_counter() + self._epoch) * 1e6
+
+    @contextlib.contextmanager
+    def span(self, name, **args):
+        stack = self._open.__dict__.setdefault('stack', [])
+        stack.append(args)
+        start = self._now()
+        try:
+            yield
+        finally:
+            stack.pop()
+            event = {'name': name, 'ph': 'X', 'ts': start, 'dur': self._now() - start,
+                     'pid': self.pid, 'tid': threading.get_native_id()}
+            if args:
+                event['args'] = args
+            with self._lock:
+                self.events.append(event)
+
+    def annotate(self, **args):
+        """Add `args` to the innermost open span of the calling thread"""
+        stack = getattr(self._open, 'stack', None)
+        if stack:
+            stack[-1].update(args)
+
+    def counter(self, name, **values):
+        with self._lock:
+            self.events.append({'name': name, 'ph': 'C', 'ts': self._now(),
+                                'pid': self.pid, 'args': values})
+
+    def flush(self):
+        """Append buffered events to this process's part file"""
+        with self._lock:
+            events, self.events = self.events, []
+        if events:
+            with open(f'{self.path}.{self.pid}.part', 'a', encoding='utf-8') as f:
+                f.writelines(json.dumps(event) + '\n' for event in events)
+
+def _observe_export(fig, stem, paths):
+    _tracer.annotate(artists=len(fig.findobj()),
+                     bytes=sum(os.path.getsize(p) for p in paths))
+
+def enable(path, profile_dir=None):
+    """Trace this process into part files of `path`"""
+    global _tracer
+    import figure_export
+    if profile_dir:
+        os.makedirs(profile_dir, exist_ok=True)
+    _tracer = Tracer(os.path.abspath(path), profile_dir)
+    figure_export.add_observer(_observe_export)
+
+def enable_from_env():
+    """Enable tracing if the parent process asked for it (render workers)"""
+    if _tracer is None and os.environ.get(TRACE_ENV):
+        enable(os.environ[TRACE_ENV], os.environ.get(PROFILE_ENV) or None)
+
+def start(path, profile_dir=None):
+    """Begin a traced run: clear old part files and enable spawned workers too"""
+    path = os.path.abspath(path)
+    for part in glob.glob(glob.escape(path) + '.*.part'):
+        os.remove(part)
+    os.environ[TRACE_ENV] = path
+    if profile_dir:
+        os.environ[PROFILE_ENV] = os.path.abspath(profile_dir)
+    enable(path, profile_dir)
+
+def enabled():
+    return _tracer is not None
+
+def span(name, **args):
+    """Context manager timing a pipeline stage (no-op unless tracing)"""
+    if _tracer is None:
+        return _NULL
+    return _tracer.span(name, **args)
+
+def traced(name):
+    """Decorator form of `span`"""
+    def decorate(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            if _tracer is None:
+                return function(*args, **kwargs)
+            with _tracer.span(name):
+                return function(*args, **kwargs)
+        return wrapper
+    return decorate
+
+@contextlib.contextmanager
+def _traced_figure(name, stem):
+    profile = None
+    if _tracer.profile_dir:
+        import cProfile
+        profile = cProfile.Profile()
+    try:
+        with _tracer.span(name, stem=stem):
+            if profile is not None:
+                profile.enable()
+            try:
+                yield
+            finally:
+                if profile is not None:
+                    profile.disable()
+                _tracer.annotate(peak_rss_mb=_peak_rss_mb())
+        _tracer.counter('memory', peak_rss_mb=_peak_rss_mb())
+    finally:
+        if profile is not None:
+            profile.dump_stats(os.path.join(_tracer.profile_dir, f'{stem}.prof'))
+        # Workers may be stopped at any time; write each figure out as it ends
+        _tracer.flush()
+
+def figure(name, stem):
+    """Span around one whole figure, with memory, artists and optional profile"""
+    if _tracer is None:
+        return _NULL
+    return _traced_figure(name, stem)
+
+def finish():
+    """Merge every process's part file into the trace file (parent process)"""
+    if _tracer is None:
+        return None
+    _tracer.flush()
+    events = []
+    parts = sorted(glob.glob(glob.escape(_tracer.path) + '.*.part'))
+    for part in parts:
+        with open(part, encoding='utf-8') as f:
+            events.extend(json.loads(line) for line in f if line.strip())
+        os.remove(part)
+    with open(_tracer.path, 'w', encoding='utf-8') as f:
+        json.dump({'traceEvents': events, 'displayTimeUnit': 'ms'}, f)
+    print(f"Wrote {len(events)} trace events from {len(parts)} process(es) "
+          f"to {_tracer.path}")
+    if _tracer.profile_dir:
+        print(f"Wrote per-figure profiles to {_tracer.profile_dir}")
+    return _tracer.path
@@ -0,0 +1,357 @@
+#!/usr/bin/env python3
+"""
+Run the figure pipeline for many slices of the review in one batch
+
+A batch file lists review configurations (see review_configs.json). Each one
+names a slice of the review:
+
+    name              output subdirectory
+    screening         library query over the screening export (see
+                      library_index), e.g. 'college OR ncaa year:>2015'
+    construct         keep the records scoring highest against one construct
+                      of Constructs_Framework.md (top `construct_share`,
+                      default 0.25, of the records matching it at all)
+    studies           filter over the extraction's studies: {"ids": [...],
+                      "year": "2020..", "components": [...], <any study field>: value(s),
+                      "exclude": {<the same, for studies to drop>}}
+    syntheses         review-level tallies to replace (they are not per study)
+    figures           figure commands to render (default: all)
+
+The export is parsed, indexed and scored once. Each slice's records are
+then written as a Zotero CSV subset, together with its share of the
+enrichment sidecar and decision log, and its studies as an extraction file,
+under OUTPUT/<name>/data/. Every slice x figure job runs through one
+process pool. At most 2 x jobs tasks are queued at a time. Each worker
+keeps its two most recent datasets and is replaced after `--recycle`
+tasks, so memory stays bounded however many slices there are. Figures go
+to OUTPUT/<name>/, and a combined summary to OUTPUT/summary.json.
+
+    python review_batch.py review_configs.json -o batch_figures -j 4 --draft
+"""
+
+import argparse
+import filecmp
+import json
+import multiprocessing
+import os
+import sys
+import time
+import traceback
+from collections import OrderedDict
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from dataclasses import dataclass
+
+import numpy as np
+
+import figure_export
+import prisma_counts
+import render_trace
+import review_dataset
+
+CONFIG_KEYS = {'name', 'description', 'screening', 'construct', 'construct_share',
+               'studies', 'syntheses', 'figures'}
+CONSTRUCT_SHARE = 0.25
+DATASETS_PER_WORKER = 2
+RECYCLE_TASKS = 50
+
+@dataclass
+class Job:
+    """One figure of one review slice, as sent to a render worker"""
+    review: str
+    figure: int                  # index into FIGURES
+    screening_path: str
+    extraction_path: str
+    output_dir: str
+    formats: dict
+
+def load_configs(path):
+    """Review configurations from a batch file, validated"""
+    with open(path, encoding='utf-8') as f:
+        document = json.load(f)
+    configs = document['reviews'] if isinstance(document, dict) else document
+    names = set()
+    for config in configs:
+        unknown = set(config) - CONFIG_KEYS
+        if unknown:
+            raise ValueError(f"review {config.get('name')!r}: unknown keys {sorted(unknown)}")
+        name = config.get('name', '')
+        if not name or os.sep in name or name in names:
+            raise ValueError(f'review names must be unique directory names, got {name!r}')
+        names.add(name)
+    return configs
+
+def _study_matches(study, spec):
+    from library_index import year_bounds
+    for field, wanted in spec.items():
+        if field == 'ids':
+            ok = study['id'] in wanted
+        elif field == 'year':
+            lo, hi = year_bounds(str(wanted))
+            year = study.get('year')
+            ok = year is not None and (lo is None or year >= lo) and (hi is None or year <= hi)
+        elif field == 'components':
+            ok = any(component in study.get('components', []) for component in wanted)
+        else:
+            ok = study.get(field) in (wanted if isinstance(wanted, list) else [wanted])
+        if not ok:
+            return False
+    return True
+
+def filter_extraction(extraction, spec=None, syntheses=None):
+    """The extraction restricted to the studies matching `spec`, with their effects"""
+    spec = dict(spec or {})
+    exclude = spec.pop('exclude', {})
+    fields = {field for study in extraction['studies'] for field in study}
+    unknown = (set(spec) | set(exclude)) - fields - {'ids'}
+    if unknown:
+        raise ValueError(f"unknown study fields {sorted(unknown)}; studies have {sorted(fields)}")
+    studies = [study for study in extraction['studies'] if _study_matches(study, spec)
+               and not (exclude and _study_matches(study, exclude))]
+    ids = {study['id'] for study in studies}
+    subset = dict(extraction, studies=studies,
+                  effects=[effect for effect in extraction['effects'] if effect['study'] in ids])
+    if syntheses:
+        subset['syntheses'] = {**extraction['syntheses'], **syntheses}
+    return subset
+
+class SharedInputs:
+    """The export, its library index, construct scores and the extraction, loaded once"""
+
+    def __init__(self, export_path=prisma_counts.SCREENING_EXPORT,
+                 extraction_path=review_dataset.EXTRACTION_FILE):
+        import library_index
+        self.export_path = export_path
+        self.library = library_index.LibraryIndex.open(export_path)
+        with open(extraction_path, encoding='utf-8') as f:
+            self.extraction = json.load(f)
+        self._construct_scores = None
+
+    @property
+    def construct_scores(self):
+        """Record x construct BM25 scores (DataFrame indexed by Key), computed on first use"""
+        if self._construct_scores is None:
+            import screening_priority
+            import zotero_export
+            df = zotero_export.load_export(self.export_path)
+            path = screening_priority.index_path(self.export_path)
+            index = screening_priority.ScreeningIndex.load(path)
+            _, tokenized, dropped = index.update(df['Key'].astype(str).tolist(),
+                                                 screening_priority.record_texts(df))
+            if tokenized or dropped:
+                index.save(path)
+            table = screening_priority.rank(index, screening_priority.parse_constructs(),
+                                            np.zeros(len(index.keys), dtype=bool))
+            self._construct_scores = table.set_index('Key')
+        return self._construct_scores
+
+    def rows(self, config):
+        """Row positions of the export records in a review slice"""
+        rows = np.arange(self.library.n)
+        if config.get('screening'):
+            rows = self.library.search(config['screening'])
+        if config.get('construct'):
+            scores = self.construct_scores
+            if config['construct'] not in scores:
+                raise ValueError(f"unknown construct {config['construct']!r}")
+            column = scores[config['construct']]
+            matching = column[column > 0]
+            share = config.get('construct_share', CONSTRUCT_SHARE)
+            keep = set(matching.nlargest(max(1, int(round(len(matching) * share)))).index)
+            rows = rows[np.isin(self.library.keys[rows], list(keep))]
+        return rows
+
+def _replace_if_changed(partial, path):
+    """Move `partial` over `path` unless the contents are identical (keeps caches warm)"""
+    if os.path.exists(path) and filecmp.cmp(partial, path, shallow=False):
+        os.remove(partial)
+    else:
+        os.replace(partial, path)
+
+def write_slice(shared, config, output_dir):
+    """Write a slice's screening subset and extraction; returns (screening, extraction, rows)"""
+    import pandas as pd
+    data_dir = os.path.join(output_dir, 'data')
+    os.makedirs(data_dir, exist_ok=True)
+    rows = shared.rows(config)
+    screening = os.path.join(data_dir, 'screening.csv')
+    _replace_if_changed(shared.library.export_subset(rows, screening + '.new'), screening)
+
+    keys = set(shared.library.keys[rows])
+    sidecar = prisma_counts.enrichment_path(shared.export_path)
+    subset_sidecar = prisma_counts.enrichment_path(screening)
+    if os.path.exists(sidecar):
+        fills = pd.read_csv(sidecar, encoding='utf-8', dtype=str,
+                            keep_default_na=False, na_filter=False)
+        fills[fills['Key'].isin(keys)].to_csv(subset_sidecar + '.new', index=False,
+                                              encoding='utf-8')
+        _replace_if_changed(subset_sidecar + '.new', subset_sidecar)
+    elif os.path.exists(subset_sidecar):
+        os.remove(subset_sidecar)
+    if prisma_counts.decision_log_files(shared.export_path):
+        import decision_log
+        decision_log.copy_decisions(prisma_counts.decision_log_path(shared.export_path),
+                                    prisma_counts.decision_log_path(screening), keys)
+
+    extraction = os.path.join(data_dir, 'extraction.json')
+    subset = filter_extraction(shared.extraction, config.get('studies'), config.get('syntheses'))
+    with open(extraction + '.new', 'w', encoding='utf-8') as f:
+        json.dump(subset, f, indent=2)
+    _replace_if_changed(extraction + '.new', extraction)
+    return screening, extraction, rows
+
+_datasets = OrderedDict()
+
+def dataset_for(screening_path, extraction_path):
+    """This worker's dataset for a slice; only the most recent few are kept"""
+    key = (screening_path, extraction_path)
+    if key in _datasets:
+        _datasets.move_to_end(key)
+    else:
+        _datasets[key] = review_dataset.ReviewDataset(screening_path, extraction_path)
+        while len(_datasets) > DATASETS_PER_WORKER:
+            _datasets.popitem(last=False)
+    return _datasets[key]
+
+def _render_job(job):
+    """Render one figure of one slice, returning (review, figure, seconds, error)"""
+    import matplotlib.pyplot as plt
+    import create_systematic_review_visualizations as figures
+    name, create, stem, _ = figures.FIGURES[job.figure]
+    figure_export.configure(figure_export.ExportConfig(job.output_dir, job.formats))
+    start = time.perf_counter()
+    try:
+        with render_trace.figure(f'{job.review}: {name}', f'{job.review}.{stem}'):
+            create(dataset_for(job.screening_path, job.extraction_path))
+    except Exception:
+        plt.close('all')
+        return job.review, job.figure, time.perf_counter() - start, traceback.format_exc()
+    return job.review, job.figure, time.perf_counter() - start, None
+
+def _run_jobs(jobs, workers, recycle, report):
+    import create_systematic_review_visualizations as figures
+    if workers == 1 or len(jobs) <= 1:
+        figures._init_render_worker()
+        for job in jobs:
+            report(*_render_job(job))
+        return
+    with ProcessPoolExecutor(max_workers=workers,
+                             mp_context=multiprocessing.get_context('spawn'),
+                             initializer=figures._init_render_worker,
+                             max_tasks_per_child=recycle) as pool:
+        queue = iter(jobs)
+        pending = set()
+        while True:
+            # Keep the queue short so results, not submissions, pile up in the parent
+            for job in queue:
+                pending.add(pool.submit(_render_job, job))
+                if len(pending) >= 2 * workers:
+                    break
+            if not pending:
+                break
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                report(*future.result())
+
+def run_batch(configs, output_root, workers=1, formats=None, recycle=RECYCLE_TASKS,
+              shared=None):
+    """Render every configuration's figures; returns the summary written to summary.json"""
+    import create_systematic_review_visualizations as figures
+    start = time.perf_counter()
+    shared = shared or SharedInputs()
+    formats = dict(formats or figure_export.PUBLICATION_FORMATS)
+    stems = {stem: index for index, (_, _, stem, _) in enumerate(figures.FIGURES)}
+
+    summary, jobs = {}, []
+    for config in configs:
+        output_dir = os.path.join(output_root, config['name'])
+        screening, extraction, rows = write_slice(shared, config, output_dir)
+        dataset = review_dataset.ReviewDataset(screening, extraction)
+        # An empty slice has nothing to count; its screening figures are skipped below
+        counts = dataset.prisma_counts if len(rows) else prisma_counts.PrismaCounts()
+        studies = len(dataset.extraction['studies'])
+        entry = summary[config['name']] = {
+            'description': config.get('description', ''),
+            'records': int(len(rows)), 'screened': counts.screened,
+            'included': counts.included, 'studies': studies,
+            'effects': len(dataset.extraction['effects']), 'figures': {}}
+        commands = config.get('figures') or list(figures.COMMANDS)
+        for command in commands:
+            if command not in figures.COMMANDS:
+                raise ValueError(f"review {config['name']!r}: unknown figure {command!r}")
+            index = stems[figures.COMMANDS[command]]
+            inputs = figures.FIGURES[index][3]
+            if review_dataset.EXTRACTION_FILE in inputs and not studies:
+                entry['figures'][command] = {'status': 'skipped: no studies'}
+            elif prisma_counts.SCREENING_EXPORT in inputs and not len(rows):
+                entry['figures'][command] = {'status': 'skipped: no records'}
+            else:
+                jobs.append(Job(config['name'], index, screening, extraction,
+                                output_dir, formats))
+    prepared = time.perf_counter()
+    print(f"Prepared {len(configs)} reviews in {prepared - start:.1f}s; "
+          f"rendering {len(jobs)} figures with {workers} worker(s)")
+
+    commands = {stem: command for command, stem in figures.COMMANDS.items()}
+    def report(review, index, elapsed, error):
+        name, _, stem, _ = figures.FIGURES[index]
+        result = {'status': 'failed' if error else 'ok', 'seconds': round(elapsed, 2)}
+        if error:
+            result['error'] = error.strip().splitlines()[-1]
+            print(f"{review}: {name} failed ({elapsed:.1f}s)\n{error}", file=sys.stderr)
+        else:
+            result['outputs'] = [os.path.relpath(path, output_root) for path in
+                                 figure_export.ExportConfig(
+                                     os.path.join(output_root, review), formats).outputs(stem)]
+            print(f"{review}: created {name} ({elapsed:.1f}s)")
+        summary[review]['figures'][commands[stem]] = result
+
+    _run_jobs(jobs, workers, recycle, report)
+    document = {'reviews': summary, 'seconds': round(time.perf_counter() - start, 1),
+                'formats': formats, 'workers': workers}
+    with open(os.path.join(output_root, 'summary.json'), 'w', encoding='utf-8') as f:
+        json.dump(document, f, indent=2)
+    return document
+
+def print_summary(document):
+    print(f"\n{'review':24s} {'records':>8s} {'screened':>9s} {'included':>9s} "
+          f"{'studies':>8s} {'effects':>8s}  figures")
+    for name, entry in document['reviews'].items():
+        statuses = [result['status'] for result in entry['figures'].values()]
+        ok = statuses.count('ok')
+        problems = len(statuses) - ok
+        print(f"{name:24s} {entry['records']:8d} {entry['screened']:9d} {entry['included']:9d} "
+              f"{entry['studies']:8d} {entry['effects']:8d}  {ok} ok"
+              + (f", {problems} skipped/failed" if problems else ''))
+    print(f"Total {document['seconds']}s")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Render figures for many review slices')
+    parser.add_argument('configs', help='batch file of review configurations (JSON)')
+    parser.add_argument('-o', '--output-dir', default='batch_figures',
+                        help='root of the per-review output trees (default: %(default)s)')
+    parser.add_argument('-j', '--jobs', type=int, default=os.cpu_count() or 1,
+                        help='render worker processes (default: CPU count)')
+    parser.add_argument('--formats', default=None,
+                        help="e.g. 'png:150,pdf' (default: publication PNG and PDF)")
+    parser.add_argument('--draft', action='store_true', help='100 dpi PNG only')
+    parser.add_argument('--recycle', type=int, default=RECYCLE_TASKS,
+                        help='replace a worker after this many figures (default: %(default)s)')
+    parser.add_argument('--only', default=None, help='comma-separated review names to run')
+    parser.add_argument('--trace', metavar='FILE', default=None,
+                        help='write a Chrome trace of every job (see render_trace)')
+    args = parser.parse_args()
+
+    configs = load_configs(args.configs)
+    if args.only:
+        wanted = set(args.only.split(','))
+        configs = [config for config in configs if config['name'] in wanted]
+    formats = (figure_export.DRAFT_FORMATS if args.draft else
+               figure_export.parse_formats(args.formats) if args.formats else None)
+    if args.trace:
+        render_trace.start(args.trace)
+    document = run_batch(configs, args.output_dir, max(1, args.jobs), formats, args.recycle)
+    render_trace.finish()
+    print_summary(document)
+    failed = sum(result['status'] == 'failed' for entry in document['reviews'].values()
+                 for result in entry['figures'].values())
+    sys.exit(1 if failed else 0)
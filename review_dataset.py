@@ -0,0 +1,190 @@
+#!/usr/bin/env python3
+"""
+One dataset object behind every figure
+
+`ReviewDataset` combines the Zotero screening export (PRISMA counts) with
+the structured extraction file (`study_extraction.json`: studies, effect
+sizes, risk-of-bias ratings, intervention components and narrative
+synthesis tallies). Derived tables are computed on first use and memoized,
+so a full run builds each of them once however many figures read it.
+"""
+
+import json
+import os
+from functools import cached_property
+
+import prisma_counts
+import render_trace
+
+EXTRACTION_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                               'study_extraction.json')
+
+# Memoized views, in the order `prepare` builds them
+VIEWS = ('prisma_counts', 'studies', 'effects', 'risk_of_bias',
+         'quality_distribution', 'component_matrix', 'screening_records',
+         'tag_incidence', 'record_dates', 'coauthorship')
+# Views that read the screening export rather than the extraction file
+SCREENING_VIEWS = ('prisma_counts', 'screening_records', 'tag_incidence', 'record_dates', 
+                   'coauthorship')
+
+def _view(method):
+    """A memoized view, timed as `dataset.<name>` when tracing"""
+    return cached_property(render_trace.traced(f'dataset.{method.__name__}')(method))
+
+class ReviewDataset:
+    """Screening export plus extraction data, with memoized derived views.
+
+    `extraction` may be a path to an extraction JSON file or an already
+    parsed dict of the same shape (e.g. a synthetic living-review table).
+    """
+
+    def __init__(self, screening_path=prisma_counts.SCREENING_EXPORT,
+                 extraction=EXTRACTION_FILE, detect_duplicates=True):
+        self.screening_path = screening_path
+        self.extraction_source = extraction
+        self.detect_duplicates = detect_duplicates
+
+    @_view
+    def extraction(self):
+        if isinstance(self.extraction_source, dict):
+            return self.extraction_source
+        with open(self.extraction_source, encoding='utf-8') as f:
+            return json.load(f)
+
+    @_view
+    def prisma_counts(self):
+        return prisma_counts.load_counts(self.screening_path, self.detect_duplicates)
+
+    @_view
+    def studies(self):
+        """One row per included study, indexed by study id"""
+        import pandas as pd
+        rows = self.extraction['studies']
+        return pd.DataFrame({
+            'label': [s['label'] for s in rows],
+            'year': [s.get('year') for s in rows],
+            'study_type': [s.get('study_type') for s in rows],
+            'sample_size': pd.array([s.get('sample_size') for s in rows], dtype='Int64'),
+        }, index=pd.Index([s['id'] for s in rows], name='id'))
+
+    @_view
+    def effects(self):
+        """Effect size table in the forest-plot layout, one row per outcome"""
+        import pandas as pd
+        studies = self.studies
+        rows = self.extraction['effects']
+        ids = [e['study'] for e in rows]
+        labels = studies.loc[ids, 'label'].to_numpy()
+        outcomes = [e['outcome'] for e in rows]
+        return pd.DataFrame({
+            'Study': [f'{label}\n{outcome}' for label, outcome in zip(labels, outcomes)],
+            'Outcome': outcomes,
+            'Effect_Size': [e['effect'] for e in rows],
+            'Lower_CI': [e['lower'] for e in rows],
+            'Upper_CI': [e['upper'] for e in rows],
+            'Sample_Size': studies.loc[ids, 'sample_size'].reset_index(drop=True),
+            'Year': studies.loc[ids, 'year'].reset_index(drop=True),
+            'Study_Type': studies.loc[ids, 'study_type'].reset_index(drop=True),
+        })
+
+    @_view
+    def risk_of_bias(self):
+        """`risk_of_bias.Assessment` of the studies, overall judgments derived"""
+        import risk_of_bias
+        return risk_of_bias.Assessment.from_extraction(self.extraction)
+
+    @_view
+    def quality_distribution(self):
+        """Number of studies at each overall quality level (high to low)"""
+        return self.risk_of_bias.quality_distribution()
+
+    @_view
+    def component_matrix(self):
+        """Bit-packed component x study presence matrix (studies in `studies` order)"""
+        import matrix_render
+        components = self.components
+        position = {name: i for i, name in enumerate(components)}
+        rows, cols = [], []
+        for j, study in enumerate(self.extraction['studies']):
+            for component in study.get('components', ()):
+                rows.append(position[component])
+                cols.append(j)
+        return matrix_render.BitMatrix.from_coords(
+            rows, cols, (len(components), len(self.extraction['studies'])))
+
+    @_view
+    def screening_records(self):
+        """Screening export rows, minus records tagged or detected as duplicates"""
+        import zotero_export
+        df = zotero_export.load_export(self.screening_path).reset_index(drop=True)
+        memo = {}
+        duplicate = df['Manual Tags'].map(
+            lambda cell: 'duplicate' in prisma_counts.classify_tags(cell, memo)).astype(bool)
+        if self.detect_duplicates:
+            import dedup
+            duplicate |= df['Key'].isin(dedup.find_duplicates(df).duplicate_keys())
+        return df[~duplicate.to_numpy()].reset_index(drop=True)
+
+    @_view
+    def tag_incidence(self):
+        """Record x topic-tag incidence of the screening records"""
+        import tag_cooccurrence
+        df = self.screening_records
+        return tag_cooccurrence.incidence(df['Tags'], df['Key'])
+
+    @_view
+    def record_dates(self):
+        """Publication and date-added datetimes of each screening record"""
+        df = self.screening_records
+        dates = df[['Key', 'Item Type']].copy()
+        dates['Published'] = df['Date Parsed']
+        # Records without a parseable Date still have their Publication Year
+        dates['Year'] = df['Date Parsed'].dt.year.fillna(df['Publication Year']).astype('Int64')
+        dates['Added'] = df['Date Added Parsed']
+        return dates
+
+    @_view
+    def coauthorship(self):
+        """Co-authorship graph of the screening records"""
+        import coauthorship
+        df = self.screening_records
+        return coauthorship.build_graph(df['Author'], df['Key'])
+
+    @property
+    def components(self):
+        return self.extraction['components']
+
+    @property
+    def study_labels(self):
+        return [s['label'] for s in self.extraction['studies']]
+
+    def synthesis(self, name):
+        """A narrative-synthesis tally from the extraction file as {label: count}"""
+        return self.extraction['syntheses'][name]
+
+    def prepare(self, views=VIEWS):
+        """Build derived views now, e.g. before handing copies to workers"""
+        for view in views:
+            getattr(self, view)
+        return self
+
+_loaded = {}
+
+def _file_versions(screening_path, extraction_path):
+    paths = tuple(os.path.abspath(p) for p in
+                  prisma_counts.export_files(screening_path)
+                  + prisma_counts.decision_log_files(screening_path) + [extraction_path])
+    return paths, tuple((os.stat(p).st_size, os.stat(p).st_mtime_ns) for p in paths)
+
+def load_dataset(screening_path=prisma_counts.SCREENING_EXPORT,
+                 extraction_path=EXTRACTION_FILE):
+    """The `ReviewDataset` for these files, shared within this process"""
+    key, stamp = _file_versions(screening_path, extraction_path)
+    if key not in _loaded or _loaded[key][0] != stamp:
+        _loaded[key] = (stamp, ReviewDataset(screening_path, extraction_path))
+    return _loaded[key][1]
+
+def use_dataset(dataset):
+    """Make `dataset` what `load_dataset` returns for its files (pool workers)"""
+    key, stamp = _file_versions(dataset.screening_path, dataset.extraction_source)
+    _loaded[key] = (stamp, dataset)
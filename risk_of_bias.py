@@ -0,0 +1,245 @@
+#!/usr/bin/env python3
+"""
+Risk-of-bias judgments as compact arrays, with derived overall judgments
+
+Domain judgments are held as an int8 study x domain array of codes
+(1 = low, 2 = moderate / some concerns, 3 = high) with an explicit boolean
+mask of the domains that apply to each study; cells that do not apply hold 0.
+The overall judgment of every study is derived from its domains by a rule,
+vectorized over all studies:
+
+    worst   ROBINS-I style: the worst applicable domain
+    rob2    RoB 2 style: as 'worst', but moderate in `escalate_moderate`
+            (default 3) or more domains counts as high
+
+The extraction file names its rule under 'risk_of_bias_rule' (default
+'worst'). An 'Overall Quality' judgment recorded in the extraction is kept
+as `recorded` for comparison and does not feed into the figures.
+
+Run as a script to compare derived and recorded judgments, or with
+--benchmark to time aggregation over synthetic assessments:
+
+    python risk_of_bias.py --rule rob2
+    python risk_of_bias.py --benchmark 10000,100000,1000000
+"""
+
+import argparse
+import time
+from functools import cached_property
+
+import numpy as np
+
+NOT_APPLICABLE = 0
+LEVELS = {1: 'Low', 2: 'Moderate', 3: 'High'}
+# Overall risk of bias -> study quality, as the dashboard reports it
+QUALITY_LEVELS = {1: 'High Quality', 2: 'Moderate Quality', 3: 'Low Quality'}
+COLORS = {1: '#2E8B57', 2: '#FFD700', 3: '#DC143C', NOT_APPLICABLE: 'lightgrey'}
+GLYPHS = {1: '+', 2: '-', 3: '×'}
+# Studies with no applicable domain have no overall judgment
+NOT_ASSESSED = 'Not assessed'
+QUALITY_COLORS = {**{level: COLORS[code] for code, level in QUALITY_LEVELS.items()},
+                  NOT_ASSESSED: COLORS[NOT_APPLICABLE]}
+
+OVERALL_DOMAIN = 'Overall Quality'
+RULES = {'worst': {'escalate_moderate': None},
+         'rob2': {'escalate_moderate': 3}}
+DEFAULT_RULE = 'worst'
+
+def derive_overall(ratings, applicable, escalate_moderate=None):
+    """Overall code per study: the worst applicable domain, 0 if none applies.
+
+    With `escalate_moderate`, a study whose worst domain is moderate but which
+    has at least that many moderate domains is judged high.
+    """
+    ratings = np.where(applicable, ratings, NOT_APPLICABLE)
+    overall = ratings.max(axis=1).astype(np.int8)
+    if escalate_moderate:
+        moderate = np.count_nonzero(ratings == 2, axis=1)
+        overall[(overall == 2) & (moderate >= escalate_moderate)] = 3
+    return overall
+
+class Assessment:
+    """Study x domain risk-of-bias judgments and the overall judgment they imply"""
+
+    def __init__(self, labels, domains, ratings, applicable=None, rule=DEFAULT_RULE,
+                 recorded=None, weights=None):
+        if rule not in RULES:
+            raise ValueError(f"unknown risk-of-bias rule {rule!r}; "
+                             f"choose from {', '.join(RULES)}")
+        ratings = np.asarray(ratings, dtype=np.int8)
+        if ratings.shape != (len(labels), len(domains)):
+            raise ValueError(f'ratings are {ratings.shape}, expected '
+                             f'{(len(labels), len(domains))} (studies x domains)')
+        applicable = (ratings != NOT_APPLICABLE if applicable is None
+                      else np.asarray(applicable, dtype=bool))
+        if ((ratings < 1) | (ratings > 3))[applicable].any():
+            raise ValueError('applicable judgments must be 1 (low), 2 or 3 (high)')
+        self.labels = list(labels)
+        self.domains = list(domains)
+        self.ratings = np.where(applicable, ratings, NOT_APPLICABLE).astype(np.int8)
+        self.applicable = applicable
+        self.rule = rule
+        self.recorded = (np.zeros(len(self.labels), np.int8) if recorded is None
+                         else np.asarray(recorded, dtype=np.int8))
+        # Per-study weights for summaries, e.g. sample sizes (missing = 0)
+        self.weights = (None if weights is None
+                        else np.nan_to_num(np.asarray(weights, dtype=float)))
+
+    @classmethod
+    def from_extraction(cls, extraction, rule=None):
+        """The assessment recorded in an extraction document (study_extraction.json)"""
+        domains = [d for d in extraction['risk_of_bias_domains'] if d != OVERALL_DOMAIN]
+        studies = extraction['studies']
+        # None (not applicable) becomes NaN, then code 0
+        table = np.array([[s['risk_of_bias'].get(d) for d in domains + [OVERALL_DOMAIN]]
+                          for s in studies], dtype=float).reshape(len(studies), -1)
+        codes = np.nan_to_num(table).astype(np.int8)
+        return cls([s['label'] for s in studies], domains, codes[:, :-1],
+                   rule=rule or extraction.get('risk_of_bias_rule', DEFAULT_RULE),
+                   recorded=codes[:, -1],
+                   weights=[s.get('sample_size') or 0 for s in studies])
+
+    @cached_property
+    def overall(self):
+        return derive_overall(self.ratings, self.applicable, **RULES[self.rule])
+
+    def table(self):
+        """Studies x domains plus the derived overall column, NaN where not applicable"""
+        import pandas as pd
+        codes = np.column_stack([self.ratings, self.overall]).astype(float)
+        codes[codes == NOT_APPLICABLE] = np.nan
+        return pd.DataFrame(codes, columns=self.domains + [OVERALL_DOMAIN],
+                            index=pd.Index(self.labels, name='Study'))
+
+    def counts(self, weighted=False):
+        """Domain (plus overall) x level totals, levels 0 (not applicable) to 3"""
+        codes = np.column_stack([self.ratings, self.overall]).astype(np.intp)
+        cells = codes + 4 * np.arange(codes.shape[1])
+        weights = None
+        if weighted and self.weights is not None:
+            weights = np.broadcast_to(self.weights[:, None], codes.shape).ravel()
+        return np.bincount(cells.ravel(), weights=weights,
+                           minlength=4 * codes.shape[1]).reshape(-1, 4)
+
+    def summary(self, weighted=False):
+        """Share of each level per domain (rows) as a DataFrame of fractions"""
+        import pandas as pd
+        counts = self.counts(weighted)
+        totals = counts.sum(axis=1, keepdims=True)
+        shares = counts / np.where(totals > 0, totals, 1)
+        columns = [LEVELS[code] for code in LEVELS] + ['Not applicable']
+        return pd.DataFrame(shares[:, [1, 2, 3, 0]], columns=columns,
+                            index=pd.Index(self.domains + [OVERALL_DOMAIN], name='Domain'))
+
+    def quality_distribution(self):
+        """Number of studies at each overall quality level (high to low).
+
+        Studies with no applicable domain are counted as 'Not assessed', an
+        entry present only when there are any.
+        """
+        import pandas as pd
+        counts = np.bincount(self.overall, minlength=4)
+        codes = list(QUALITY_LEVELS) + ([NOT_APPLICABLE] if counts[NOT_APPLICABLE] else [])
+        return pd.Series([int(counts[code]) for code in codes],
+                         index=[QUALITY_LEVELS.get(code, NOT_ASSESSED) for code in codes],
+                         name='studies')
+
+    def disagreements(self):
+        """(label, recorded, derived) for studies whose recorded overall differs"""
+        differ = (self.recorded != NOT_APPLICABLE) & (self.recorded != self.overall)
+        return [(self.labels[i], LEVELS[self.recorded[i]], LEVELS.get(self.overall[i], 'N/A'))
+                for i in np.flatnonzero(differ)]
+
+def plot_traffic_light(ax, assessment):
+    """Study x domain traffic-light grid, overall judgment last"""
+    import matplotlib.pyplot as plt
+    from matplotlib.colors import ListedColormap
+    import matrix_render
+    table = assessment.table()
+    cmap = ListedColormap([COLORS[code] for code in LEVELS])
+    cells, _, _ = matrix_render.draw_matrix(ax, table.to_numpy(), table.index, table.columns,
+                                            cmap=cmap, vmin=0.5, vmax=3.5, glyphs=GLYPHS,
+                                            glyph_size=9, linewidths=0.5,
+                                            na_color=COLORS[NOT_APPLICABLE])
+    plt.setp(ax.get_xticklabels(), rotation=90)
+    return cells
+
+def plot_summary(ax, assessment, weighted=False):
+    """Stacked horizontal bars of the share of each judgment per domain"""
+    summary = assessment.summary(weighted)[::-1]
+    left = np.zeros(len(summary))
+    colors = [COLORS[code] for code in LEVELS] + [COLORS[NOT_APPLICABLE]]
+    for column, color in zip(summary.columns, colors):
+        shares = summary[column].to_numpy() * 100
+        ax.barh(range(len(summary)), shares, left=left, color=color, label=column,
+                edgecolor='white', height=0.7)
+        for y, (x, share) in enumerate(zip(left, shares)):
+            if share >= 8:
+                ax.text(x + share / 2, y, f'{share:.0f}%', ha='center', va='center',
+                        fontsize=8)
+        left += shares
+    ax.set_yticks(range(len(summary)))
+    ax.set_yticklabels(summary.index)
+    ax.get_yticklabels()[0].set_fontweight('bold')
+    ax.set_xlim(0, 100)
+    ax.set_xlabel('Studies (%, weighted by sample size)' if weighted else 'Studies (%)')
+    ax.legend(loc='upper center', bbox_to_anchor=(0.5, -0.12), ncol=4, fontsize=8,
+              frameon=False)
+
+def synthetic_assessment(n_studies, n_domains=7, seed=0):
+    """Random judgments with about a fifth of cells not applicable"""
+    rng = np.random.default_rng(seed)
+    ratings = rng.integers(1, 4, (n_studies, n_domains), dtype=np.int8)
+    applicable = rng.random((n_studies, n_domains)) >= 0.2
+    return Assessment([f'Study {i}' for i in range(n_studies)],
+                      [f'Domain {j}' for j in range(n_domains)], ratings, applicable,
+                      weights=rng.integers(10, 2000, n_studies))
+
+def benchmark(sizes, rule=DEFAULT_RULE):
+    print(f"{'studies':>10s} {'MB':>7s} {'overall ms':>11s} {'counts ms':>10s} "
+          f"{'weighted ms':>12s} {'per-study loop ms':>18s}")
+    for n in sizes:
+        assessment = synthetic_assessment(n)
+        assessment.rule = rule
+        megabytes = (assessment.ratings.nbytes + assessment.applicable.nbytes) / 1e6
+        start = time.perf_counter()
+        assessment.overall
+        derived = time.perf_counter()
+        assessment.counts()
+        counted = time.perf_counter()
+        assessment.counts(weighted=True)
+        weighted = time.perf_counter()
+        # The same worst-domain rule applied one study at a time, for comparison
+        rows = min(n, 100_000)
+        for ratings, applicable in zip(assessment.ratings[:rows].tolist(),
+                                       assessment.applicable[:rows].tolist()):
+            max((r for r, a in zip(ratings, applicable) if a), default=0)
+        loop = (time.perf_counter() - weighted) * n / rows
+        print(f"{n:10d} {megabytes:7.1f} {(derived - start) * 1e3:11.1f} "
+              f"{(counted - derived) * 1e3:10.1f} {(weighted - counted) * 1e3:12.1f} "
+              f"{loop * 1e3:18.1f}")
+
+if __name__ == "__main__":
+    import json
+    import review_dataset
+    parser = argparse.ArgumentParser(description='Derive and summarize risk-of-bias judgments')
+    parser.add_argument('--extraction', default=review_dataset.EXTRACTION_FILE,
+                        help='extraction file (default: the review extraction)')
+    parser.add_argument('--rule', choices=RULES, default=None,
+                        help="overall rule (default: the extraction's, else %s)" % DEFAULT_RULE)
+    parser.add_argument('--weighted', action='store_true',
+                        help='weight the summary by sample size')
+    parser.add_argument('--benchmark', metavar='SIZES', default=None,
+                        help='comma-separated synthetic study counts to time')
+    args = parser.parse_args()
+    if args.benchmark:
+        benchmark([int(n) for n in args.benchmark.split(',')], args.rule or DEFAULT_RULE)
+    else:
+        with open(args.extraction, encoding='utf-8') as f:
+            assessment = Assessment.from_extraction(json.load(f), args.rule)
+        print(f"Rule: {assessment.rule}\n")
+        print((assessment.summary(args.weighted) * 100).round(0).to_string())
+        print()
+        print(assessment.quality_distribution().to_string())
+        for label, recorded, derived in assessment.disagreements():
+            print(f"{label}: recorded {recorded}, derived {derived}")
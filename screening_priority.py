@@ -0,0 +1,377 @@
+#!/usr/bin/env python3
+"""
+Rank unscreened records for title/abstract screening
+
+Every record's title (counted twice), abstract and non-PRISMA tags are
+tokenized into a sparse term-count matrix. Records are scored two ways:
+
+1. BM25 against each construct in Constructs_Framework.md (its definition,
+   conceptual domain and conceptual theme).
+2. Cosine similarity of TF-IDF vectors to the centroid of the records that
+   already passed title/abstract screening (tagged Full-text, Full-text
+   excluded or Included), when there are any.
+
+The two scores are scaled to [0, 1] and blended into one priority. The
+term-count matrix is stored in `.screening_index/` next to the export, keyed
+by record Key and a digest of the record's text. A new search pass appended
+to the export therefore only tokenizes the new and edited records.
+
+    python screening_priority.py [export.csv] -o screening_queue.csv
+    python screening_priority.py --benchmark 100000
+"""
+
+import argparse
+import hashlib
+import os
+import re
+import sys
+import time
+import unicodedata
+
+import numpy as np
+import pandas as pd
+from scipy.sparse import coo_matrix, csr_matrix, diags, vstack
+
+import prisma_counts
+
+CONSTRUCTS_FILE = os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                               'Constructs_Framework.md')
+CONSTRUCT_SECTIONS = ('Definition', 'Conceptual Domain', 'Conceptual Theme')
+INDEX_DIRNAME = '.screening_index'
+INDEX_VERSION = 1
+
+TITLE_REPEATS = 2
+K1, B = 1.2, 0.75
+CONSTRUCT_WEIGHT = 0.5
+# Decisions that mean a record passed title/abstract screening
+RELEVANT_DECISIONS = ('fulltext', 'fulltext_excluded', 'included')
+SCREENED_DECISIONS = RELEVANT_DECISIONS + ('excluded', 'duplicate')
+
+STOPWORDS = frozenset("""
+a about above after again against all also am an and any are as at be because
+been before being below between both but by can could did do does doing down
+during each few for from further had has have having he her here hers him his
+how i if in into is it its itself just may me more most my no nor not of off on
+once only or other our out over own same she should so some such than that the
+their them then there these they this those through to too under until up very
+was we were what when where which while who whom why will with within without
+would you your et al using use used study studies among across based via
+""".split())
+
+# Folded text is ASCII: every character but letters, digits and the record
+# separator becomes a space, so a plain split() yields the tokens
+_SEPARATOR = '\x01'
+_SPACES = str.maketrans({chr(c): ' ' for c in range(128)
+                         if not chr(c).isalnum() and chr(c) != _SEPARATOR})
+_HEADING = re.compile(r'^##\s+(?:\d+\.\s*)?(.+?)\s*$', re.M)
+_SECTION = re.compile(r'^\*\*(.+?)\*\*\s*$', re.M)
+
+def parse_constructs(path=CONSTRUCTS_FILE, sections=CONSTRUCT_SECTIONS):
+    """{construct name: query text} from the framework's `## N. Name` sections"""
+    with open(path, encoding='utf-8') as f:
+        text = f.read()
+    headings = list(_HEADING.finditer(text))
+    constructs = {}
+    for heading, following in zip(headings, headings[1:] + [None]):
+        body = text[heading.end():following.start() if following else len(text)]
+        parts = _SECTION.split(body)
+        # split() alternates [preamble, title, text, title, text, ...]
+        kept = [content for title, content in zip(parts[1::2], parts[2::2])
+                if title.strip() in sections]
+        name = heading.group(1)
+        constructs[name] = ' '.join([name] + kept)
+    return constructs
+
+def _stem(word):
+    """Harman's S-stemmer: fold regular plurals onto the singular"""
+    if word.endswith('ies') and not word.endswith(('eies', 'aies')):
+        return word[:-3] + 'y'
+    if word.endswith('es') and not word.endswith(('aes', 'ees', 'oes')):
+        return word[:-1]
+    if word.endswith('s') and not word.endswith(('us', 'ss')):
+        return word[:-1]
+    return word
+
+def _fold(text):
+    return unicodedata.normalize('NFKD', text).encode('ascii', 'ignore').decode('ascii').lower()
+
+def normalize_text(text):
+    """Lower-case ASCII words separated by single spaces"""
+    return ' '.join(_fold(text).translate(_SPACES).split())
+
+def index_term(word):
+    """The indexed term for a normalized word, or None for words not indexed"""
+    if word in STOPWORDS or len(word) < 3 or not word[0].isalpha():
+        return None
+    return _stem(word)
+
+def record_texts(df):
+    """Text indexed for each record: title (repeated), abstract and topic tags"""
+    empty = pd.Series('', index=df.index)
+    title = df['Title'] if 'Title' in df else empty
+    abstract = df['Abstract Note'] if 'Abstract Note' in df else empty
+    tags = df['Manual Tags'] if 'Manual Tags' in df else empty
+    memo = {}
+    topics = tags.fillna('').map(lambda cell: ' '.join(
+        tag for tag in cell.split(';')
+        if tag.strip() and not prisma_counts.classify_tags(tag.strip(), memo)))
+    return (((title.fillna('') + ' ') * TITLE_REPEATS) + abstract.fillna('') + ' ' + topics).tolist()
+
+def _digests(texts):
+    return np.fromiter((int.from_bytes(hashlib.blake2b(t.encode('utf-8'), digest_size=8)
+                                       .digest(), 'little') for t in texts),
+                       dtype=np.uint64, count=len(texts))
+
+class ScreeningIndex:
+    """Per-record term counts over a growing vocabulary of stemmed terms"""
+
+    def __init__(self, keys=(), digests=(), counts=None, vocabulary=()):
+        self.keys = np.asarray(keys, dtype=str)
+        self.digests = np.asarray(digests, dtype=np.uint64)
+        self.vocabulary = list(vocabulary)
+        self.term_ids = {term: i for i, term in enumerate(self.vocabulary)}
+        self.counts = (counts if counts is not None
+                       else csr_matrix((len(self.keys), len(self.vocabulary)), dtype=np.float32))
+
+    def _term_codes(self, texts, grow):
+        """Flat (document, term id) arrays for `texts`; unknown terms added if `grow`"""
+        # One pass over all texts, with a separator token after each one
+        joined = f' {_SEPARATOR} '.join(texts) + f' {_SEPARATOR}'
+        words = _fold(joined).translate(_SPACES).split()
+        codes, uniques = pd.factorize(pd.Series(words, dtype=object), sort=False)
+        boundary = np.zeros(len(uniques), dtype=bool)
+        ids = np.full(len(uniques), -1, dtype=np.int64)
+        for position, word in enumerate(uniques):
+            if word == _SEPARATOR:
+                boundary[position] = True
+                continue
+            term = index_term(word)
+            if term is None:
+                continue
+            if term not in self.term_ids and grow:
+                self.term_ids[term] = len(self.vocabulary)
+                self.vocabulary.append(term)
+            ids[position] = self.term_ids.get(term, -1)
+        is_boundary = boundary[codes]
+        # Each record's tokens come before its own separator
+        doc = np.cumsum(is_boundary) - is_boundary
+        terms = ids[codes]
+        keep = terms >= 0
+        return doc[keep], terms[keep]
+
+    def count(self, texts, grow=True):
+        """Term-count matrix for `texts` (rows) over this index's vocabulary"""
+        doc, terms = self._term_codes(texts, grow)
+        return coo_matrix((np.ones(len(doc), dtype=np.float32), (doc, terms)),
+                          shape=(len(texts), len(self.vocabulary))).tocsr()
+
+    def update(self, keys, texts):
+        """Re-index to exactly these records, tokenizing only new or edited ones.
+
+        Returns (reused, tokenized, dropped) record counts.
+        """
+        keys = np.asarray(keys, dtype=str)
+        digests = _digests(texts)
+        previous = pd.Index(self.keys).get_indexer(keys) if len(self.keys) else np.full(len(keys), -1)
+        reused = previous >= 0
+        reused[reused] = self.digests[previous[reused]] == digests[reused]
+        fresh = np.flatnonzero(~reused)
+        counts = self.count([texts[i] for i in fresh])
+        old = self.counts.copy()
+        old.resize((old.shape[0], len(self.vocabulary)))
+        stacked = vstack([old, counts], format='csr')
+        rows = np.where(reused, previous, 0)
+        rows[fresh] = old.shape[0] + np.arange(len(fresh))
+        dropped = len(self.keys) - int((previous >= 0).sum())
+        self.keys, self.digests, self.counts = keys, digests, stacked[rows]
+        return int(reused.sum()), len(fresh), dropped
+
+    def _document_frequency(self):
+        return np.bincount(self.counts.indices, minlength=self.counts.shape[1])
+
+    def bm25(self, k1=K1, b=B):
+        """Records x terms matrix of BM25 term weights"""
+        counts = self.counts
+        n = counts.shape[0]
+        df = self._document_frequency()
+        idf = np.log1p((n - df + 0.5) / (df + 0.5))
+        lengths = np.asarray(counts.sum(axis=1)).ravel()
+        average = lengths.mean() if n and lengths.mean() else 1.0
+        row_of = np.repeat(np.arange(n), np.diff(counts.indptr))
+        tf = counts.data
+        data = idf[counts.indices] * tf * (k1 + 1) / (tf + k1 * (1 - b + b * lengths[row_of] / average))
+        return csr_matrix((data, counts.indices, counts.indptr), shape=counts.shape)
+
+    def tfidf(self):
+        """Records x terms matrix of L2-normalized log-TF x IDF weights"""
+        counts = self.counts
+        idf = np.log((1 + counts.shape[0]) / (1 + self._document_frequency())) + 1
+        weights = csr_matrix((np.log1p(counts.data) * idf[counts.indices], counts.indices,
+                              counts.indptr), shape=counts.shape)
+        norms = np.sqrt(np.asarray(weights.multiply(weights).sum(axis=1)).ravel())
+        return diags(1 / np.where(norms > 0, norms, 1)) @ weights
+
+    def save(self, path):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        partial = path + '.tmp.npz'
+        np.savez_compressed(partial, version=INDEX_VERSION, keys=self.keys,
+                            digests=self.digests, vocabulary=np.asarray(self.vocabulary, dtype=str),
+                            data=self.counts.data, indices=self.counts.indices,
+                            indptr=self.counts.indptr, shape=np.asarray(self.counts.shape))
+        os.replace(partial, path)
+
+    @classmethod
+    def load(cls, path):
+        """The saved index, or an empty one if missing or from another version"""
+        try:
+            with np.load(path) as saved:
+                if int(saved['version']) != INDEX_VERSION:
+                    return cls()
+                counts = csr_matrix((saved['data'], saved['indices'], saved['indptr']),
+                                    shape=tuple(saved['shape']))
+                return cls(saved['keys'], saved['digests'], counts, saved['vocabulary'].tolist())
+        except (OSError, KeyError, ValueError):
+            return cls()
+
+def index_path(export_path):
+    stem = os.path.splitext(os.path.basename(export_path))[0]
+    return os.path.join(os.path.dirname(os.path.abspath(export_path)), INDEX_DIRNAME,
+                        f'{stem}.npz')
+
+def rank(index, constructs, relevant, construct_weight=CONSTRUCT_WEIGHT):
+    """Priority scores for every indexed record.
+
+    `relevant` is a boolean mask of records known to be relevant. Returns a
+    DataFrame (in index order) with one BM25 column per construct, the
+    best-matching construct, similarity to the centroid of the relevant
+    records and the blended priority.
+    """
+    names = list(constructs)
+    queries = index.count([constructs[name] for name in names], grow=False)
+    queries.data = 1 + np.log(queries.data)
+    scores = np.asarray((index.bm25() @ queries.T).todense())
+    scale = scores.max(axis=0)
+    construct_score = (scores / np.where(scale > 0, scale, 1)).max(axis=1)
+
+    similarity = np.zeros(len(index.keys))
+    relevant = np.asarray(relevant, dtype=bool)
+    if relevant.any():
+        vectors = index.tfidf()
+        centroid = np.asarray(vectors[np.flatnonzero(relevant)].mean(axis=0)).ravel()
+        norm = np.linalg.norm(centroid)
+        similarity = vectors @ (centroid / norm) if norm > 0 else similarity
+        weight = construct_weight
+    else:
+        weight = 1.0
+    top = similarity.max()
+    priority = weight * construct_score + (1 - weight) * (similarity / top if top > 0 else 0)
+
+    table = pd.DataFrame(np.round(scores, 3), columns=names)
+    table.insert(0, 'Key', index.keys)
+    table['Best Construct'] = np.asarray(names, dtype=object)[scores.argmax(axis=1)] if names else ''
+    table['Similarity To Relevant'] = np.round(similarity, 3)
+    table['Priority'] = np.round(priority, 4)
+    return table
+
+def screening_queue(export_path=prisma_counts.SCREENING_EXPORT, constructs_path=CONSTRUCTS_FILE,
+                    construct_weight=CONSTRUCT_WEIGHT, include_screened=False, use_index=True):
+    """Records of an export ranked for screening, most promising first"""
+    import zotero_export
+    df = zotero_export.load_export(export_path).reset_index(drop=True)
+    texts = record_texts(df)
+    path = index_path(export_path)
+    index = ScreeningIndex.load(path) if use_index else ScreeningIndex()
+    reused, tokenized, dropped = index.update(df['Key'].astype(str).tolist(), texts)
+    if use_index and (tokenized or dropped):
+        index.save(path)
+    print(f"Indexed {len(df)} records: {tokenized} tokenized, {reused} reused, "
+          f"{dropped} dropped ({len(index.vocabulary)} terms)")
+
+    memo = {}
+    decisions = df['Manual Tags'].fillna('').map(
+        lambda cell: prisma_counts.classify_tags(cell, memo))
+    relevant = decisions.map(lambda d: any(k in d for k in RELEVANT_DECISIONS)).to_numpy()
+    screened = decisions.map(lambda d: any(k in d for k in SCREENED_DECISIONS)).to_numpy()
+
+    table = rank(index, parse_constructs(constructs_path), relevant, construct_weight)
+    table.insert(1, 'Title', df['Title'].to_numpy())
+    table.insert(2, 'Publication Year', df['Publication Year'].to_numpy())
+    table['Status'] = np.where(relevant, 'relevant', np.where(screened, 'screened', 'unscreened'))
+    if not include_screened:
+        table = table[~screened]
+    table = table.sort_values('Priority', ascending=False, kind='stable')
+    table.insert(0, 'Rank', np.arange(1, len(table) + 1))
+    return table.reset_index(drop=True)
+
+def synthetic_texts(n, constructs, seed=0, words=150):
+    """`n` abstracts mixing construct vocabulary with filler words"""
+    rng = np.random.default_rng(seed)
+    topical = np.array(re.findall(r'[a-z]{4,}', _fold(' '.join(constructs.values()))))
+    filler = np.array([f'w{i}' for i in range(20000)])
+    relevance = rng.beta(1, 6, n)
+    texts = []
+    for p in relevance:
+        chosen = np.where(rng.random(words) < p, rng.choice(topical, words),
+                          rng.choice(filler, words))
+        texts.append(' '.join(chosen))
+    return texts
+
+def benchmark(n, constructs_path=CONSTRUCTS_FILE):
+    """Time a full build and ranking of `n` records, then a 1% incremental append"""
+    constructs = parse_constructs(constructs_path)
+    texts = synthetic_texts(n, constructs)
+    keys = [f'R{i}' for i in range(n)]
+    relevant = np.zeros(n, dtype=bool)
+    relevant[:max(1, n // 200)] = True
+
+    index = ScreeningIndex()
+    start = time.perf_counter()
+    index.update(keys, texts)
+    built = time.perf_counter()
+    rank(index, constructs, relevant)
+    ranked = time.perf_counter()
+    extra = synthetic_texts(max(1, n // 100), constructs, seed=1)
+    index.update(keys + [f'N{i}' for i in range(len(extra))], texts + extra)
+    appended = time.perf_counter()
+    print(f"{n} records, {len(index.vocabulary)} terms, {index.counts.nnz} nonzeros: "
+          f"index {built - start:.2f}s, rank {ranked - built:.2f}s, "
+          f"append {len(extra)} {appended - ranked:.2f}s")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description='Rank records for title/abstract screening')
+    parser.add_argument('export', nargs='?', default=prisma_counts.SCREENING_EXPORT,
+                        help='Zotero CSV export (default: the review screening export)')
+    parser.add_argument('-o', '--output', default=None,
+                        help='write the full queue as CSV (default: print the top records)')
+    parser.add_argument('--constructs', default=CONSTRUCTS_FILE,
+                        help='construct framework markdown (default: Constructs_Framework.md)')
+    parser.add_argument('--construct-weight', type=float, default=CONSTRUCT_WEIGHT,
+                        help='share of the priority from construct match vs similarity '
+                             'to relevant records (default: %(default)s)')
+    parser.add_argument('--all', action='store_true',
+                        help='rank already screened records too')
+    parser.add_argument('--top', type=int, default=20,
+                        help='records to print without --output (default: %(default)s)')
+    parser.add_argument('--no-index', action='store_true',
+                        help='re-tokenize every record and leave the saved index untouched')
+    parser.add_argument('--benchmark', type=int, metavar='N', default=None,
+                        help='time indexing and ranking N synthetic records instead')
+    args = parser.parse_args()
+    if not 0 <= args.construct_weight <= 1:
+        parser.error('--construct-weight must be between 0 and 1')
+
+    if args.benchmark:
+        benchmark(args.benchmark, args.constructs)
+        sys.exit(0)
+    start = time.perf_counter()
+    queue = screening_queue(args.export, args.constructs, args.construct_weight,
+                            args.all, not args.no_index)
+    elapsed = time.perf_counter() - start
+    if args.output:
+        queue.to_csv(args.output, index=False)
+        print(f"Wrote {len(queue)} ranked records to {args.output} ({elapsed:.2f}s)")
+    else:
+        with pd.option_context('display.max_colwidth', 60, 'display.width', 200):
+            print(queue[['Rank', 'Key', 'Title', 'Best Construct', 'Priority']]
+                  .head(args.top).to_string(index=False))
+        print(f"{len(queue)} records ranked ({elapsed:.2f}s)")
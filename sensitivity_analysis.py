@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+"""
+Sensitivity analyses for the pooled effect: leave-one-out, cumulative by
+year, and bootstrap / sign-flip permutation resampling
+
+Every analysis is expressed as one NaN-masked (n_analyses, k) matrix handed
+to `meta_analysis.meta_analyze`, so the pooling itself is a single batch of
+array operations. The matrices are pooled in blocks of rows of at most
+`CHUNK_CELLS` cells, so memory stays bounded for thousands of studies.
+Large resampling runs are split into chunks with independent random
+streams and spread over a process pool.
+"""
+
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+
+import numpy as np
+import pandas as pd
+
+import meta_analysis
+
+N_RESAMPLES = 10000
+# Below this many resampled cells the pool's start-up cost outweighs the work
+POOL_THRESHOLD = 2_000_000
+CHUNK_CELLS = 500_000
+
+@dataclass
+class ResamplingResult:
+    """Distribution of the pooled estimate over resamples"""
+    estimates: np.ndarray        # bootstrap pooled estimates
+    lower: float                 # percentile CI
+    upper: float
+    p_value: float               # sign-flip permutation test of no effect
+    observed: float
+
+def _pool_masked(y, se, mask, method):
+    """One analysis per study i, pooling the studies `mask(i)` selects.
+
+    `mask` maps an array of analysis indices to their (rows, k) boolean
+    selection. Per-study weights are not kept (`weights` is None).
+    """
+    k = len(y)
+    block = max(1, CHUNK_CELLS // max(k, 1))
+    parts = []
+    for start in range(0, max(k, 1), block):
+        rows = mask(np.arange(start, min(k, start + block))[:, np.newaxis])
+        parts.append(meta_analysis.meta_analyze(np.where(rows, y, np.nan),
+                                                se=np.where(rows, se, np.nan),
+                                                method=method))
+    fields = ('k', 'estimate', 'se', 'lower', 'upper', 'tau2', 'q', 'i2')
+    return meta_analysis.MetaResult(
+        method=method, weights=None,
+        **{field: np.concatenate([getattr(part, field) for part in parts]) for field in fields})
+
+def leave_one_out(y, se, method='REML'):
+    """Pool k times, each time omitting one study (row i omits study i)"""
+    y = np.asarray(y, float)
+    se = np.asarray(se, float)
+    return _pool_masked(y, se, lambda i: np.arange(len(y)) != i, method)
+
+def cumulative(y, se, order, method='REML'):
+    """Pool the first 1, 2, ..., k studies taken in `order` (e.g. by year)"""
+    y = np.asarray(y, float)[order]
+    se = np.asarray(se, float)[order]
+    return _pool_masked(y, se, lambda i: np.arange(len(y)) <= i, method)
+
+def _resample_chunk(y, se, n, seed, method):
+    """Pooled estimates of `n` bootstrap and `n` sign-flipped resamples"""
+    rng = np.random.default_rng(seed)
+    k = len(y)
+    index = rng.integers(0, k, size=(n, k))
+    boot = meta_analysis.meta_analyze(y[index], se=se[index], method=method)
+    # Under H0 (no effect) effect signs are exchangeable
+    signs = rng.choice(np.array([-1.0, 1.0]), size=(n, k))
+    flipped = meta_analysis.meta_analyze(signs * y, se=np.broadcast_to(se, (n, k)),
+                                         method=method)
+    return boot.estimate, flipped.estimate
+
+def resample(y, se, n_resamples=N_RESAMPLES, method='REML', seed=0, jobs=None):
+    """Bootstrap percentile CI and permutation p-value of the pooled effect.
+
+    `jobs` is the number of worker processes; by default a pool is used only
+    when the resampled matrices are large enough to benefit.
+    """
+    y = np.asarray(y, float)
+    se = np.asarray(se, float)
+    k = len(y)
+    chunk = max(1, CHUNK_CELLS // max(k, 1))
+    sizes = [min(chunk, n_resamples - start) for start in range(0, n_resamples, chunk)]
+    seeds = np.random.SeedSequence(seed).spawn(len(sizes))
+    if jobs is None:
+        jobs = (os.cpu_count() or 1) if n_resamples * k > POOL_THRESHOLD else 1
+    jobs = min(jobs, len(sizes))
+
+    args = [(y, se, size, s, method) for size, s in zip(sizes, seeds)]
+    if jobs > 1:
+        # Spawned, as in the render pool: callers may hold matplotlib state
+        with ProcessPoolExecutor(max_workers=jobs,
+                                 mp_context=multiprocessing.get_context('spawn')) as pool:
+            parts = list(pool.map(_resample_chunk, *zip(*args)))
+    else:
+        parts = [_resample_chunk(*a) for a in args]
+    boot = np.concatenate([p[0] for p in parts])
+    null = np.concatenate([p[1] for p in parts])
+
+    observed = float(meta_analysis.meta_analyze(y, se=se, method=method).estimate)
+    p_value = (1 + np.sum(np.abs(null) >= abs(observed))) / (1 + len(null))
+    lower, upper = np.percentile(boot, [2.5, 97.5])
+    return ResamplingResult(estimates=boot, lower=float(lower), upper=float(upper),
+                            p_value=float(p_value), observed=observed)
+
+def sensitivity_table(df, effect='Effect_Size', lower='Lower_CI', upper='Upper_CI',
+                      label='Study', year='Year', method='REML'):
+    """Leave-one-out and cumulative results for a study table as DataFrames"""
+    y = df[effect].to_numpy(float)
+    se = meta_analysis.se_from_ci(df[lower], df[upper])
+    labels = df[label].astype(str).str.replace('\n', ' ').to_numpy()
+
+    loo = leave_one_out(y, se, method)
+    loo_table = pd.DataFrame({'omitted': labels, 'estimate': loo.estimate,
+                              'lower': loo.lower, 'upper': loo.upper,
+                              'tau2': loo.tau2, 'I2': loo.i2})
+
+    order = np.argsort(df[year].to_numpy(), kind='stable')
+    cum = cumulative(y, se, order, method)
+    cum_table = pd.DataFrame({'added': labels[order],
+                              'year': df[year].to_numpy()[order],
+                              'estimate': cum.estimate, 'lower': cum.lower,
+                              'upper': cum.upper, 'k': cum.k})
+    return loo_table, cum_table
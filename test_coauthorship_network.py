@@ -0,0 +1,35 @@
+"""The co-authorship figure on exports without co-authored records"""
+
+import matplotlib
+matplotlib.use('Agg')
+
+import pandas as pd
+import pytest
+
+import create_systematic_review_visualizations as figures
+import figure_export
+import prisma_counts
+import review_dataset
+
+@pytest.fixture
+def export(tmp_path):
+    """Write a copy of the screening export, `rows` records long, with `authors` per record"""
+    df = pd.read_csv(prisma_counts.SCREENING_EXPORT, dtype=str, keep_default_na=False,
+                     encoding='utf-8-sig')
+
+    def write(rows, authors=None):
+        subset = df.head(rows).copy()
+        if authors is not None:
+            subset['Author'] = authors
+        path = tmp_path / 'export.csv'
+        subset.to_csv(path, index=False)
+        return str(path)
+    return write
+
+@pytest.mark.parametrize('rows, authors', [(0, None), (20, ''), (20, 'Doe, Jane')])
+def test_network_without_coauthors(export, tmp_path, rows, authors):
+    dataset = review_dataset.ReviewDataset(export(rows, authors))
+    assert dataset.coauthorship.adjacency.nnz == 0
+    figure_export.configure(figure_export.ExportConfig(str(tmp_path / 'figures'), {'png': 40}))
+    figures.create_coauthorship_network(dataset)
+    assert (tmp_path / 'figures' / 'coauthorship_network.png').exists()
@@ -0,0 +1,199 @@
+#!/usr/bin/env python3
+"""
+Load Zotero CSV exports through a typed, memory-mapped Arrow IPC cache
+
+The first load of an export parses the CSV (UTF-8 BOM, multi-line abstracts,
+quoted author lists, mixed date formats) and writes an LZ4-compressed Arrow
+IPC file next to it in `.zotero_cache/`. Later loads memory-map that file
+instead of re-parsing. The cache file name embeds the SHA-256 of the source
+CSV, so editing the export invalidates it automatically.
+"""
+
+import hashlib
+import json
+import os
+import sys
+import time
+
+import pandas as pd
+
+import date_normalizer
+import prisma_counts
+
+try:
+    import pyarrow as pa
+    import pyarrow.ipc
+except ImportError:  # cache disabled, every load parses the CSV
+    pa = None
+
+CACHE_VERSION = 2
+CACHE_DIRNAME = '.zotero_cache'
+
+CATEGORICAL_COLUMNS = ['Item Type', 'Language']
+
+def normalize_dates(values, reference_years=None, not_after=None):
+    """Parse a column of date strings, once per distinct value (see `date_normalizer`)"""
+    return date_normalizer.parse_dates(values, reference_years, not_after)
+
+def split_tags(cell):
+    """'A; B; C' -> ['A', 'B', 'C']"""
+    if not cell:
+        return []
+    return [tag.strip() for tag in cell.split(';') if tag.strip()]
+
+def read_export_csv(path):
+    """Parse a Zotero CSV export into a typed DataFrame (no caching)"""
+    df = pd.read_csv(path, encoding='utf-8-sig', dtype=str,
+                     keep_default_na=False, na_filter=False)
+    df['Publication Year'] = pd.to_numeric(
+        df['Publication Year'], errors='coerce').astype('Int16')
+    for column in CATEGORICAL_COLUMNS:
+        if column in df:
+            df[column] = df[column].astype('category')
+    # Two-digit publication dates follow the record's year; additions are in the past
+    if 'Date' in df:
+        df['Date Parsed'] = normalize_dates(df['Date'], df['Publication Year'])
+    if 'Date Added' in df:
+        df['Date Added Parsed'] = normalize_dates(df['Date Added'],
+                                                  not_after=pd.Timestamp.now())
+    df['Tags'] = df.get('Manual Tags', pd.Series('', index=df.index)).map(split_tags)
+    return df
+
+def apply_enrichment(df, sidecar_path):
+    """Fill blank cells of `df` from an enrichment sidecar, matched on Key.
+
+    Only empty cells are filled; anything typed into Zotero wins. Columns of
+    the sidecar that the export lacks are ignored.
+    """
+    fills = pd.read_csv(sidecar_path, encoding='utf-8', dtype=str,
+                        keep_default_na=False, na_filter=False)
+    fills = fills.drop_duplicates('Key', keep='last').set_index('Key')
+    for column in fills.columns.intersection(df.columns):
+        values = df['Key'].map(fills[column]).fillna('')
+        blank = (df[column] == '') & (values != '')
+        if blank.any():
+            df.loc[blank, column] = values[blank]
+    return df
+
+def read_enriched_export(path):
+    """`read_export_csv` with the export's enrichment sidecar applied, if any"""
+    df = read_export_csv(path)
+    sidecar = prisma_counts.enrichment_path(path)
+    if os.path.exists(sidecar):
+        df = apply_enrichment(df, sidecar)
+    return df
+
+_digests = {}
+
+def file_digest(path):
+    """SHA-256 of a file, re-hashed only when its size or mtime changes"""
+    stat = os.stat(path)
+    key = (os.path.abspath(path), stat.st_size, stat.st_mtime_ns)
+    if key not in _digests:
+        digest = hashlib.sha256()
+        with open(path, 'rb') as f:
+            for chunk in iter(lambda: f.read(1 << 20), b''):
+                digest.update(chunk)
+        _digests[key] = digest.hexdigest()
+    return _digests[key]
+
+def export_digest(path):
+    """`file_digest` of an export, combined with its enrichment sidecar's if any"""
+    digests = [file_digest(p) for p in prisma_counts.export_files(path)]
+    if len(digests) == 1:
+        return digests[0]
+    return hashlib.sha256('+'.join(digests).encode()).hexdigest()
+
+class ExportCache:
+    """Directory of Arrow IPC snapshots of parsed exports, keyed by source hash"""
+
+    def __init__(self, cache_dir):
+        self.cache_dir = cache_dir
+        self.stat_index_path = os.path.join(cache_dir, 'stat_index.json')
+
+    def _digest(self, path):
+        # Persist size/mtime -> hash so a warm process start skips hashing
+        stat = os.stat(path)
+        stamp = [stat.st_size, stat.st_mtime_ns]
+        try:
+            with open(self.stat_index_path) as f:
+                index = json.load(f)
+        except (OSError, ValueError):
+            index = {}
+        entry = index.get(os.path.abspath(path))
+        if entry and entry['stat'] == stamp:
+            return entry['sha256']
+        digest = file_digest(path)
+        index[os.path.abspath(path)] = {'stat': stamp, 'sha256': digest}
+        os.makedirs(self.cache_dir, exist_ok=True)
+        with open(self.stat_index_path, 'w') as f:
+            json.dump(index, f, indent=2)
+        return digest
+
+    def path_for(self, path):
+        stem = os.path.splitext(os.path.basename(path))[0]
+        digest = self._digest(path)
+        sidecar = prisma_counts.enrichment_path(path)
+        if os.path.exists(sidecar):
+            digest = hashlib.sha256(f'{digest}+{self._digest(sidecar)}'.encode()).hexdigest()
+        return os.path.join(self.cache_dir,
+                            f'{stem}.v{CACHE_VERSION}.{digest[:16]}.arrow')
+
+    def load(self, path):
+        cached = self.path_for(path)
+        if os.path.exists(cached):
+            with pa.memory_map(cached, 'r') as source:
+                table = pa.ipc.open_file(source).read_all()
+            df = table.to_pandas()
+            # Arrow list columns come back as arrays; keep Tags as lists, as parsed
+            df['Tags'] = df['Tags'].map(list)
+            return df
+        df = read_enriched_export(path)
+        self._evict(path)
+        self._write(df, cached)
+        return df
+
+    def _write(self, df, cached):
+        os.makedirs(self.cache_dir, exist_ok=True)
+        table = pa.Table.from_pandas(df, preserve_index=False)
+        options = pa.ipc.IpcWriteOptions(compression='lz4')
+        partial = cached + '.tmp'
+        with pa.OSFile(partial, 'wb') as sink:
+            with pa.ipc.new_file(sink, table.schema, options=options) as writer:
+                writer.write_table(table)
+        os.replace(partial, cached)
+
+    def _evict(self, path):
+        """Remove snapshots of older versions of the same export"""
+        stem = os.path.splitext(os.path.basename(path))[0]
+        if not os.path.isdir(self.cache_dir):
+            return
+        for name in os.listdir(self.cache_dir):
+            if name.startswith(f'{stem}.v') and name.endswith('.arrow'):
+                os.remove(os.path.join(self.cache_dir, name))
+
+def load_export(path, cache_dir=None):
+    """Load a Zotero export as a DataFrame, via the Arrow cache when available.
+
+    Columns are the export's own (as strings) plus: categorical `Item Type`
+    and `Language`, nullable-integer `Publication Year`, `Date Parsed` and
+    `Date Added Parsed` datetimes, and `Tags` holding the split tag list.
+    Blank cells are filled from the export's enrichment sidecar when one
+    exists (see `metadata_enrichment`).
+    """
+    if pa is None:
+        return read_enriched_export(path)
+    if cache_dir is None:
+        cache_dir = os.path.join(os.path.dirname(os.path.abspath(path)),
+                                 CACHE_DIRNAME)
+    return ExportCache(cache_dir).load(path)
+
+if __name__ == "__main__":
+    from prisma_counts import SCREENING_EXPORT
+    export = sys.argv[1] if len(sys.argv) > 1 else SCREENING_EXPORT
+    for label in ('first load', 'second load'):
+        start = time.perf_counter()
+        df = load_export(export)
+        print(f"{label}: {len(df)} records in "
+              f"{(time.perf_counter() - start) * 1000:.1f} ms")
+    print(df.dtypes.to_string())